@@ -5,7 +5,15 @@ from datetime import datetime
 logging.langsmith("Persona")
 import json
 import os
-from firebase_utils import db 
+from firebase_utils import db, async_db
+from chat_log_utils import append_chat_log, aappend_chat_log, get_session_number, load_chat_history, aload_chat_history, to_messages, to_records
+from chat_log_utils import sync_persisted_count, peek_persisted_count, forget_persisted_count, stamp_turn
+from session_cache import SessionCache
+from session_backend import session_backend, session_key, parse_session_key, VersionConflict, SAVE_RETRIES
+from persona_cache import get_persona_text, get_cached_prompt, put_cached_prompt, get_llm
+import topic_cache
+from async_utils import run_blocking
+from history_window import history_window, schedule_summary
 
 ## 라이브러리 불러오기
 from langchain_openai import ChatOpenAI
@@ -16,46 +24,61 @@ from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.messages import HumanMessage, AIMessage
 
 ## ✅ 세션 저장소 (페르소나, 행동 패턴, 토픽, 프롬프트, LLM 실행체 저장)
-store = {}
+def new_session_entry(user_number=None, session_id=None, messages=None, summary=None, summarized_count=0):
+    """세션 항목 생성 (대화 이력, 페르소나, 경험가능한 일, 토픽, 프롬프트, LLM 실행체)"""
+    return {
+        "user_number": user_number,
+        "session_id": session_id,
+        "history": ChatMessageHistory(messages=messages or []),
+        "persona": None,
+        "experiencable": None,
+        "topic": None,
+        "topic_description": None,
+        "prompt": None,
+        "llm": None,
+        "summary": summary,  # 예산 밖으로 밀려난 오래된 대화의 요약
+        "summarized_count": summarized_count,  # 요약에 포함된 메시지 수
+        "backend_version": 0,  # 마지막으로 읽거나 저장한 세션 백엔드의 version (compare-and-set 기준)
+    }
+
+def flush_session(key, entry):
+    """캐시에서 내보내는 세션의 저장되지 않은 대화 턴을 Firestore에 저장"""
+    if entry["user_number"] and entry["topic"] is not None:
+        append_chat_log(entry["user_number"], "epi", entry["session_id"], entry["history"].messages, entry["topic"])
+    forget_persisted_count(*parse_session_key(key))  # ✅ 다시 열면 세션 백엔드/Firestore에서 복원
+
+store = SessionCache("epi", on_evict=flush_session)  # LRU + 유휴 TTL + 메모리 예산
 
 def get_user_topics(user_number):
-    """Firestore에서 사용자별 선택된 토픽 데이터를 가져옴"""
-    doc_ref = db.collection("user_topics").document(user_number)
-    doc = doc_ref.get()
-
-    if doc.exists:
-        topics_data = doc.to_dict()
-
-        # ✅ Firestore에서 가져온 데이터가 문자열이면 JSON 변환
-        if isinstance(topics_data["epi_topics"], str):
-            topics_data["epi_topics"] = json.loads(topics_data["epi_topics"])
-        if isinstance(topics_data["epi_topic_descriptions"], str):
-            topics_data["epi_topic_descriptions"] = json.loads(topics_data["epi_topic_descriptions"])
+    """Firestore에서 사용자별 선택된 토픽 데이터를 가져옴 (공유 토픽 캐시 사용)"""
+    topics_data = topic_cache.get_user_topics(user_number)
+    if topics_data is None:
+        print(f"🚨 [ERROR] Firestore에서 {user_number}의 토픽 데이터를 찾을 수 없습니다.")
+    return topics_data
 
-        return topics_data
-    else:
+async def aget_user_topics(user_number):
+    """get_user_topics의 async 버전 (이벤트 루프를 막지 않음)"""
+    topics_data = await topic_cache.aget_user_topics(user_number)
+    if topics_data is None:
         print(f"🚨 [ERROR] Firestore에서 {user_number}의 토픽 데이터를 찾을 수 없습니다.")
-        return None
+    return topics_data
 
 
 ## ✅ 대화 이력 저장 함수
-def get_session_history(session_id: str) -> BaseChatMessageHistory:
-    """세션 ID를 기반으로 대화 이력 반환 (세션별로 관리)"""
-    if session_id not in store:
-        store[session_id] = {
-            "history": ChatMessageHistory(),
-            "persona": None,
-            "experiencable": None,
-            "topic": None,
-            "prompt": None,
-            "llm": None
-        }
-    return store[session_id]["history"]
+def get_session_history(key: str) -> BaseChatMessageHistory:
+    """세션 키(user_number:persona:session_number)를 기반으로 대화 이력 반환 (세션별로 관리)"""
+    if key not in store:
+        store[key] = new_session_entry()
+    return store[key]["history"]
 
 ## ✅ 사용자 페르소나 및 행동 패턴 불러오기
+def persona_filepath(user_number):
+    """사용자 페르소나 파일 경로"""
+    return f"User_info/{user_number}_Per.json"
+
 def load_user_persona(user_number):
     """사용자 페르소나 데이터 불러오기"""
-    filepath = f"User_info/{user_number}_Per.json"
+    filepath = persona_filepath(user_number)
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"❌ {filepath} 파일을 찾을 수 없습니다.")
 
@@ -79,9 +102,10 @@ def clean_persona(user_number):
     return persona_description, experiencable
 
 ## ✅ 사용자 토픽 불러오기
-def load_user_topic(user_number, session_id):
+def load_user_topic(user_number, session_id, topics_data=None):
     """Firestore에서 사용자 주제 데이터 불러오기"""
-    topics_data = get_user_topics(user_number)
+    if topics_data is None:
+        topics_data = get_user_topics(user_number)
     if not topics_data:
         raise ValueError(f"🚨 [ERROR] Firestore에서 {user_number}의 토픽 데이터를 찾을 수 없음")
 
@@ -102,39 +126,48 @@ def load_user_topic(user_number, session_id):
 
     return topic, topic_description
 
+## ✅ 캐시된 프롬프트 적용
+def apply_cached_prompt(key, user_number, session_id):
+    """같은 페르소나 파일·토픽으로 만든 프롬프트가 캐시에 있으면 세션에 적용하고 True 반환"""
+    cached = get_cached_prompt("epi", user_number, persona_filepath(user_number), get_session_number(session_id) - 1)
+    if cached is None:
+        return False
+    for field in ("persona", "experiencable", "topic", "topic_description", "prompt"):
+        store[key][field] = cached[field]
+    print(f"⚡ [CACHE] 캐시된 프롬프트 사용: {user_number} - {session_id}")
+    return True
+
 ## ✅ 세션 초기화 (페르소나, 토픽, LLM 실행체 저장)
-def initialize_session(user_number, session_id):
+def initialize_session(user_number, session_id, topics_data=None):
     """세션 시작 시 한 번만 페르소나, 토픽, 프롬프트, LLM 실행체를 생성하여 저장"""
-    if session_id not in store:
-        store[session_id] = {
-            "history": ChatMessageHistory(),
-            "persona": None,
-            "experiencable": None,
-            "topic": None,
-            "topic_description": None,
-            "prompt": None,
-            "llm": None
-        }
-
-    # ✅ 페르소나 & 경험가능한 일 저장 (최초 한 번)
-    if store[session_id]["persona"] is None:
-        persona_description, experiencable = clean_persona(user_number)
-        store[session_id]["persona"] = persona_description
-        store[session_id]["experiencable"] = experiencable
-
-    # ✅ 주제 저장 (최초 한 번)
-    topic, topic_description = load_user_topic(user_number, session_id)
-    store[session_id]["topic"] = topic
-    store[session_id]["topic_description"] = topic_description
+    key = session_key(user_number, "epi", session_id)
+    if key not in store:
+        store[key] = new_session_entry(user_number, session_id)
+
+    # ✅ 같은 페르소나·토픽의 프롬프트가 캐시되어 있으면 파일/Firestore 조회 없이 재사용
+    if store[key]["prompt"] is None and topics_data is None:
+        apply_cached_prompt(key, user_number, session_id)
+
+    # ✅ 페르소나 & 경험가능한 일 저장 (최초 한 번, 파일이 바뀌지 않았으면 캐시 사용)
+    if store[key]["persona"] is None:
+        persona_description, experiencable = get_persona_text("epi", user_number, persona_filepath(user_number), clean_persona)
+        store[key]["persona"] = persona_description
+        store[key]["experiencable"] = experiencable
+
+    # ✅ 주제 저장 (프롬프트가 없을 때만)
+    if store[key]["prompt"] is None:
+        topic, topic_description = load_user_topic(user_number, session_id, topics_data)
+        store[key]["topic"] = topic
+        store[key]["topic_description"] = topic_description
     
 
     # ✅ 프롬프트 생성 (최초 한 번)
-    if store[session_id]["prompt"] is None:
-        persona_description, topic, topic_description, experiencable = store[session_id]["persona"], store[session_id]["topic"], store[session_id]["topic_description"], store[session_id]["experiencable"]
+    if store[key]["prompt"] is None:
+        persona_description, topic, topic_description, experiencable = store[key]["persona"], store[key]["topic"], store[key]["topic_description"], store[key]["experiencable"]
         
         topic_text = f"{topic}: {topic_description}" if topic_description else topic
         print(f"✅ 토픽 설명: {topic_text}")
-        store[session_id]["prompt"] = ChatPromptTemplate.from_messages(
+        store[key]["prompt"] = ChatPromptTemplate.from_messages(
             [
                 (
                     "system",
@@ -162,29 +195,133 @@ def initialize_session(user_number, session_id):
                 ("human", "{input}"),
             ]
         )
+        # ✅ 같은 페르소나·토픽의 다음 세션에서 재사용하도록 캐시에 저장
+        put_cached_prompt(
+            "epi", user_number, persona_filepath(user_number), get_session_number(session_id) - 1,
+            persona=persona_description, experiencable=experiencable,
+            topic=topic, topic_description=topic_description, prompt=store[key]["prompt"],
+        )
 
     # Through your responses, users can mirror you and reflect on their own feelings.
 
-    # ✅ LLM 실행체 생성 (최초 한 번)
-    if store[session_id]["llm"] is None:
-        llm = ChatOpenAI(model="gpt-4o", temperature=0.7, stream_usage=True)
-        store[session_id]["llm"] = store[session_id]["prompt"] | llm
+    # ✅ LLM 실행체 생성 (최초 한 번, LLM 클라이언트는 모든 세션이 공유)
+    if store[key]["llm"] is None:
+        llm = get_llm("gpt-4o", 0.7, stream_usage=True)
+        # ✅ 프롬프트 앞에서 history를 요약 + 토큰 예산 내 최근 대화로 축소
+        store[key]["llm"] = history_window(store[key], "epi") | store[key]["prompt"] | llm
+
+async def ainitialize_session(user_number, session_id):
+    """initialize_session의 async 버전 (토픽은 async Firestore, 파일 읽기·프롬프트 생성은 스레드 풀)"""
+    key = session_key(user_number, "epi", session_id)
+    topics_data = None
+    # ✅ 캐시된 프롬프트가 없을 때만 Firestore에서 토픽 조회
+    if store[key]["prompt"] is None and not apply_cached_prompt(key, user_number, session_id):
+        topics_data = await aget_user_topics(user_number)
+        if not topics_data:
+            raise ValueError(f"🚨 [ERROR] Firestore에서 {user_number}의 토픽 데이터를 찾을 수 없음")
+    await run_blocking(initialize_session, user_number, session_id, topics_data)
+
+def load_session(user_number, session_id):
+    """캐시 미스 시 세션 백엔드 → chat_logs 순서로 대화 이력을 복원하여 세션 항목 생성"""
+    state = session_backend.load(session_key(user_number, "epi", session_id))
+    summary, summarized_count = None, 0
+    if state:
+        messages = to_messages(state["messages"])
+        summary, summarized_count = state.get("summary"), state.get("summarized_count", 0)
+    else:
+        messages, _ = load_chat_history(user_number, "epi", session_id)
+    if messages:
+        print(f"♻️ [SESSION] 저장된 대화 이력 복원: {user_number} - {session_id} ({len(messages)}개)")
+    return new_session_entry(user_number, session_id, messages, summary, summarized_count)
+
+async def aload_session(user_number, session_id):
+    """load_session의 async 버전"""
+    state = await run_blocking(session_backend.load, session_key(user_number, "epi", session_id))
+    summary, summarized_count = None, 0
+    if state:
+        messages = to_messages(state["messages"])
+        summary, summarized_count = state.get("summary"), state.get("summarized_count", 0)
+    else:
+        messages, _ = await aload_chat_history(user_number, "epi", session_id)
+    if messages:
+        print(f"♻️ [SESSION] 저장된 대화 이력 복원: {user_number} - {session_id} ({len(messages)}개)")
+    return new_session_entry(user_number, session_id, messages, summary, summarized_count)
+
+def refresh_from_backend(key, state):
+    """다른 워커가 더 진행한 대화가 백엔드에 있으면 로컬 캐시의 대화 이력과 Firestore 저장 완료 지점을 갱신"""
+    history = store[key]["history"]
+    store[key]["backend_version"] = state["version"] if state else 0
+    if state and state["version"] > len(history.messages):
+        history.messages = to_messages(state["messages"])
+        store.resize(key)
+    if state:
+        # ✅ 다른 워커가 이미 저장한 턴을 다시 보내지 않도록 저장 완료 지점도 함께 이동
+        sync_persisted_count(*parse_session_key(key), state.get("persisted_count"))
+    if state and state.get("summarized_count", 0) > store[key]["summarized_count"]:
+        store[key]["summary"] = state["summary"]
+        store[key]["summarized_count"] = state["summarized_count"]
+
+def open_session(user_number, session_id):
+    """세션 캐시에서 세션을 가져오고 (미스 시 복원) 백엔드와 동기화한 뒤 세션 키 반환"""
+    key = session_key(user_number, "epi", session_id)
+    store.get_or_load(key, lambda: load_session(user_number, session_id))
+    refresh_from_backend(key, session_backend.load(key))
+    return key
+
+async def aopen_session(user_number, session_id):
+    """open_session의 async 버전"""
+    key = session_key(user_number, "epi", session_id)
+    await store.aget_or_load(key, lambda: aload_session(user_number, session_id))
+    refresh_from_backend(key, await run_blocking(session_backend.load, key))
+    return key
+
+def save_session_state(key):
+    """대화 이력과 토픽을 세션 백엔드에 저장 (다른 워커/재시작 후에도 이어서 대화 가능)
+
+    다른 워커가 같은 세션의 턴을 먼저 저장했으면(version 충돌) 최신 대화 이력 뒤에 이번 턴을 붙여 다시 저장
+    """
+    store.resize(key)  # ✅ 이번 턴으로 늘어난 대화 이력만큼 메모리 사용량 갱신
+    entry = store[key]
+    for _ in range(SAVE_RETRIES):
+        messages = entry["history"].messages
+        try:
+            session_backend.save(key, {
+                "messages": to_records(messages),
+                "topic": entry["topic"],
+                "topic_description": entry["topic_description"],
+                "version": len(messages),
+                "summary": entry["summary"],
+                "summarized_count": entry["summarized_count"],
+                "persisted_count": peek_persisted_count(*parse_session_key(key)),
+            }, expected_version=entry["backend_version"])
+            entry["backend_version"] = len(messages)
+            return
+        except VersionConflict:
+            new_messages = messages[entry["backend_version"]:]
+            print(f"⚠️ [SESSION] 다른 워커가 먼저 저장함 → 최신 대화 이력 뒤에 이번 턴 {len(new_messages)}개를 붙여 다시 저장: {key}")
+            latest = session_backend.load(key) or {"messages": [], "version": 0}
+            entry["history"].messages = to_messages(latest["messages"]) + new_messages
+            refresh_from_backend(key, latest)
+    raise VersionConflict(f"{key}: {SAVE_RETRIES}회 재시도 후에도 저장 실패")
+
 
 ## ✅ 대화 실행 함수 (세션 내에서 유지)
 def chat(user_number, input_text, session_id):
     """미리 생성된 LLM 실행체를 사용하여 대화 수행"""
     print("✅ 현재 대화 세션:", session_id)
 
-    # ✅ 세션이 초기화되지 않았다면 실행
-    if session_id not in store or store[session_id]["llm"] is None:
+    # ✅ 세션 캐시/백엔드에서 조회 (캐시 미스 시 저장된 대화 이력 복원), 초기화되지 않았다면 실행
+    key = open_session(user_number, session_id)
+    if store[key]["llm"] is None:
         initialize_session(user_number, session_id)
 
     # ✅ 현재 세션의 대화 기록 가져오기
-    chat_history = get_session_history(session_id).messages
+    chat_history = get_session_history(key).messages
+    turn_start, user_time = len(chat_history), datetime.now().isoformat()  # ✅ 이번 턴에 추가될 메시지 위치와 사용자 메시지 시각
 
     # ✅ 미리 생성된 LLM 실행체 사용
     chatbot_with_history = RunnableWithMessageHistory(
-        store[session_id]["llm"],
+        store[key]["llm"],
         get_session_history,
         input_messages_key="input",
         history_messages_key="history",
@@ -196,87 +333,130 @@ def chat(user_number, input_text, session_id):
             "input": input_text,
             "history": chat_history
         },
-        config={"configurable": {"session_id": session_id}}
+        config={"configurable": {"session_id": key}}
     )
+
+    # ✅ RunnableWithMessageHistory가 추가한 사용자/AI 메시지에 생성 시각 기록 (저장 시각이 아니라 실제 시각으로 응답 시간 분석)
+    stamp_turn(get_session_history(key).messages[turn_start:], user_time)
+
     save_chat_log(user_number, session_id)
     
     return response.content
 
-import sys
-import asyncio
+## ✅ 비동기 대화 실행 함수 (FastAPI 엔드포인트용)
+async def achat(user_number, input_text, session_id):
+    """chat의 async 버전: LLM 호출(ainvoke)과 Firestore 접근이 이벤트 루프를 막지 않음"""
+    print("✅ 현재 대화 세션:", session_id)
+
+    # ✅ 같은 세션의 턴은 하나씩 처리 (조회 → LLM 호출 → 저장 사이에 다른 턴이 끼어들면 이력/저장 지점이 어긋남)
+    async with store.turn_lock(session_key(user_number, "epi", session_id)):
+        # ✅ 세션 캐시/백엔드에서 조회 (캐시 미스 시 저장된 대화 이력 복원), 초기화되지 않았다면 실행
+        key = await aopen_session(user_number, session_id)
+        if store[key]["llm"] is None:
+            await ainitialize_session(user_number, session_id)
+
+        # ✅ 현재 세션의 대화 기록 가져오기
+        chat_history = get_session_history(key).messages
+        turn_start, user_time = len(chat_history), datetime.now().isoformat()  # ✅ 이번 턴에 추가될 메시지 위치와 사용자 메시지 시각
+
+        chatbot_with_history = RunnableWithMessageHistory(
+            store[key]["llm"],
+            get_session_history,
+            input_messages_key="input",
+            history_messages_key="history",
+        )
+
+        # ✅ LLM 실행 (async)
+        response = await chatbot_with_history.ainvoke(
+            {
+                "input": input_text,
+                "history": chat_history
+            },
+            config={"configurable": {"session_id": key}}
+        )
+
+        # ✅ 이번 턴의 사용자/AI 메시지에 생성 시각 기록
+        stamp_turn(get_session_history(key).messages[turn_start:], user_time)
+
+        await asave_chat_log(user_number, session_id)
+
+    return response.content
 
 async def chat_stream(user_number, input_text, session_id):
-    """OpenAI API 스트리밍을 사용하여 실시간으로 응답을 전송"""
+    """OpenAI API 스트리밍(astream)으로 응답 텍스트 청크를 생성하는 async 제너레이터 반환"""
 
     print("✅ 현재 대화 세션:", session_id)
 
-    # ✅ 세션이 초기화되지 않았다면 실행
-    if session_id not in store or store[session_id]["llm"] is None:
-        initialize_session(user_number, session_id)
+    # ✅ 세션 캐시/백엔드에서 조회 (캐시 미스 시 저장된 대화 이력 복원), 초기화되지 않았다면 실행
+    key = await aopen_session(user_number, session_id)
+    if store[key]["llm"] is None:
+        await ainitialize_session(user_number, session_id)
         
-    # ✅ 🆕 최신 토픽 불러오기 (세션 저장된 topic이 아니라, 매번 최신 데이터 불러오기)
-    topic, topic_description = load_user_topic(user_number, session_id)
-    store[session_id]["topic"] = topic
-    store[session_id]["topic_description"] = topic_description
-
-    # ✅ 🆕 토픽이 바뀌었으면 로그 출력 (디버깅)
-    print(f"📌 [DEBUG] 최신 토픽 업데이트됨: {topic}")
-
-    # ✅ 현재 세션의 대화 기록 가져오기
-    chat_history = get_session_history(session_id).messages
+    # ✅ 세션 토픽 사용 (세션 초기화 시 토픽 캐시에서 불러온 값이며, 대화 중에는 바뀌지 않음)
+    print(f"📌 [DEBUG] 현재 세션 토픽: {store[key]['topic']}")
 
     chatbot_with_history = RunnableWithMessageHistory(
-        store[session_id]["llm"],  
+        store[key]["llm"],  
         get_session_history,
         input_messages_key="input",
         history_messages_key="history",
     )
 
     async def generate():
-        full_response = ""  # ✅ 전체 응답을 저장할 변수
-
-        async for chunk in chatbot_with_history.astream(
-            {
-                "input": input_text,
-                "history": chat_history
-            },
-            config={"configurable": {"session_id": session_id}}
-        ):
-            if chunk:
-                text = chunk.content
-                full_response += text  # ✅ 전체 응답을 저장
-                
-                print(f"📝 [STREAM] {text}", end="", flush=True)
-                sys.stdout.flush()  # ✅ 강제로 즉시 출력 반영
-                
-                yield text  # ✅ 한 단어씩 반환
-                await asyncio.sleep(0.01)  # ✅ 속도 조절 (선택 사항)
-
-        # ✅ 스트리밍이 끝난 후 전체 응답을 로그에 저장
-        chat_history.append(AIMessage(content=full_response))
-        save_chat_log(user_number, session_id)  # ✅ 로그 저장
+        # ✅ 같은 세션의 턴은 하나씩 처리 → 잠금을 얻은 뒤 백엔드와 다시 동기화하고 그 시점의 대화 이력으로 시작
+        async with store.turn_lock(key):
+            await aopen_session(user_number, session_id)
+            chat_history = get_session_history(key).messages
+            turn_start, user_time = len(chat_history), datetime.now().isoformat()  # ✅ 이번 턴에 추가될 메시지 위치와 사용자 메시지 시각
+            # ✅ 청크를 그대로 전달 (프레임 병합, 속도 제한, 디버그 로그는 stream_utils.sse_stream에서 처리)
+            async for chunk in chatbot_with_history.astream(
+                {
+                    "input": input_text,
+                    "history": chat_history
+                },
+                config={"configurable": {"session_id": key}}
+            ):
+                if chunk:
+                    yield chunk.content
+
+            # ✅ 이번 턴의 사용자/AI 메시지에 생성 시각 기록
+            stamp_turn(get_session_history(key).messages[turn_start:], user_time)
+
+            # ✅ 스트리밍이 끝난 후 로그 저장 (대화 이력에는 RunnableWithMessageHistory가 응답을 추가하므로 직접 추가하지 않음)
+            await asave_chat_log(user_number, session_id)  # ✅ 로그 저장
 
     return generate()
 
 
 
 def save_chat_log(user_number, session_id):
-    """대화 이력을 Firestore에 저장"""
-    chat_history = store.get(session_id, {}).get("history", ChatMessageHistory()).messages
-    session_number = int(session_id.split("/")[-1])
-
-    chat_log = []
-    for msg in chat_history:
-        chat_log.append({
-            "session_id": session_id,
-            "persona": "epi",
-            "topic": store[session_id]["topic"],
-            "role": "user" if isinstance(msg, HumanMessage) else "ai",
-            "content": msg.content,
-            "timestamp": getattr(msg, "timestamp", datetime.now().isoformat()),
-        })
-
-    # ✅ Firestore에 저장
-    db.collection("chat_logs").document(user_number).collection("epi").document(str(session_number)).set({"messages": chat_log})
-
-    print(f"✅ Firestore에 대화 로그가 저장되었습니다: {user_number} - 세션 {session_number}")
+    """새로 추가된 대화 턴만 Firestore에 저장"""
+    key = session_key(user_number, "epi", session_id)
+    session_number = get_session_number(session_id)
+
+    # ✅ 세션 백엔드에 먼저 저장 (다른 워커와 충돌하면 이력이 다시 정렬되므로 그 뒤의 이력으로 Firestore에 추가)
+    save_session_state(key)
+    chat_history = store.get(key, {}).get("history", ChatMessageHistory()).messages
+
+    # ✅ Firestore에 저장 (이미 저장된 메시지는 건너뛰고 새 메시지만 추가)
+    saved = append_chat_log(user_number, "epi", session_id, chat_history, store[key]["topic"])
+
+    print(f"✅ Firestore에 대화 로그가 저장되었습니다: {user_number} - 세션 {session_number} (+{saved})")
+
+    # ✅ 최근 대화가 토큰 예산을 넘으면 오래된 턴을 백그라운드에서 요약
+    schedule_summary(store[key], "epi")
+
+
+async def asave_chat_log(user_number, session_id):
+    """save_chat_log의 async 버전"""
+    key = session_key(user_number, "epi", session_id)
+    session_number = get_session_number(session_id)
+
+    await run_blocking(save_session_state, key)
+    chat_history = store.get(key, {}).get("history", ChatMessageHistory()).messages
+    saved = await aappend_chat_log(user_number, "epi", session_id, chat_history, store[key]["topic"])
+
+    print(f"✅ Firestore에 대화 로그가 저장되었습니다: {user_number} - 세션 {session_number} (+{saved})")
+
+    # ✅ 최근 대화가 토큰 예산을 넘으면 오래된 턴을 백그라운드에서 요약 (응답 전송 후 실행)
+    schedule_summary(store[key], "epi")
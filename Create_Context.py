@@ -1,7 +1,10 @@
 from langchain_community.tools import TavilySearchResults
+import asyncio
 import json
 import os
 from dotenv import load_dotenv
+from search_utils import SearchStage, SearchCache, create_provider
+from near_dup import TextDedupIndex
 
 user_number = "P0"
 
@@ -17,59 +20,91 @@ tavily_tool = TavilySearchResults(
     include_images=False,
 )
 
+# ✅ 검색 단계 (동시 실행 제한 + rate limit 재시도 + 정규화된 쿼리 기준 로컬 캐시, SEARCH_PROVIDER=stub이면 오프라인)
+search_stage = SearchStage(create_provider(tavily_tool), cache=SearchCache())
+
 def search_web(query):
     """🔍 Tavily API를 사용하여 웹 검색 실행"""
-    return tavily_tool.invoke({"query": query})  # ✅ 리스트 반환
-
-# ✅ User_Query 불러오기
-input_filepath = f"User_Query/{user_number}.json"
-
-with open(input_filepath, "r", encoding="utf-8") as file:
-    query_data = json.load(file)
-
-# ✅ 검색 결과 저장 경로
-output_filepath = f"User_Context/{user_number}.json"
-os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+    return asyncio.run(search_stage.search(query))  # ✅ 리스트 반환
+
+async def asearch_web(query):
+    """search_web의 async 버전 (배치 파이프라인에서 동시 실행용)"""
+    return await search_stage.search(query)
+
+def collect_results(role, masked_experience, query, results, retrieved_urls, content_index=None):
+    """검색 결과를 context 항목으로 변환 (retrieved_urls에 있는 URL, content_index에 거의 같은 본문이 있는 결과는 건너뜀)"""
+    entries = []
+    if not isinstance(results, list):  # ✅ 예전 체크포인트에 저장된 오류 문자열 등은 건너뜀
+        return entries
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        url = result.get("url", "No URL")  # ✅ URL 가져오기
+        content = result.get("content", "").strip()  
+        snippet = result.get("snippet", "").strip() 
+
+        # ✅ 중복된 URL 방지
+        if url in retrieved_urls:
+            continue  
+        retrieved_urls.add(url)
+        
+        final_content = content if content else snippet
+
+        # ✅ URL만 다르고 본문이 거의 같은 결과(미러, 재게시 글) 방지
+        if content_index is not None and final_content and not content_index.add(final_content):
+            continue
+
+        entries.append({
+            "role": role,
+            "masked_episode": masked_experience,  
+            "query": query,
+            "url": url,
+            "content": final_content if final_content else "No content available" 
+        })
+    return entries
+
+def save_context_data(user_number, context_data):
+    """✅ 검색 결과를 JSON 파일로 저장"""
+    output_filepath = f"User_Context/{user_number}.json"
+    os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+    with open(output_filepath, "w", encoding="utf-8") as file:
+        json.dump(context_data, file, indent=4, ensure_ascii=False)
+    return output_filepath
 
 
 ##### ===== 실행 코드 ===== #####
-
-context_data = {"context": []}
-retrieved_urls = set()  # ✅ 중복 방지를 위한 URL 저장
-
-for query_entry in query_data["queries"]:
-    role = query_entry["role"]
-    masked_experience = query_entry["masked_episode"]  # ✅ Masked Experience 추가
-    
-    for query in query_entry["expanded_queries"]:
-        print(f"🔍 Searching: {query}")
-        results = search_web(query)  # ✅ Tavily API 검색 실행
-
-        # ✅ 검색 결과를 순회하며 저장
-        for result in results:
-            url = result.get("url", "No URL")  # ✅ URL 가져오기
-            content = result.get("content", "").strip()  
-            snippet = result.get("snippet", "").strip() 
-
-            # ✅ 중복된 URL 방지
-            if url in retrieved_urls:
-                continue  
-            retrieved_urls.add(url)
-            
-            final_content = content if content else snippet
-
-            # ✅ 결과 저장
-            context_data["context"].append({
-                "role": role,
-                "masked_episode": masked_experience,  
-                "query": query,
-                "url": url,
-                "content": final_content if final_content else "No content available" 
-            })
-
-# ✅ JSON 파일로 저장
-with open(output_filepath, "w", encoding="utf-8") as file:
-    json.dump(context_data, file, indent=4, ensure_ascii=False)
-
-print("✅ 관련 경험 검색 완료 & 저장:", output_filepath)
-
+def create_context(user_number):
+    """User_Query의 확장 쿼리로 웹 검색을 수행하여 User_Context 생성"""
+    input_filepath = f"User_Query/{user_number}.json"
+    with open(input_filepath, "r", encoding="utf-8") as file:
+        query_data = json.load(file)
+
+    context_data = {"context": []}
+    retrieved_urls = set()  # ✅ 중복 방지를 위한 URL 저장
+    content_index = TextDedupIndex()  # ✅ 거의 같은 본문 방지 (MinHash/LSH)
+
+    # ✅ 모든 확장 쿼리를 한 번에 동시 검색 (캐시에 있는 쿼리는 API 호출 없음)
+    queries = [query for query_entry in query_data["queries"] for query in query_entry["expanded_queries"]]
+    print(f"🔍 Searching: {len(queries)}개 쿼리")
+    results_by_query = iter(asyncio.run(search_stage.search_many(queries, return_exceptions=True)))
+
+    for query_entry in query_data["queries"]:
+        role = query_entry["role"]
+        masked_experience = query_entry["masked_episode"]  # ✅ Masked Experience 추가
+        
+        for query in query_entry["expanded_queries"]:
+            results = next(results_by_query)
+            if isinstance(results, Exception):
+                print(f"🚨 [SEARCH] 검색 실패 (건너뜀): {query} - {results}")
+                continue
+            context_data["context"].extend(collect_results(role, masked_experience, query, results, retrieved_urls, content_index))
+
+    print(f"📊 검색 지표: {search_stage.stats}, 본문 중복 제거: {content_index.stats['duplicates']}개")
+
+    output_filepath = save_context_data(user_number, context_data)
+    print("✅ 관련 경험 검색 완료 & 저장:", output_filepath)
+    return context_data
+
+
+if __name__ == "__main__":
+    create_context(user_number)
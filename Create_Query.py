@@ -1,18 +1,22 @@
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+from typing import List
+import argparse
+import asyncio
 import json
 import os
 import re
+from llm_cache import llm_cache, langchain_cache
 
 participant_number = "P0"
 
-# ✅ OpenAI 모델 설정
-llm = ChatOpenAI(model_name="gpt-4o", temperature=0)
+# ✅ OpenAI 모델 설정 (같은 프롬프트는 로컬 LLM 캐시에서 재사용, LLM_CACHE_MODE로 조정)
+llm = ChatOpenAI(model_name="gpt-4o", temperature=0, cache=langchain_cache("create_query"))
 
 # ✅ 개선된 Masking & Query Expansion 프롬프트
-masked_query_prompt = PromptTemplate.from_template(
-"""
+TASK_INSTRUCTIONS = """
 task1. Rephrase the experience in a form that can be used for web searches (blogs, articles, Wikipedia) without personal information and generate additional search terms. 
 - Replace and rephrase personal information (place names, organizations, personal identifiers, etc.) in given experience. 
 - If there is no personal information, print out the given experience as is.
@@ -29,8 +33,11 @@ task2. Create two queries optimized to retrieve distinctive experiences relevant
 - 가족 내 장녀의 역할이 긍정적이고 부정적인 성격을 어떻게 형성하는지 알아보세요.
 - 여행을 통해 자신의 개성을 재발견한 사람들의 이야기를 찾아보세요.
 
-- Role : { role }
-- Experience : { episode }
+"""
+
+masked_query_prompt = PromptTemplate.from_template(
+TASK_INSTRUCTIONS + """- Role : {role}
+- Experience : {episode}
 
 Output format:
 Masked Episode: [Provide the rephrased episode in a single sentence.]
@@ -40,9 +47,32 @@ Expanded Queries (Only Two):
 """
 )
 
+# ✅ 한 참가자의 모든 에피소드를 한 번에 처리하는 배치 프롬프트 (구조화된 출력)
+batch_query_prompt = PromptTemplate.from_template(
+TASK_INSTRUCTIONS + """Apply task1 and task2 to each item below independently.
+Return exactly one result per item, using the same id. Each result must contain the masked episode (a single sentence) and exactly two expanded queries.
+
+{items}
+"""
+)
+
 
 llm_chain = LLMChain(llm=llm, prompt=masked_query_prompt)
 
+# ✅ 배치 응답 스키마 (function calling으로 JSON 구조 강제)
+class EpisodeQueries(BaseModel):
+    id: str = Field(description="The id of the input item")
+    masked_episode: str = Field(description="The rephrased episode in a single sentence (Korean)")
+    expanded_queries: List[str] = Field(description="Exactly two search queries (Korean)")
+
+class BatchQueries(BaseModel):
+    items: List[EpisodeQueries]
+
+batch_chain = batch_query_prompt | llm.with_structured_output(BatchQueries)
+
+# ✅ 배치 처리 지표
+batch_stats = {"batch_calls": 0, "batch_items": 0, "batch_failures": 0, "fallback_calls": 0, "fallback_failures": 0}
+
 def parse_llm_response(response_text):
     """LLM의 응답을 `masked_episode`와 `expanded_queries`로 분리"""
     masked_episode = ""
@@ -66,40 +96,157 @@ def generate_expanded_queries(role, episode):
     response = llm_chain.invoke({"role": role, "episode": episode})
     return parse_llm_response(response["text"])
 
-# 🔹 User Info 불러오기
-input_filepath = f"User_info/{participant_number}.json"
-with open(input_filepath, "r", encoding="utf-8") as file:
-    user_info = json.load(file)
-
-# 🔹 User Query 저장 경로
-output_filepath = f"User_Query/{participant_number}.json"
-
-# 🔹 Role & Episode 기반 Rephrased Query 생성 실행
-query_data = {"queries": []}
+async def agenerate_expanded_queries(role, episode):
+    """generate_expanded_queries의 async 버전 (배치 파이프라인에서 동시 실행용)"""
+    response = await llm_chain.ainvoke({"role": role, "episode": episode})
+    return parse_llm_response(response["text"])
 
-for role_key, role_data in user_info["Episode"].items():
-    role_name = role_data["Role"]
-    
-    for ep_key in ["Ep1", "Ep2"]:
-        if ep_key in role_data:
-            episode = role_data[ep_key]
-            try:
-                # 🔹 Masked Experience & Expanded Queries 생성
-                masked_episode, expanded_queries = generate_expanded_queries(role_name, episode)
-
-                # 🔹 검색용 Query 저장
-                query_data["queries"].append({
-                    "role": role_name,
-                    "original_episode": episode,
-                    "masked_episode": masked_episode,  # ✅ 첫 번째 문장만 저장
-                    "expanded_queries": expanded_queries  # ✅ Query 리스트 저장
-                })
-            except Exception as e:
-                print(f"❌ 오류 발생 (role: {role_name}): {e}")
-
-# 🔹 JSON 파일로 저장
-os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
-with open(output_filepath, "w", encoding="utf-8") as file:
-    json.dump(query_data, file, indent=4, ensure_ascii=False)
-
-print("✅ Episode Rephrase & Query Expansion 완료 & 저장:", output_filepath)
+def format_batch_items(items):
+    """배치 프롬프트에 넣을 항목 목록 (id, Role, Experience)"""
+    return "\n\n".join(
+        f"[id: {item_id}]\n- Role : {role}\n- Experience : {episode}" for item_id, role, episode in items
+    )
+
+def validate_batch_item(result):
+    """배치 결과 항목 검증 후 (masked_episode, expanded_queries) 반환 (형식이 어긋나면 None)"""
+    if result is None:
+        return None
+    masked_episode = result.masked_episode.strip()
+    expanded_queries = [query.strip() for query in result.expanded_queries if query.strip()]
+    if not masked_episode or not expanded_queries:
+        return None
+    return masked_episode, expanded_queries[:2]
+
+async def agenerate_expanded_queries_batch(items, limit=None):
+    """여러 (id, role, episode)를 한 번의 구조화된 출력 호출로 처리하고, 실패한 항목만 개별 호출로 다시 처리
+
+    반환값: {id: (masked_episode, expanded_queries) 또는 Exception}
+    """
+    limit = limit or asyncio.Semaphore(1)
+    parsed = {}
+    try:
+        async with limit:
+            batch_stats["batch_calls"] += 1
+            response = await batch_chain.ainvoke({"items": format_batch_items(items)})
+        parsed = {result.id.strip(): result for result in response.items}
+    except Exception as e:
+        print(f"⚠️ 배치 호출 실패 → 개별 호출로 전환: {e}")
+
+    async def fallback(role, episode):
+        batch_stats["fallback_calls"] += 1
+        try:
+            async with limit:
+                return await agenerate_expanded_queries(role, episode)
+        except Exception as e:
+            batch_stats["fallback_failures"] += 1
+            return e
+
+    results = {}
+    retry = []
+    for item_id, role, episode in items:
+        batch_stats["batch_items"] += 1
+        validated = validate_batch_item(parsed.get(item_id))
+        if validated is None:
+            batch_stats["batch_failures"] += 1
+            retry.append((item_id, role, episode))
+        else:
+            results[item_id] = validated
+
+    fallback_results = await asyncio.gather(*(fallback(role, episode) for _, role, episode in retry))
+    for (item_id, _, _), result in zip(retry, fallback_results):
+        results[item_id] = result
+    return results
+
+def iter_episodes(user_info):
+    """User Info의 (role_key, role_name, ep_key, episode) 순회"""
+    for role_key, role_data in user_info["Episode"].items():
+        for ep_key in ["Ep1", "Ep2"]:
+            if ep_key in role_data:
+                yield role_key, role_data["Role"], ep_key, role_data[ep_key]
+
+def build_query_entry(role_name, episode, masked_episode, expanded_queries):
+    """User_Query 파일의 queries 항목 생성"""
+    return {
+        "role": role_name,
+        "original_episode": episode,
+        "masked_episode": masked_episode,  # ✅ 첫 번째 문장만 저장
+        "expanded_queries": expanded_queries  # ✅ Query 리스트 저장
+    }
+
+def save_query_data(participant_number, query_data):
+    """🔹 User Query를 JSON 파일로 저장"""
+    output_filepath = f"User_Query/{participant_number}.json"
+    os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+    with open(output_filepath, "w", encoding="utf-8") as file:
+        json.dump(query_data, file, indent=4, ensure_ascii=False)
+    return output_filepath
+
+def load_user_info(participant_number):
+    """🔹 User Info 불러오기"""
+    with open(f"User_info/{participant_number}.json", "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def episode_id(role_key, ep_key):
+    return f"{role_key}/{ep_key}"
+
+async def acreate_queries(participant_number, limit=None):
+    """🔹 한 참가자의 모든 에피소드를 배치로 처리하여 User_Query 생성 (실패한 항목만 개별 호출)"""
+    user_info = load_user_info(participant_number)
+    episodes = list(iter_episodes(user_info))
+    results = await agenerate_expanded_queries_batch(
+        [(episode_id(role_key, ep_key), role_name, episode) for role_key, role_name, ep_key, episode in episodes], limit
+    )
+
+    query_data = {"queries": []}
+    for role_key, role_name, ep_key, episode in episodes:
+        result = results[episode_id(role_key, ep_key)]
+        if isinstance(result, Exception):
+            print(f"❌ 오류 발생 (role: {role_name}): {result}")
+            continue
+        masked_episode, expanded_queries = result
+        query_data["queries"].append(build_query_entry(role_name, episode, masked_episode, expanded_queries))
+
+    output_filepath = save_query_data(participant_number, query_data)
+    print("✅ Episode Rephrase & Query Expansion 완료 & 저장:", output_filepath)
+    return query_data
+
+async def acreate_queries_many(participant_numbers, concurrency=4):
+    """여러 참가자를 동시에 처리 (OpenAI 동시 요청 수 제한)"""
+    limit = asyncio.Semaphore(concurrency)
+    await asyncio.gather(*(acreate_queries(participant, limit) for participant in participant_numbers))
+    print(f"📊 배치 지표: {batch_stats}")
+    llm_cache.report()
+
+def create_queries(participant_number):
+    """🔹 Role & Episode 기반 Rephrased Query 생성 실행 (에피소드별 개별 호출)"""
+    user_info = load_user_info(participant_number)
+
+    query_data = {"queries": []}
+
+    for role_key, role_name, ep_key, episode in iter_episodes(user_info):
+        try:
+            # 🔹 Masked Experience & Expanded Queries 생성
+            masked_episode, expanded_queries = generate_expanded_queries(role_name, episode)
+
+            # 🔹 검색용 Query 저장
+            query_data["queries"].append(build_query_entry(role_name, episode, masked_episode, expanded_queries))
+        except Exception as e:
+            print(f"❌ 오류 발생 (role: {role_name}): {e}")
+
+    output_filepath = save_query_data(participant_number, query_data)
+    print("✅ Episode Rephrase & Query Expansion 완료 & 저장:", output_filepath)
+    return query_data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Episode Rephrase & Query Expansion")
+    parser.add_argument("participants", nargs="*", default=[participant_number])
+    parser.add_argument("--concurrency", type=int, default=4, help="동시에 처리할 OpenAI 요청 수")
+    parser.add_argument("--no-batch", action="store_true", help="에피소드별 개별 호출 사용 (기존 방식)")
+    args = parser.parse_args()
+
+    if args.no_batch:
+        for participant in args.participants:
+            create_queries(participant)
+    else:
+        asyncio.run(acreate_queries_many(args.participants, args.concurrency))
@@ -4,13 +4,14 @@ from collections import defaultdict
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
+from llm_cache import langchain_cache
 
 
 participant_number = "P0"
 
 
 # OpenAI 모델 설정
-llm = ChatOpenAI(model_name="gpt-4o", temperature=0.8)
+llm = ChatOpenAI(model_name="gpt-4o", temperature=0.8, cache=langchain_cache("epi_augmentation"))
 
 # ✅ 개선된 Action Patterns 추론 프롬프트
 experience_augmentation_prompt = PromptTemplate.from_template(
@@ -62,63 +63,84 @@ def generate_augmented_experiences(role, episode1, episode2, retrieved_experienc
     return [ep.strip("- ") for ep in episodes if ep.strip()]  # 리스트 정리
 
 
-# 🔹 User_Context/P0.json 불러오기
-context_filepath = f"User_Context/{participant_number}.json"
-with open(context_filepath, "r", encoding="utf-8") as file:
-    user_context = json.load(file)
-    
-# ✅ User_Query/P0.json 불러오기
-query_filepath = f"User_Query/{participant_number}.json"
-with open(query_filepath, "r", encoding="utf-8") as file:
-    user_query = json.load(file)
-
-# 🔹 User_Info/P0.json 불러오기
-user_info_filepath = f"User_info/{participant_number}.json"
-with open(user_info_filepath, "r", encoding="utf-8") as file:
-    user_info = json.load(file)
-
-# ✅ Role별 검색된 경험 저장
-role_experiences = defaultdict(list)
-
-for context_data in user_context["context"]:
-    role = context_data["role"]
-    role_experiences[role].append({
-        "url": context_data["url"],
-        "content": context_data["content"]
+async def agenerate_augmented_experiences(role, episode1, episode2, retrieved_experiences):
+    """generate_augmented_experiences의 async 버전 (배치 파이프라인에서 동시 실행용)"""
+    response = await llm_chain.ainvoke({
+        "role": role,
+        "episode1": episode1,
+        "episode2": episode2,
+        "retrieved_experiences": retrieved_experiences
     })
-    
-# ✅ User_Query에서 masked_episode 가져오기
-role_masked_episodes = defaultdict(list)
+    episodes = response["text"].strip().split("\n")
+    return [ep.strip("- ") for ep in episodes if ep.strip()]
 
-for query_entry in user_query["queries"]:
-    role = query_entry["role"]
-    masked_episode = query_entry["masked_episode"]
-    role_masked_episodes[role].append(masked_episode)
 
-# ✅ Role과 연결된 검색 경험 기반으로 Augmentation 수행
-for role_key, role_data in user_info["Episode"].items():
-    role = role_data["Role"]
-    
-    # ✅ Ep1, Ep2 가져오기 (masked_episode 사용)
-    masked_episodes = role_masked_episodes.get(role, ["", ""])
-    episode1 = masked_episodes[0] if len(masked_episodes) > 0 else ""
-    episode2 = masked_episodes[1] if len(masked_episodes) > 1 else ""
-    
-    # ✅ 같은 Role의 검색된 경험 가져오기
-    retrieved_experiences = compile_retrieved_experiences(role, role_experiences.get(role, []))
+def group_role_experiences(user_context):
+    """✅ Role별 검색된 경험 저장"""
+    role_experiences = defaultdict(list)
+    for context_data in user_context["context"]:
+        role = context_data["role"]
+        role_experiences[role].append({
+            "url": context_data["url"],
+            "content": context_data["content"]
+        })
+    return role_experiences
+
+
+def group_masked_episodes(user_query):
+    """✅ User_Query에서 Role별 masked_episode 가져오기"""
+    role_masked_episodes = defaultdict(list)
+    for query_entry in user_query["queries"]:
+        role = query_entry["role"]
+        masked_episode = query_entry["masked_episode"]
+        role_masked_episodes[role].append(masked_episode)
+    return role_masked_episodes
+
+
+def augment_user_info(participant_number):
+    """🔹 Role과 연결된 검색 경험 기반으로 Augmentation 수행 후 User_Info에 Experiencable 저장"""
+    # 🔹 User_Context/P0.json 불러오기
+    context_filepath = f"User_Context/{participant_number}.json"
+    with open(context_filepath, "r", encoding="utf-8") as file:
+        user_context = json.load(file)
         
-    if retrieved_experiences and episode1 and episode2:  # 검색된 경험과 에피소드가 있을 때 실행
-        augmented_episodes = generate_augmented_experiences(role, episode1, episode2, retrieved_experiences)
+    # ✅ User_Query/P0.json 불러오기
+    query_filepath = f"User_Query/{participant_number}.json"
+    with open(query_filepath, "r", encoding="utf-8") as file:
+        user_query = json.load(file)
+
+    # 🔹 User_Info/P0.json 불러오기
+    user_info_filepath = f"User_info/{participant_number}.json"
+    with open(user_info_filepath, "r", encoding="utf-8") as file:
+        user_info = json.load(file)
+
+    role_experiences = group_role_experiences(user_context)
+    role_masked_episodes = group_masked_episodes(user_query)
+
+    for role_key, role_data in user_info["Episode"].items():
+        role = role_data["Role"]
+        
+        # ✅ Ep1, Ep2 가져오기 (masked_episode 사용)
+        masked_episodes = role_masked_episodes.get(role, ["", ""])
+        episode1 = masked_episodes[0] if len(masked_episodes) > 0 else ""
+        episode2 = masked_episodes[1] if len(masked_episodes) > 1 else ""
+        
+        # ✅ 같은 Role의 검색된 경험 가져오기
+        retrieved_experiences = compile_retrieved_experiences(role, role_experiences.get(role, []))
+            
+        if retrieved_experiences and episode1 and episode2:  # 검색된 경험과 에피소드가 있을 때 실행
+            augmented_episodes = generate_augmented_experiences(role, episode1, episode2, retrieved_experiences)
 
-        # ✅ User_Info/P0.json에 Experiencable 추가
-        role_data["Experiencable"] = augmented_episodes  
-        print(f"✅ {role}의 Experiencable Episodes 추가 완료")
+            # ✅ User_Info/P0.json에 Experiencable 추가
+            role_data["Experiencable"] = augmented_episodes  
+            print(f"✅ {role}의 Experiencable Episodes 추가 완료")
 
-# ✅ JSON 파일로 저장
-with open(user_info_filepath, "w", encoding="utf-8") as file:
-    json.dump(user_info, file, indent=4, ensure_ascii=False)
+    # ✅ JSON 파일로 저장
+    with open(user_info_filepath, "w", encoding="utf-8") as file:
+        json.dump(user_info, file, indent=4, ensure_ascii=False)
 
-print("🎯 Episode Augmentation 완료 & 저장:", user_info_filepath)
+    print("🎯 Episode Augmentation 완료 & 저장:", user_info_filepath)
+    return user_info
 
 
 ##### ===== Persona 생성 ===== #####
@@ -147,11 +169,7 @@ def create_persona(user_info_path, user_query_path, save_path):
     }
 
     # ✅ Role별 `masked_episode` 저장
-    role_masked_episodes = defaultdict(list)
-    for query_entry in user_query["queries"]:
-        role = query_entry["role"]
-        masked_episode = query_entry["masked_episode"]
-        role_masked_episodes[role].append(masked_episode)
+    role_masked_episodes = group_masked_episodes(user_query)
 
     # ✅ Role & Episode 저장 (`masked_episode` 활용)
     for role_key, role_data in user_info["Episode"].items():
@@ -179,10 +197,12 @@ def create_persona(user_info_path, user_query_path, save_path):
     print("✅ 페르소나 생성 완료 & 저장:", save_path)
     return persona
 
-user_info_path = f"User_info/{participant_number}.json"
-user_query_path = f"User_Query/{participant_number}.json"
-persona_save_path = f"User_info/{participant_number}_Per.json"
-persona = create_persona(user_info_path, user_query_path,  persona_save_path)
+def create_participant_persona(participant_number):
+    """🔹 참가자 번호 기준 경로로 페르소나 생성"""
+    user_info_path = f"User_info/{participant_number}.json"
+    user_query_path = f"User_Query/{participant_number}.json"
+    persona_save_path = f"User_info/{participant_number}_Per.json"
+    return create_persona(user_info_path, user_query_path,  persona_save_path)
 
 
 
@@ -223,6 +243,8 @@ def test_manual_augmentation():
     for i, ep in enumerate(augmented_episodes, 3):
         print(f"Ep{i}: {ep}")
 
-##### 🔹 테스트 실행
+##### 🔹 실행
 if __name__ == "__main__":
+    augment_user_info(participant_number)
+    persona = create_participant_persona(participant_number)
     test_manual_augmentation()
\ No newline at end of file
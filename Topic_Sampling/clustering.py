@@ -0,0 +1,201 @@
+# Headless clustering stage for Topic_Sampling
+# - UMATO 차원 축소 후 후보 k 값들의 KMeans를 joblib으로 병렬 실행
+# - silhouette(기본) 또는 elbow 기준으로 k 자동 선택 (기존: 직접 그래프를 보고 optimal_k = 5 입력)
+# - 그래프는 요청했을 때만 파일로 저장 (Agg 백엔드, plt.show() 없음), 단계별 소요 시간 기록
+# env: AIInterviewer
+
+import argparse
+import contextlib
+import os
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+## ✅ 설정 (환경 변수로 조정 가능)
+CLUSTER_K_MIN = int(os.getenv("CLUSTER_K_MIN", "2"))
+CLUSTER_K_MAX = int(os.getenv("CLUSTER_K_MAX", "10"))
+CLUSTER_METHOD = os.getenv("CLUSTER_METHOD", "silhouette")  # silhouette 또는 elbow
+CLUSTER_N_JOBS = int(os.getenv("CLUSTER_N_JOBS", "-1"))  # joblib 병렬 작업 수 (-1: 모든 코어)
+CLUSTER_PLOT_DIR = os.getenv("CLUSTER_PLOT_DIR", "")  # 비어 있으면 그래프를 만들지 않음
+CLUSTER_SILHOUETTE_SAMPLE = 2000  # 이보다 많으면 silhouette을 표본으로 계산
+CLUSTER_MINIBATCH_MIN_ROWS = 10000  # 이보다 많으면 MiniBatchKMeans 사용
+RANDOM_STATE = 42
+
+METHODS = ("silhouette", "elbow")
+KOREAN_FONTS = ("AppleGothic", "NanumGothic", "Malgun Gothic", "Noto Sans CJK KR")
+
+
+class StepTimer:
+    """단계별 소요 시간 기록"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextlib.contextmanager
+    def step(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - started, 3)
+
+
+#################### 차원 축소 ####################
+
+def reduce_dimensions(matrix, random_state=RANDOM_STATE):
+    """UMATO 2차원 축소 (표본 수에 맞게 hub_num, n_neighbors 조정)"""
+    from umato import UMATO
+
+    num_samples = matrix.shape[0]
+    hub_num = min(num_samples // 2, 30)
+    n_neighbors = min(num_samples // 3, 10)
+    umato = UMATO(n_components=2, hub_num=hub_num, n_neighbors=n_neighbors, random_state=random_state)
+    return umato.fit_transform(matrix)
+
+
+#################### k 선택 ####################
+
+def fit_k(data, k, random_state=RANDOM_STATE):
+    """k 하나에 대해 KMeans 학습 후 inertia, silhouette, label 반환 (joblib 작업 단위)"""
+    model_class = MiniBatchKMeans if len(data) >= CLUSTER_MINIBATCH_MIN_ROWS else KMeans
+    model = model_class(n_clusters=k, random_state=random_state)
+    labels = model.fit_predict(data)
+    sample_size = CLUSTER_SILHOUETTE_SAMPLE if len(data) > CLUSTER_SILHOUETTE_SAMPLE else None
+    silhouette = float(silhouette_score(data, labels, sample_size=sample_size, random_state=random_state))
+    return {"k": k, "inertia": float(model.inertia_), "silhouette": silhouette, "labels": labels}
+
+
+def evaluate_k(data, k_values, n_jobs=CLUSTER_N_JOBS, random_state=RANDOM_STATE):
+    """후보 k 값들을 병렬로 평가 (k 순서대로 반환)"""
+    k_values = [k for k in k_values if 2 <= k < len(data)]
+    return Parallel(n_jobs=n_jobs)(delayed(fit_k)(data, k, random_state) for k in k_values)
+
+
+def elbow_k(ks, inertias):
+    """elbow 지점: (정규화된) 첫 점과 끝 점을 잇는 직선에서 가장 멀리 떨어진 k"""
+    ks = np.asarray(ks, dtype=float)
+    inertias = np.asarray(inertias, dtype=float)
+    if len(ks) < 3:
+        return int(ks[0])
+    x = (ks - ks[0]) / (ks[-1] - ks[0])
+    y = (inertias - inertias.min()) / ((inertias.max() - inertias.min()) or 1.0)
+    # 직선 y = 1 - x 와의 거리 (inertia는 k가 늘수록 감소)
+    distance = np.abs(x + y - 1) / np.sqrt(2)
+    return int(ks[int(np.argmax(distance))])
+
+
+def select_k(results, method=CLUSTER_METHOD):
+    """평가 결과에서 k 선택"""
+    if method not in METHODS:
+        raise ValueError(f"❌ 지원하지 않는 CLUSTER_METHOD: {method} ({', '.join(METHODS)})")
+    if method == "elbow":
+        return elbow_k([r["k"] for r in results], [r["inertia"] for r in results])
+    return max(results, key=lambda r: r["silhouette"])["k"]
+
+
+#################### 그래프 (요청 시 파일로 저장) ####################
+
+def save_plots(reduced, results, labels, best_k, plot_dir, name):
+    """차원 축소 결과, elbow/silhouette 곡선, 군집 결과를 PNG로 저장"""
+    import matplotlib
+    matplotlib.use("Agg")  # 화면 없이 파일로만 저장
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager, rc
+
+    available = {font.name for font in font_manager.fontManager.ttflist}
+    for font in KOREAN_FONTS:
+        if font in available:
+            rc("font", family=font)
+            break
+
+    os.makedirs(plot_dir, exist_ok=True)
+    ks = [r["k"] for r in results]
+    paths = []
+
+    fig, axes = plt.subplots(1, 2, figsize=(12, 5))
+    axes[0].scatter(reduced[:, 0], reduced[:, 1], s=8)
+    axes[0].set_title(f"UMATO ({name})")
+    axes[1].scatter(reduced[:, 0], reduced[:, 1], c=labels, cmap="tab10", s=8)
+    axes[1].set_title(f"KMeans k={best_k} ({name})")
+    for ax in axes:
+        ax.set_xlabel("Component 1")
+        ax.set_ylabel("Component 2")
+    paths.append(os.path.join(plot_dir, f"{name}_clusters.png"))
+    fig.savefig(paths[-1], dpi=120, bbox_inches="tight")
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.plot(ks, [r["inertia"] for r in results], marker="o", label="Inertia")
+    ax.set_xlabel("Number of Clusters (k)")
+    ax.set_ylabel("Inertia")
+    ax2 = ax.twinx()
+    ax2.plot(ks, [r["silhouette"] for r in results], marker="s", color="tab:orange", label="Silhouette")
+    ax2.set_ylabel("Silhouette")
+    ax.axvline(best_k, color="gray", linestyle="--")
+    ax.set_title(f"Elbow / Silhouette ({name})")
+    paths.append(os.path.join(plot_dir, f"{name}_k_selection.png"))
+    fig.savefig(paths[-1], dpi=120, bbox_inches="tight")
+    plt.close(fig)
+    return paths
+
+
+#################### 실행 ####################
+
+def cluster_scenarios(matrix, name="scenarios", k_values=None, method=CLUSTER_METHOD, k=None,
+                      plot_dir=CLUSTER_PLOT_DIR, n_jobs=CLUSTER_N_JOBS, random_state=RANDOM_STATE):
+    """임베딩 행렬 → 차원 축소 → k 평가/선택 → 군집 label
+
+    k를 지정하면 그 값을 사용하고 (평가 곡선은 그래프용으로만 계산), 지정하지 않으면 method 기준으로 선택.
+    반환: {"labels", "reduced", "k", "method", "scores", "timings", "plots"}
+    """
+    timer = StepTimer()
+    k_values = list(k_values or range(CLUSTER_K_MIN, CLUSTER_K_MAX + 1))
+    if k is not None and k not in k_values:
+        k_values.append(k)
+
+    with timer.step("reduce"):
+        reduced = reduce_dimensions(np.asarray(matrix), random_state)
+    with timer.step("evaluate_k"):
+        results = evaluate_k(reduced, sorted(k_values), n_jobs, random_state)
+    if not results:
+        raise ValueError(f"❌ 군집화할 표본이 부족합니다: {len(reduced)}개")
+    with timer.step("select_k"):
+        best_k = k if k is not None else select_k(results, method)
+        labels = next(r["labels"] for r in results if r["k"] == best_k)
+
+    plots = []
+    if plot_dir:
+        with timer.step("plots"):
+            plots = save_plots(reduced, results, labels, best_k, plot_dir, name)
+
+    scores = [{key: r[key] for key in ("k", "inertia", "silhouette")} for r in results]
+    print(f"✅ [CLUSTER] {name}: k={best_k} ({'지정' if k is not None else method}), "
+          f"표본 {len(reduced)}개, 군집 크기 {np.bincount(labels).tolist()}")
+    print(f"⏱️ [CLUSTER] {name}: {timer.timings}")
+    return {"labels": labels, "reduced": reduced, "k": best_k, "method": method if k is None else "fixed",
+            "scores": scores, "timings": timer.timings, "plots": plots}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="시나리오 파일(_ori)의 설명을 임베딩하여 군집화 후 _clu 파일로 저장")
+    parser.add_argument("path", help="예: scenario/Info_scenarios_ori.parquet (parquet, feather, xlsx)")
+    parser.add_argument("--method", default=CLUSTER_METHOD, choices=METHODS)
+    parser.add_argument("--k", type=int, default=None, help="k를 직접 지정 (자동 선택 안 함)")
+    parser.add_argument("--plot-dir", default=CLUSTER_PLOT_DIR)
+    args = parser.parse_args()
+
+    from embedding_utils import get_embeddings
+    from scenario_engine import read_frame, write_frame
+
+    df = read_frame(args.path)
+    name = os.path.basename(args.path).split("_")[0]
+    result = cluster_scenarios(get_embeddings(df["Description"].tolist()), name=name, method=args.method,
+                               k=args.k, plot_dir=args.plot_dir)
+    df["Cluster"] = result["labels"]
+    root, extension = os.path.splitext(args.path)
+    output_path = (root[:-len("_ori")] if root.endswith("_ori") else root) + "_clu" + extension
+    write_frame(df, output_path)
+    print(f"✅ 시나리오 분석 완료! 파일 저장: {output_path}")
@@ -0,0 +1,116 @@
+# Batched + cached embeddings for Topic_Sampling
+# - 입력을 API 최대 배열 크기 단위로 묶어서 요청
+# - 벡터는 텍스트 해시 기준으로 memory-mapped float32 .npy 파일에 저장 (재실행 시 API 호출 없음)
+
+import hashlib
+import json
+import os
+import numpy as np
+import openai
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_DIM = 1536
+MAX_BATCH_SIZE = 2048  # OpenAI 임베딩 API의 input 배열 최대 길이
+CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "embeddings"))
+INITIAL_CAPACITY = 1024
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def openai_embed_batch(texts, model=EMBEDDING_MODEL):
+    """OpenAI 임베딩 API 한 번 호출로 여러 텍스트 처리 (응답 순서는 index 기준으로 정렬)"""
+    response = openai.Embedding.create(input=texts, model=model)
+    data = sorted(response["data"], key=lambda item: item["index"])
+    return [item["embedding"] for item in data]
+
+
+class EmbeddingStore:
+    """텍스트 해시 → 행 번호 인덱스 + memory-mapped float32 행렬로 된 임베딩 캐시"""
+
+    def __init__(self, model=EMBEDDING_MODEL, dim=EMBEDDING_DIM, cache_dir=CACHE_DIR,
+                 embed_batch=openai_embed_batch, batch_size=MAX_BATCH_SIZE):
+        self.model = model
+        self.dim = dim
+        self.embed_batch = embed_batch
+        self.batch_size = batch_size
+        os.makedirs(cache_dir, exist_ok=True)
+        self.matrix_path = os.path.join(cache_dir, f"{model}.npy")
+        self.index_path = os.path.join(cache_dir, f"{model}.index.json")
+        self.stats = {"requested": 0, "cached": 0, "embedded": 0, "api_calls": 0}
+
+        if os.path.exists(self.index_path) and os.path.exists(self.matrix_path):
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                self.index = json.load(file)
+            self.matrix = np.lib.format.open_memmap(self.matrix_path, mode="r+")
+        else:
+            self.index = {}
+            self.matrix = np.lib.format.open_memmap(
+                self.matrix_path, mode="w+", dtype=np.float32, shape=(INITIAL_CAPACITY, dim)
+            )
+
+    def _ensure_capacity(self, rows):
+        """행이 부족하면 용량을 두 배씩 늘린 새 파일로 교체"""
+        capacity = self.matrix.shape[0]
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        tmp_path = self.matrix_path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        grown[: len(self.index)] = self.matrix[: len(self.index)]
+        grown.flush()
+        del grown
+        del self.matrix
+        os.replace(tmp_path, self.matrix_path)
+        self.matrix = np.lib.format.open_memmap(self.matrix_path, mode="r+")
+
+    def _save_index(self):
+        with open(self.index_path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(self.index, file)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def get_embeddings(self, texts):
+        """텍스트 목록의 임베딩 행렬 (len(texts), dim) float32 반환 (캐시에 없는 텍스트만 배치로 요청)"""
+        texts = [str(text) for text in texts]
+        hashes = [text_hash(text) for text in texts]
+        self.stats["requested"] += len(texts)
+
+        missing = {}
+        for text, key in zip(texts, hashes):
+            if key not in self.index and key not in missing:
+                missing[key] = text
+        self.stats["cached"] += len(texts) - len(missing)
+
+        if missing:
+            keys = list(missing)
+            self._ensure_capacity(len(self.index) + len(keys))
+            for start in range(0, len(keys), self.batch_size):
+                batch_keys = keys[start:start + self.batch_size]
+                vectors = np.asarray(self.embed_batch([missing[key] for key in batch_keys]), dtype=np.float32)
+                self.stats["api_calls"] += 1
+                first_row = len(self.index)
+                self.matrix[first_row:first_row + len(batch_keys)] = vectors
+                for offset, key in enumerate(batch_keys):
+                    self.index[key] = first_row + offset
+                self.stats["embedded"] += len(batch_keys)
+                # ✅ 배치마다 저장하여 중간에 실패해도 이미 받은 벡터는 유지
+                self.matrix.flush()
+                self._save_index()
+
+        rows = np.fromiter((self.index[key] for key in hashes), dtype=np.int64, count=len(hashes))
+        return np.ascontiguousarray(self.matrix[rows])
+
+
+_stores = {}
+
+
+def get_embeddings(texts, model=EMBEDDING_MODEL):
+    """모델별 공유 캐시를 사용하여 임베딩 행렬 반환"""
+    if model not in _stores:
+        _stores[model] = EmbeddingStore(model=model)
+    store = _stores[model]
+    matrix = store.get_embeddings(texts)
+    print(f"📊 [EMBEDDING] {store.stats}")
+    return matrix
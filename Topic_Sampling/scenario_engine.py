@@ -0,0 +1,326 @@
+# Scenario generation engine for Topic_Sampling
+# - 카테고리 설정(CATEGORIES)만 다르고 나머지는 같은 Scenario_Info / Scenario_Emo / Scenario_App의 1단계(시나리오 생성)를 통합
+# - 모든 카테고리의 생성 회차를 동시에 실행 (동시 요청 수 제한)
+# - 스트리밍 응답을 줄 단위로 파싱하여 바로 중복(정확히 일치 + 거의 같은 설명, MinHash/LSH) 필터에 넣고,
+#   목표 개수에 도달하면 아직 시작하지 않은 회차를 취소하여 항상 10회를 호출하지 않음
+# env: AIInterviewer
+
+import argparse
+import asyncio
+import contextlib
+import os
+import re
+import sys
+import time
+import openai
+import pandas as pd
+
+openai.api_key = os.environ.get('OPENAI_API_KEY')
+
+# 프로젝트 루트의 공유 LLM 캐시 사용 (완료된 회차의 응답은 재실행 시 API 호출 없이 재사용)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_cache import llm_cache, make_key
+from near_dup import NEAR_DUP_JACCARD_THRESHOLD, TextDedupIndex, normalize_text
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenario")
+MODEL = "gpt-4o"
+TEMPERATURE = 0.7  # 다양성 확보
+MAX_TOKENS = 4000
+SCENARIOS_PER_ROUND = 50
+MAX_ROUNDS = 10  # 카테고리당 최대 회차 (50개씩 10회 = 500개)
+TARGET_UNIQUE = 480  # 카테고리당 목표 고유 시나리오 수 (초기 시나리오 포함)
+MAX_CONCURRENCY = 6  # 전체 카테고리 동시 요청 수
+SCENARIO_FORMAT = os.getenv("SCENARIO_FORMAT", "parquet")  # 중간 파일 형식: parquet/feather(pyarrow 필요) 또는 xlsx
+
+#################### 카테고리 설정 ####################
+
+# 층화 샘플링을 위한 초기 시나리오(10)
+CATEGORIES = {
+    "info": {
+        "topic": "Informational support",
+        "file_prefix": "Info",
+        "initial_scenarios": [
+            ("Informational support", "Understanding company culture", "Users want to get the feel of a company’s culture. A conversational agent helps by talking about the basics of corporate culture, what’s unique to that company, and how to research more about it"),
+            ("Informational support", "Handling Stress", "Users look for ways to manage daily stress. A conversational agent shares techniques to relieve stress, advice on mental well-being, and other useful resources."),
+            ("Informational support", "Exploring recipes", "Users keen on trying new dishes while chatting with a conversational agent about cooking methods, ingredients, and handy cooking tips"),
+            ("Informational support", "Travel planning", "Users plan trips by chatting with conversational about preparing for travel, cool places to visit, food spots to try, and useful local tips."),
+            ("Informational support", "Financial planning", "Users seeking advice on managing their finances consult a conversational agent about budgeting, saving strategies, and investment options."),
+            ("Informational support", "Learning a new language", "Users practicing a new language engage with a conversational agent for vocabulary building, grammar tips, and pronunciation exercises."),
+            ("Informational support", "Understanding AI tools", "Users want to learn how to effectively use AI-powered tools for work or personal projects. The conversational agent explains their functions and best practices."),
+            ("Informational support", "Voting process guidance", "Users curious about the voting process ask a conversational agent for guidance on registration, election dates, and voting procedures."),
+            ("Informational support", "Personalized workout plans", "Users want to stay fit and ask a conversational agent to recommend workout routines based on their fitness goals and activity level."),
+            ("Informational support", "Home maintenance tips", "Users seek advice on basic home maintenance, such as fixing leaks, improving insulation, and maintaining household appliances.")
+        ],
+    },
+    "emo": {
+        "topic": "Emotional support",
+        "file_prefix": "Emo",
+        "initial_scenarios": [
+            ("Emotional support", "Advice on romantic relationships", "Users facing romantic troubles talk with a conversational agent. In response, the agent offers understanding and tips for maintaining a healthy relationship."),
+            ("Emotional support", "Talking About Self-compassion", "When users are too hard on themselves, a conversational agent encourages them to be kinder to themselves and offers ways to practice self-esteem."),
+            ("Emotional support", "Discussions on sleep issues", "Users having trouble sleeping want to talk with a conversational agent for understanding and suggestions on how to sleep better."),
+            ("Emotional support", "Managing nightmares", "For users bothered by bad dreams, a conversational agent offers comfort and suggestions on managing them better"),
+            ("Emotional support", "Overcoming fear of failure", "A chatbot assists users struggling with a fear of failure by sharing stories of resilience, encouraging a growth mindset, and suggesting small achievable steps."),
+            ("Emotional support", "Coping with burnout", "Users facing burnout talk with a conversational agent who discusses the importance of self-care, setting boundaries, and seeking professional help when needed."),
+            ("Emotional support", "Dealing with grief", "Users struggling with loss converse with a conversational agent who provides empathy, guidance on coping mechanisms, and resources for grief support."),
+            ("Emotional support", "Managing anger issues", "Users dealing with anger management seek advice from a conversational agent on anger triggers, relaxation techniques, and communication strategies for expressing emotions effectively."),
+            ("Emotional support", "Dealing with imposter syndrome", "Users struggling with imposter syndrome engage with a conversational agent who validates their achievements, provides perspective on self-worth, and encourages self-compassion."),
+            ("Emotional support", "Supporting a friend in need", "Users looking to help a friend in distress converse with a conversational agent who offers guidance on active listening, providing emotional support, and suggesting resources for professional help.")
+        ],
+    },
+    "app": {
+        "topic": "Appraisal support",
+        "file_prefix": "App",
+        "initial_scenarios": [
+            ("Appraisal support", "Evaluating and building leadership skills", "Users who want to be better leaders discuss leadership styles, effective leadership practices, and ways to improve leadership with a conversational agent."),
+            ("Appraisal support", "Improving problem-solving skills", "Users discuss with a conversational agent how to think more logically and make better decisions."),
+            ("Appraisal support", "Assessing my Skills and personal growth", "Users want to earn feedback on their academic or job skills by chatting with conversational agents. Users especially want to figure out strengths, areas to work on, and goals for personal growth."),
+            ("Appraisal support", "Boosting Project management skills", "Users chat with a conversational agent about how to manage projects better, from scheduling to working well with a team."),
+            ("Appraisal support", "Reviewing financial decisions", "Users review their financial planning with a chatbot that provides insights on budgeting, investment strategies, and risk management."),
+            ("Appraisal support", "Evaluating storytelling abilities", "A chatbot guides users in assessing their storytelling skills, offering feedback on narrative and impact."),
+            ("Appraisal support", "Enhancing interpersonal skills", "Users seek feedback on their interpersonal interactions from a chatbot, which provides insights on empathy and rapport."),
+            ("Appraisal support", "Improving cultural competence", "Users discuss their cultural awareness with a chatbot, receiving feedback on inclusivity and openness."),
+            ("Appraisal support", "Evaluating volunteer impact", "A chatbot guides users in assessing their volunteer contributions, offering feedback on community engagement."),
+            ("Appraisal support", "Improving agility in decision-making", "Users discuss their agility in decision-making with a chatbot, receiving feedback on flexibility and responsiveness.")
+        ],
+    },
+}
+
+# Define the prompt for the model (with examples)
+PROMPT_TEMPLATE = """
+You are a highly skilled AI trained in user modeling and chatbot scenario generation.
+
+## Task:
+Generate {count} new situational scenarios each for {topic}.
+
+## Examples:
+Informational support;Understanding company culture;Users want to get the feel of a company’s culture. A conversational agent helps by talking about the basics of corporate culture, what’s unique to that company, and how to research more about it.
+Informational support;Handling Stress;Users look for ways to manage daily stress. A conversational agent shares techniques to relieve stress, advice on mental well-being, and other useful resources.
+Informational support;Exploring recipes;Users keen on trying new dishes while chatting with a conversational agent about cooking methods, ingredients, and handy cooking tips.
+Informational support;Travel planning;Users plan trips by chatting with conversational about preparing for travel, cool places to visit, food spots to try, and useful local tips.
+Emotional support;Advice on romantic relationships;Users facing romantic troubles talk with a conversational agent. In response, the agent offers understanding and tips for maintaining a healthy relationship.
+Emotional support;Talking About Self-compassion;When users are too hard on themselves, a conversational agent encourages them to be kinder to themselves and offers ways to practice self-esteem.
+Emotional support;Discussions on sleep issues;Users having trouble sleeping want to talk with a conversational agent for understanding and suggestions on how to sleep better.
+Emotional support;Managing nightmares;For users bothered by bad dreams, a conversational agent offers comfort and suggestions on managing them better.
+Emotional support;Overcoming fear of failure;A chatbot assists users struggling with a fear of failure by sharing stories of resilience, encouraging a growth mindset, and suggesting small achievable steps.
+Appraisal support;Evaluating and building leadership skills;Users who want to be better leaders discuss leadership styles, effective leadership practices, and ways to improve leadership with a conversational agent.
+Appraisal support;Improving problem-solving skills;Users discuss with a conversational agent how to think more logically and make better decisions.
+Appraisal support;Assessing my Skills and personal growth;Users want to earn feedback on their academic or job skills by chatting with conversational agents. Users especially want to figure out strengths, areas to work on, and goals for personal growth.
+Appraisal support;Boosting Project management skills;Users chat with a conversational agent about how to manage projects better, from scheduling to working well with a team.
+Appraisal support;Reviewing financial decisions;Users review their financial planning with a chatbot that provides insights on budgeting, investment strategies, and risk management.
+
+## Output Format:
+topic;situation;description
+
+## Instructions:
+1. Generate {count} unique scenarios for {topic}.
+2. Each scenario should be unique, practical, and aligned with real-world use cases.
+3. Follow the output format exactly as shown in the examples.
+4. Do not repeat the examples provided—create entirely new ones.
+
+## Output:
+"""
+
+
+def build_prompt(topic, count=SCENARIOS_PER_ROUND):
+    return PROMPT_TEMPLATE.format(topic=topic, count=count)
+
+
+#################### 파싱 & 중복 필터 ####################
+
+def parse_line(line):
+    """응답 한 줄을 (Topic, Situation, Description)으로 파싱 (형식이 맞지 않으면 None)"""
+    parts = [part.strip() for part in line.strip().lstrip("-* ").split(";", 2)]
+    if len(parts) != 3 or not all(parts):
+        return None
+    parts[0] = re.sub(r"^\d+\.\s*", "", parts[0])  # 숫자 제거하여 Topic 정리
+    return tuple(parts)
+
+
+class ScenarioFilter:
+    """시나리오가 들어올 때마다 카테고리, 정확한 중복, 거의 같은 설명을 걸러내는 증분 필터"""
+
+    def __init__(self, topic, threshold=NEAR_DUP_JACCARD_THRESHOLD):
+        self.topic = topic
+        self.rows = []
+        self.exact_keys = set()
+        self.near_dup_index = TextDedupIndex(threshold)  # 설명의 단어(1~2-gram) Jaccard 유사도 기준
+        self.stats = {"lines": 0, "format": 0, "topic": 0, "exact_dup": 0, "near_dup": 0, "kept": 0}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, row):
+        """(Topic, Situation, Description) 추가 (저장되면 True)"""
+        topic, situation, description = row
+        if topic != self.topic:
+            self.stats["topic"] += 1
+            return False
+        key = (normalize_text(situation), normalize_text(description))
+        if key in self.exact_keys:
+            self.stats["exact_dup"] += 1
+            return False
+        if not self.near_dup_index.add(description):
+            self.stats["near_dup"] += 1
+            return False
+        self.exact_keys.add(key)
+        self.rows.append(row)
+        self.stats["kept"] += 1
+        return True
+
+    def add_line(self, line):
+        self.stats["lines"] += 1
+        row = parse_line(line)
+        if row is None:
+            self.stats["format"] += 1
+            return False
+        return self.add(row)
+
+    def to_dataframe(self):
+        return pd.DataFrame(self.rows, columns=["Topic", "Situation", "Description"])
+
+
+#################### 생성 ####################
+
+async def stream_round(key, prompt, round_index):
+    """한 회차의 응답을 줄 단위로 반환 (캐시에 있으면 캐시 사용, 끝까지 받은 응답만 캐시에 저장)"""
+    stage = f"scenario_{key}"
+    params = {"max_tokens": MAX_TOKENS, "round": round_index}
+    cache_key = make_key(MODEL, TEMPERATURE, prompt, params)
+    cached = llm_cache.get(cache_key, stage)
+    if cached is not None:
+        for line in cached["choices"][0]["message"]["content"].strip().split("\n"):
+            yield line
+        return
+
+    response = await openai.ChatCompletion.acreate(
+        model=MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS,
+        stream=True,
+    )
+    text, buffer = "", ""
+    async for chunk in response:
+        delta = chunk["choices"][0]["delta"].get("content", "")
+        text += delta
+        buffer += delta
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+    # ✅ 스크립트(Scenario_*.py)의 캐시 항목과 같은 형식으로 저장
+    llm_cache.put(cache_key, {"choices": [{"message": {"content": text}}]}, stage)
+
+
+async def generate_category(key, limit, target=TARGET_UNIQUE, max_rounds=MAX_ROUNDS):
+    """한 카테고리의 회차들을 동시에 실행하고 목표 개수에 도달하면 시작하지 않은 회차 취소"""
+    config = CATEGORIES[key]
+    prompt = build_prompt(config["topic"])
+    scenario_filter = ScenarioFilter(config["topic"])
+    for seed in config["initial_scenarios"]:
+        scenario_filter.add(seed)
+
+    rounds = {"started": 0, "completed": 0, "cancelled": 0, "errors": 0}
+    waiting = {}  # 아직 시작하지 않은 회차 → 태스크
+
+    def stop_waiting_rounds():
+        """목표 도달 → 아직 시작하지 않은 회차 취소 (이미 받고 있는 응답은 끝까지 받아 캐시에 저장)"""
+        for task in waiting.values():
+            task.cancel()
+        waiting.clear()
+
+    async def run_round(round_index):
+        async with limit:
+            waiting.pop(round_index, None)
+            if len(scenario_filter) >= target:
+                return
+            rounds["started"] += 1
+            async with contextlib.aclosing(stream_round(key, prompt, round_index)) as lines:
+                async for line in lines:
+                    scenario_filter.add_line(line)
+                    if len(scenario_filter) >= target:
+                        stop_waiting_rounds()
+            rounds["completed"] += 1
+            print(f"🔹 [{key}] {round_index + 1}회차 완료 → 고유 시나리오 {len(scenario_filter)}개")
+
+    tasks = [asyncio.create_task(run_round(round_index)) for round_index in range(max_rounds)]
+    waiting.update(enumerate(tasks))
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, asyncio.CancelledError):
+            rounds["cancelled"] += 1
+        elif isinstance(result, Exception):
+            rounds["errors"] += 1
+            print(f"❌ [{key}] 회차 실패: {result}")
+
+    print(f"✅ [{key}] {config['topic']}: 고유 시나리오 {len(scenario_filter)}개, 회차 {rounds}, 필터 {scenario_filter.stats}")
+    return scenario_filter.to_dataframe()
+
+
+async def agenerate_scenarios(keys, target=TARGET_UNIQUE, max_rounds=MAX_ROUNDS, max_concurrency=MAX_CONCURRENCY):
+    """여러 카테고리를 동시에 생성 (전체 동시 요청 수 제한)"""
+    limit = asyncio.Semaphore(max_concurrency)
+    frames = await asyncio.gather(*(generate_category(key, limit, target, max_rounds) for key in keys))
+    return dict(zip(keys, frames))
+
+
+def generate_scenarios(keys, target=TARGET_UNIQUE, max_rounds=MAX_ROUNDS, max_concurrency=MAX_CONCURRENCY):
+    """agenerate_scenarios의 동기 버전 (스크립트용)"""
+    started = time.perf_counter()
+    frames = asyncio.run(agenerate_scenarios(keys, target, max_rounds, max_concurrency))
+    print(f"⏱️ 시나리오 생성: {time.perf_counter() - started:.1f}s")
+    llm_cache.report()
+    return frames
+
+
+#################### 중간 파일 ####################
+
+def scenario_path(key, stage, file_format=SCENARIO_FORMAT):
+    """scenario/{Info|Emo|App}_scenarios_{ori|clu}.{parquet|feather|xlsx}"""
+    return os.path.join(SCENARIO_DIR, f"{CATEGORIES[key]['file_prefix']}_scenarios_{stage}.{file_format}")
+
+
+def write_frame(df, path):
+    """확장자에 맞는 형식으로 저장 (parquet/feather는 열 단위 바이너리라 엑셀보다 훨씬 빠름)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    extension = os.path.splitext(path)[1]
+    if extension == ".parquet":
+        df.to_parquet(path, index=False)
+    elif extension == ".feather":
+        df.reset_index(drop=True).to_feather(path)
+    elif extension == ".xlsx":
+        df.to_excel(path, index=False)
+    else:
+        raise ValueError(f"❌ 지원하지 않는 파일 형식: {path} (parquet, feather, xlsx)")
+    return path
+
+
+def read_frame(path):
+    extension = os.path.splitext(path)[1]
+    if extension == ".parquet":
+        return pd.read_parquet(path)
+    if extension == ".feather":
+        return pd.read_feather(path)
+    if extension == ".xlsx":
+        return pd.read_excel(path)
+    raise ValueError(f"❌ 지원하지 않는 파일 형식: {path} (parquet, feather, xlsx)")
+
+
+def save_scenarios(key, df, stage="ori"):
+    """scenario/{Info|Emo|App}_scenarios_{stage}.{SCENARIO_FORMAT}로 저장"""
+    file_path = write_frame(df, scenario_path(key, stage))
+    print(f"✅ 정리된 데이터 저장 완료: {file_path}")
+    return file_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Topic_Sampling 시나리오 생성 (카테고리 동시 실행 + 조기 종료)")
+    parser.add_argument("categories", nargs="*", default=list(CATEGORIES), choices=list(CATEGORIES))
+    parser.add_argument("--target", type=int, default=TARGET_UNIQUE)
+    parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    for key, df in generate_scenarios(args.categories, args.target, args.max_rounds, args.concurrency).items():
+        save_scenarios(key, df)
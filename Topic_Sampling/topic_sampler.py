@@ -0,0 +1,188 @@
+# Stratified topic sampler for Topic_Sampling
+# - 군집 결과(_clu)에서 군집 수와 무관하게 seed 고정 층화 샘플링 (비례 배분 또는 군집별 같은 개수)
+# - 샘플을 topics.json 형식(index, category, title_en/ko, description_en/ko)으로 바로 저장
+# - _ko 필드는 여러 주제를 한 번에 번역 요청 (공유 LLM 캐시 사용 → 재실행 시 API 호출 없음)
+# env: AIInterviewer
+
+import argparse
+import json
+import os
+import numpy as np
+import openai
+import pandas as pd
+
+from scenario_engine import CATEGORIES, llm_cache, read_frame, scenario_path
+
+openai.api_key = os.environ.get('OPENAI_API_KEY')
+
+TOPICS_PER_CATEGORY = 25
+ALLOCATION = "proportional"  # proportional: 군집 크기에 비례, fixed: 군집마다 같은 개수
+SEED = 42
+CATEGORY_ORDER = ["emo", "app", "info"]  # 기존 topics.json 순서
+TRANSLATION_MODEL = "gpt-4o"
+TRANSLATION_BATCH_SIZE = 25  # 번역 요청 한 번에 넣는 주제 수
+OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenario", "topics.json")
+
+ALLOCATIONS = ("proportional", "fixed")
+
+#################### 층화 샘플링 ####################
+
+def allocate(cluster_sizes, total, allocation=ALLOCATION):
+    """군집별 샘플 수 (합계 total, 군집 크기를 넘지 않음)
+
+    proportional: 군집 크기 비례 + 최대 나머지 방식 (total >= 군집 수이면 군집마다 최소 1개)
+    fixed: 군집마다 total // k개, 나머지는 큰 군집부터 1개씩
+    """
+    if allocation not in ALLOCATIONS:
+        raise ValueError(f"❌ 지원하지 않는 allocation: {allocation} ({', '.join(ALLOCATIONS)})")
+    sizes = pd.Series(cluster_sizes).sort_index()
+    total = min(total, int(sizes.sum()))
+    if allocation == "fixed":
+        quotas = pd.Series(total / len(sizes), index=sizes.index)
+    else:
+        quotas = sizes / sizes.sum() * total
+    counts = np.floor(quotas).astype(int)
+    if total >= len(sizes):
+        counts = counts.clip(lower=1)
+    counts = counts.clip(upper=sizes)
+
+    # 남은 개수는 나머지가 큰 군집(같으면 큰 군집)부터, 여유가 있는 군집에만 배분
+    order = sorted(sizes.index, key=lambda c: (-(quotas[c] - np.floor(quotas[c])), -sizes[c], c))
+    while counts.sum() < total:
+        for cluster in order:
+            if counts.sum() >= total:
+                break
+            if counts[cluster] < sizes[cluster]:
+                counts[cluster] += 1
+    # 최소 1개 보장으로 넘친 경우 큰 군집부터 줄임
+    while counts.sum() > total:
+        counts[counts.idxmax()] -= 1
+    return counts.to_dict()
+
+
+def stratified_sample(df, total=TOPICS_PER_CATEGORY, allocation=ALLOCATION, seed=SEED, cluster_column="Cluster"):
+    """군집별 층화 샘플 (seed가 같으면 항상 같은 결과, 군집 순서대로 정렬)"""
+    rng = np.random.default_rng(seed)
+    counts = allocate(df[cluster_column].value_counts(), total, allocation)
+    samples = [
+        df[df[cluster_column] == cluster].sample(n=count, random_state=rng)
+        for cluster, count in sorted(counts.items()) if count
+    ]
+    return pd.concat(samples)
+
+
+#################### 번역 (_ko) ####################
+
+TRANSLATION_PROMPT = """
+Translate the following chatbot conversation topics into natural Korean for a Korean user study.
+
+## Style:
+- title_ko: a short, natural Korean phrase (e.g. "향수병 극복하기", "펫 케어 안내 받기").
+- description_ko: one or two sentences; refer to "a conversational agent" / "a chatbot" as "에이전트".
+- Example:
+  title_en: Coping with homesickness
+  description_en: Users missing home talk to a conversational agent for comfort, which provides coping strategies and ways to stay connected with loved ones.
+  title_ko: 향수병 극복하기
+  description_ko: 고향이 그리운 사용자들이 에이전트와 대화하며 위로를 받으며, 향수병을 극복하는 전략과 가족 및 친구들과 연결되는 방법을 얻습니다.
+
+## Output Format:
+Return only a JSON object: {{"topics": [{{"id": <id>, "title_ko": "...", "description_ko": "..."}}, ...]}} with one item per input id.
+
+## Topics:
+{items}
+"""
+
+
+def translate_batch(topics):
+    """주제 목록(title_en, description_en)을 한 번에 번역하여 id → (title_ko, description_ko) 반환"""
+    items = json.dumps(
+        [{"id": i, "title_en": t["title_en"], "description_en": t["description_en"]} for i, t in enumerate(topics)],
+        ensure_ascii=False, indent=1,
+    )
+    prompt = TRANSLATION_PROMPT.format(items=items)
+    response = llm_cache.cached_call(
+        "topic_translation", TRANSLATION_MODEL, 0, prompt, {"response_format": "json_object"},
+        lambda: openai.ChatCompletion.create(
+            model=TRANSLATION_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            response_format={"type": "json_object"},
+        ),
+    )
+    translated = {}
+    try:
+        for item in json.loads(response["choices"][0]["message"]["content"])["topics"]:
+            if item.get("title_ko") and item.get("description_ko"):
+                translated[int(item["id"])] = (item["title_ko"], item["description_ko"])
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        print(f"⚠️ 번역 응답 파싱 실패: {e}")
+    return translated
+
+
+def translate_topics(topics, batch_size=TRANSLATION_BATCH_SIZE):
+    """_ko 필드가 비어 있는 주제를 배치로 번역 (배치에서 빠진 주제는 하나씩 다시 요청)"""
+    pending = [topic for topic in topics if not topic.get("title_ko") or not topic.get("description_ko")]
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        translated = translate_batch(batch)
+        for i, topic in enumerate(batch):
+            result = translated.get(i) or translate_batch([topic]).get(0)
+            if result is None:
+                print(f"⚠️ 번역 실패 (빈 값으로 저장): {topic['title_en']}")
+                continue
+            topic["title_ko"], topic["description_ko"] = result
+        print(f"🔹 번역 {min(start + batch_size, len(pending))}/{len(pending)}")
+    return topics
+
+
+#################### topics.json ####################
+
+def build_topics(samples_by_key):
+    """카테고리별 샘플 → topics.json 항목 (index는 1부터 연속)"""
+    topics = []
+    for key, samples in samples_by_key.items():
+        category = CATEGORIES[key]["topic"].title()  # "Emotional support" → "Emotional Support"
+        for _, row in samples.iterrows():
+            topics.append({
+                "index": len(topics) + 1,
+                "category": category,
+                "title_en": row["Situation"],
+                "title_ko": "",
+                "description_en": row["Description"],
+                "description_ko": "",
+            })
+    return topics
+
+
+def sample_topics(keys=CATEGORY_ORDER, per_category=TOPICS_PER_CATEGORY, allocation=ALLOCATION, seed=SEED,
+                  output_path=OUTPUT_PATH, translate=True):
+    """카테고리별 군집 결과(_clu) → 층화 샘플 → 번역 → topics.json 저장"""
+    samples_by_key = {}
+    for key in keys:
+        clustered = read_frame(scenario_path(key, "clu"))
+        samples_by_key[key] = stratified_sample(clustered, per_category, allocation, seed)
+        counts = samples_by_key[key]["Cluster"].value_counts().sort_index().to_dict()
+        print(f"🔹 [{key}] 군집 {clustered['Cluster'].nunique()}개에서 {len(samples_by_key[key])}개 샘플 ({allocation}): {counts}")
+
+    topics = build_topics(samples_by_key)
+    if translate:
+        topics = translate_topics(topics)
+        llm_cache.report()
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(topics, file, indent=4, ensure_ascii=False)
+    print(f"✅ topics.json 저장 완료: {output_path} ({len(topics)}개)")
+    return topics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="군집 결과에서 층화 샘플링하여 topics.json 생성")
+    parser.add_argument("categories", nargs="*", default=CATEGORY_ORDER, choices=list(CATEGORIES))
+    parser.add_argument("--per-category", type=int, default=TOPICS_PER_CATEGORY)
+    parser.add_argument("--allocation", default=ALLOCATION, choices=ALLOCATIONS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", default=OUTPUT_PATH, help="서비스에 반영하려면 ../topics.json")
+    parser.add_argument("--no-translate", action="store_true", help="_ko 필드를 비워 둠")
+    args = parser.parse_args()
+    sample_topics(args.categories, args.per_category, args.allocation, args.seed, args.output, not args.no_translate)
@@ -0,0 +1,5 @@
+# 오프라인 분석 (Firestore 내보내기 → 열 단위 Parquet 테이블 → 지표)
+# - export_loader: 내보내기 JSON을 Parquet 테이블로 변환, load_table()로 읽기
+# - firestore_export: Firestore에서 바뀐 문서만 커서로 읽어 같은 테이블에 병합 (firestore_fake로 Firebase 없이 확인)
+# - chat_metrics: messages 테이블 → 세션별 대화 지표(session_metrics) + Tag vs Epi 비교
+# - button_funnel: button_logs → 정수 코드 이벤트 배열(button_streams.npz) + 페이지 체류 시간 / Intro → Topic → Chat → Eval 퍼널
@@ -0,0 +1,279 @@
+# Button-event sessionization and Intro → Topic → Chat → Eval funnel
+# - button_logs 이벤트를 참가자별로 시간 순서대로 받아 정수 코드 배열(page / button / stage 코드 + epoch ms int64)로 저장
+#   Firestore에서 직접 읽을 때는 timestamp 순서 조회 + 참가자별 크기 제한 재정렬 버퍼로 전체 정렬 없이 순서 보장
+#   (ISO 문자열 정렬은 "…34Z"와 "…34.100Z"처럼 같은 초 안에서 순서가 바뀔 수 있음)
+# - 방문(긴 공백으로 구분) / 페이지별 체류 시간 / 퍼널과 이탈 지점은 배열 연산으로 계산
+# - 결과 배열은 analytics_data/button_streams.npz (np.load로 바로 읽기)
+
+import argparse
+import heapq
+import os
+from datetime import datetime, timezone
+from enum import IntEnum
+
+import numpy as np
+import pandas as pd
+
+from analytics.export_loader import ANALYTICS_DIR, load_table
+
+## ✅ 설정 (환경 변수로 조정 가능)
+REORDER_CAPACITY = int(os.getenv("ANALYTICS_REORDER_CAPACITY", "64"))  # 참가자별 재정렬 버퍼 크기 (이벤트 수)
+VISIT_GAP_MS = int(float(os.getenv("ANALYTICS_VISIT_GAP_MIN", "30")) * 60_000)  # 이보다 긴 공백이면 새 방문
+STREAMS_FILE = "button_streams.npz"
+
+
+class Stage(IntEnum):
+    """페이지 → 실험 단계 (버튼 이벤트는 해당 페이지를 마치고 다음으로 넘어갈 때 기록됨)"""
+    OTHER = 0
+    INTRO = 1
+    TOPIC = 2
+    PERSONA_INTRO = 3  # IntroPer1 / IntroPer2
+    CHAT = 4
+    EVAL = 5
+
+
+FUNNEL = [Stage.INTRO, Stage.TOPIC, Stage.CHAT, Stage.EVAL]
+FINAL_PAGE = "EpiEval"  # 실험 마지막 페이지 (이 페이지를 제출하면 완료)
+
+
+def page_stage(page):
+    if page == "Intro":
+        return Stage.INTRO
+    if page == "Topic":
+        return Stage.TOPIC
+    if page.startswith("IntroPer"):
+        return Stage.PERSONA_INTRO
+    if page.startswith("chat"):
+        return Stage.CHAT
+    if "Eval" in page:
+        return Stage.EVAL
+    return Stage.OTHER
+
+
+def to_epoch_ms(timestamp):
+    """ISO 문자열(브라우저 "Z" / 시간대 없음은 UTC로 간주) → epoch ms (파싱 실패 시 None)"""
+    try:
+        parsed = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+#################### 순서대로 받기 ####################
+
+class ReorderBuffer:
+    """시간 순서에 가깝게 들어오는 이벤트를 최대 capacity개까지 모아 가장 이른 것부터 내보내는 버퍼
+
+    capacity보다 더 늦게 도착한 이벤트는 그대로 내보내고 late로 셈 (해당 참가자는 마지막에 한 번 정렬)
+    """
+
+    def __init__(self, capacity=REORDER_CAPACITY):
+        self.capacity = capacity
+        self.heap = []
+        self.seq = 0
+        self.last_ms = None
+        self.late = 0
+
+    def push(self, ms, event):
+        heapq.heappush(self.heap, (ms, self.seq, event))
+        self.seq += 1
+        if len(self.heap) > self.capacity:
+            yield self.pop()
+
+    def pop(self):
+        ms, _, event = heapq.heappop(self.heap)
+        if self.last_ms is not None and ms < self.last_ms:
+            self.late += 1
+        else:
+            self.last_ms = ms
+        return ms, event
+
+    def flush(self):
+        while self.heap:
+            yield self.pop()
+
+
+class EventStreams:
+    """참가자별 시간순 이벤트를 정수 코드 배열로 모음 (문자열은 vocab에 한 번만 저장)"""
+
+    def __init__(self):
+        self.vocab = {"participant": {}, "page": {}, "button": {}}
+        self.columns = {"participant": [], "page": [], "button": [], "ms": []}
+        self.stats = {"events": 0, "late": 0, "resorted": 0, "bad_timestamps": 0}
+
+    def code(self, kind, value):
+        return self.vocab[kind].setdefault(value, len(self.vocab[kind]))
+
+    def ingest(self, participant, events, capacity=REORDER_CAPACITY):
+        """한 참가자의 (page, button, timestamp) 이벤트를 재정렬 버퍼를 거쳐 추가"""
+        buffer = ReorderBuffer(capacity)
+        start = len(self.columns["ms"])
+        participant_code = self.code("participant", participant)
+
+        def append(ms, event):
+            self.columns["participant"].append(participant_code)
+            self.columns["page"].append(self.code("page", event[0]))
+            self.columns["button"].append(self.code("button", event[1]))
+            self.columns["ms"].append(ms)
+
+        for page, button, timestamp in events:
+            ms = to_epoch_ms(timestamp)
+            if ms is None:
+                self.stats["bad_timestamps"] += 1
+                continue
+            for ordered in buffer.push(ms, (page, button)):
+                append(*ordered)
+        for ordered in buffer.flush():
+            append(*ordered)
+
+        self.stats["events"] += len(self.columns["ms"]) - start
+        if buffer.late:
+            # ✅ 버퍼보다 크게 어긋난 경우에만 이 참가자 구간을 정렬
+            self.stats["late"] += buffer.late
+            self.stats["resorted"] += 1
+            order = np.argsort(self.columns["ms"][start:], kind="stable")
+            for name in ("page", "button", "ms"):
+                segment = self.columns[name][start:]
+                self.columns[name][start:] = [segment[i] for i in order]
+
+    def to_arrays(self):
+        """npz로 저장할 배열 (코드 배열 + vocab 문자열 배열 + 코드별 stage)"""
+        pages = np.array(list(self.vocab["page"]), dtype=str)
+        return {
+            "participant": np.array(self.columns["participant"], dtype=np.int32),
+            "page": np.array(self.columns["page"], dtype=np.int16),
+            "button": np.array(self.columns["button"], dtype=np.int16),
+            "ms": np.array(self.columns["ms"], dtype=np.int64),
+            "participant_names": np.array(list(self.vocab["participant"]), dtype=str),
+            "page_names": pages,
+            "button_names": np.array(list(self.vocab["button"]), dtype=str),
+            "page_stage": np.array([page_stage(page) for page in pages], dtype=np.int8),
+        }
+
+
+def from_firestore(client=None, capacity=REORDER_CAPACITY):
+    """button_logs/{참가자}/events를 timestamp 순서로 조회하여 바로 코드 배열로 변환"""
+    if client is None:
+        from firebase_utils import db as client
+    streams = EventStreams()
+    for participant_ref in client.collection("button_logs").list_documents():
+        snapshots = participant_ref.collection("events").order_by("timestamp").stream()
+        events = ((data.get("page"), data.get("button"), data.get("timestamp"))
+                  for data in (snapshot.to_dict() or {} for snapshot in snapshots))
+        streams.ingest(participant_ref.id, events, capacity)
+    return streams.to_arrays(), streams.stats
+
+
+def from_table(out_dir=ANALYTICS_DIR):
+    """export_loader의 button_events 테이블 → 코드 배열 (이미 열 단위이므로 한 번의 lexsort로 정렬)"""
+    table = load_table("button_events", out_dir).dropna(subset=["timestamp"])
+    codes = {name: pd.Categorical(table[name].astype(str)) for name in ("participant", "page", "button")}
+    ms = table["timestamp"].astype("datetime64[ms, UTC]").astype("int64").to_numpy()
+    participant = codes["participant"].codes.astype(np.int32)
+    order = np.lexsort((ms, participant))
+    pages = np.array(codes["page"].categories, dtype=str)
+    arrays = {
+        "participant": participant[order],
+        "page": codes["page"].codes.astype(np.int16)[order],
+        "button": codes["button"].codes.astype(np.int16)[order],
+        "ms": ms[order],
+        "participant_names": np.array(codes["participant"].categories, dtype=str),
+        "page_names": pages,
+        "button_names": np.array(codes["button"].categories, dtype=str),
+        "page_stage": np.array([page_stage(page) for page in pages], dtype=np.int8),
+    }
+    return arrays, {"events": len(order)}
+
+
+def save_streams(arrays, out_dir=ANALYTICS_DIR):
+    path = os.path.join(out_dir, STREAMS_FILE)
+    os.makedirs(out_dir, exist_ok=True)
+    np.savez_compressed(path, **arrays)
+    return path
+
+
+def load_streams(out_dir=ANALYTICS_DIR):
+    with np.load(os.path.join(out_dir, STREAMS_FILE)) as data:
+        return {name: data[name] for name in data.files}
+
+
+#################### 방문 / 체류 시간 / 퍼널 ####################
+
+def sessionize(arrays, gap_ms=VISIT_GAP_MS):
+    """이벤트별 방문 번호와 체류 시간(직전 이벤트부터 이 페이지의 버튼을 누르기까지, 방문의 첫 이벤트는 -1)"""
+    participant, ms = arrays["participant"], arrays["ms"]
+    gaps = np.diff(ms, prepend=ms[:1])
+    new_visit = np.ones(len(ms), dtype=bool)
+    new_visit[1:] = (participant[1:] != participant[:-1]) | (gaps[1:] > gap_ms)
+    visit = np.cumsum(new_visit) - 1
+    dwell_ms = np.where(new_visit, -1, gaps)
+    return visit, dwell_ms
+
+
+def dwell_by_page(arrays, dwell_ms):
+    """페이지별 체류 시간 요약 (초)"""
+    valid = dwell_ms >= 0
+    frame = pd.DataFrame({"page": arrays["page"][valid], "dwell_s": dwell_ms[valid] / 1000})
+    summary = frame.groupby("page")["dwell_s"].describe(percentiles=[0.5, 0.9])
+    summary.index = arrays["page_names"][summary.index]
+    return summary[["count", "mean", "50%", "90%", "max"]].rename(columns={"50%": "median", "90%": "p90"})
+
+
+def funnel(arrays):
+    """Intro → Topic → Chat → Eval 단계별 도달 참가자 수와 이탈 지점
+
+    - reached: 해당 단계 페이지에서 버튼을 누른 참가자 수, conversion: 직전 단계 대비 비율
+    - drop_off: 완료(FINAL_PAGE 제출)하지 못한 참가자의 마지막 페이지별 인원
+    """
+    participants = len(arrays["participant_names"])
+    stage = arrays["page_stage"][arrays["page"]]
+    reached = np.zeros((participants, len(Stage)), dtype=bool)
+    reached[arrays["participant"], stage] = True
+
+    counts = reached[:, [int(s) for s in FUNNEL]].sum(axis=0)
+    previous = np.concatenate([[participants], counts[:-1]])
+    steps = pd.DataFrame({
+        "stage": [s.name for s in FUNNEL],
+        "reached": counts,
+        "conversion": np.divide(counts, previous, out=np.zeros(len(counts)), where=previous > 0).round(3),
+    })
+
+    # ✅ 참가자별 마지막 이벤트 = 정렬된 배열에서 참가자가 바뀌기 직전 위치
+    last = np.flatnonzero(np.append(arrays["participant"][1:] != arrays["participant"][:-1], True))
+    final_codes = np.flatnonzero(arrays["page_names"] == FINAL_PAGE)
+    completed = np.zeros(participants, dtype=bool)
+    completed[arrays["participant"][np.isin(arrays["page"], final_codes)]] = True
+    dropped = last[~completed[arrays["participant"][last]]]
+    drop_off = pd.Series(arrays["page_names"][arrays["page"][dropped]]).value_counts().rename("participants")
+    return steps, drop_off, int(completed.sum())
+
+
+def report(arrays, gap_ms=VISIT_GAP_MS):
+    visit, dwell_ms = sessionize(arrays, gap_ms)
+    steps, drop_off, completed = funnel(arrays)
+    return {
+        "visits": int(visit[-1] + 1) if len(visit) else 0,
+        "dwell": dwell_by_page(arrays, dwell_ms),
+        "funnel": steps,
+        "drop_off": drop_off,
+        "completed": completed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="button_logs → 정수 코드 이벤트 배열 + 체류 시간 / 퍼널")
+    parser.add_argument("--source", choices=["table", "firestore"], default="table",
+                        help="table: analytics_data/button_events.parquet, firestore: button_logs 직접 조회")
+    parser.add_argument("--out", default=ANALYTICS_DIR)
+    args = parser.parse_args()
+    arrays, ingest_stats = from_table(args.out) if args.source == "table" else from_firestore()
+    path = save_streams(arrays, args.out)
+    print(f"✅ [FUNNEL] 이벤트 {len(arrays['ms'])}개, 참가자 {len(arrays['participant_names'])}명 → {path} {ingest_stats}")
+    result = report(arrays)
+    with pd.option_context("display.width", 200, "display.max_rows", 100):
+        print(f"📊 [FUNNEL] 방문 {result['visits']}회, 완료 {result['completed']}명")
+        print(result["funnel"].to_string(index=False))
+        print(result["drop_off"].to_string())
+        print(result["dwell"].round(1).to_string())
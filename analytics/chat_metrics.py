@@ -0,0 +1,235 @@
+# Conversation metrics over the flattened messages table
+# - export_loader의 messages 테이블(참가자 × 페르소나 × 세션 × 턴)에서 세션별 지표를 group-by 한 번으로 계산
+#   (턴 수, 사용자/AI 메시지 길이, 연속 timestamp로 구한 응답 시간, 토픽 일치도, Tag vs Epi 비교)
+# - 한국어 토큰 수는 kiwipiepy로 메시지 전체를 한 번에(배치, 멀티스레드) 형태소 분석
+#   결과는 내용 해시별로 message_tokens.parquet에 저장 → 다시 실행할 때는 새 메시지만 분석
+# - python -m analytics.chat_metrics --bench 로 단계별 소요 시간 확인
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from analytics.export_loader import ANALYTICS_DIR, load_table, table_path
+
+## ✅ 설정 (환경 변수로 조정 가능)
+KIWI_WORKERS = int(os.getenv("ANALYTICS_KIWI_WORKERS", "-1"))  # -1이면 CPU 코어 수만큼
+KIWI_BATCH_SIZE = int(os.getenv("ANALYTICS_KIWI_BATCH_SIZE", "2000"))  # tokenize()에 한 번에 넘기는 메시지 수
+FREE_TOPIC = "자유 주제"  # 마지막 세션(선택 토픽 없음)
+# 이보다 짧은 시간 차는 실제 응답 시간이 아니라 같은 저장 호출에서 찍힌 시각 → NaN (알 수 없음)
+MIN_LATENCY_S = float(os.getenv("ANALYTICS_MIN_LATENCY_S", "0.05"))
+
+TOKEN_CACHE = "message_tokens"  # analytics_data/message_tokens.parquet
+
+SESSION_KEYS = ["participant", "persona", "session"]
+NOUN_TAGS = ("NNG", "NNP")  # 토픽 키워드로 사용하는 품사 (일반/고유 명사)
+
+_kiwi = None
+
+
+def get_kiwi():
+    """Kiwi 형태소 분석기 (모델 로드가 느리므로 처음 사용할 때 한 번만 생성)"""
+    global _kiwi
+    if _kiwi is None:
+        from kiwipiepy import Kiwi
+        _kiwi = Kiwi(num_workers=KIWI_WORKERS)
+    return _kiwi
+
+
+#################### 토큰화 ####################
+
+def tokenize(texts, batch_size=KIWI_BATCH_SIZE):
+    """텍스트 목록 → (토큰 수 배열, 텍스트별 명사 집합 목록)
+
+    토큰 수는 문장부호·기호(S*)를 뺀 형태소 수, 명사는 토픽 일치도 계산에 사용
+    """
+    kiwi = get_kiwi()
+    texts = ["" if text is None else str(text) for text in texts]
+    counts = np.zeros(len(texts), dtype=np.int32)
+    nouns = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        # 목록 단위 분석은 작업 스레드가 2개 이상일 때만 지원 → 단일 코어에서는 하나씩 분석
+        results = kiwi.tokenize(batch) if kiwi.num_workers > 1 else map(kiwi.tokenize, batch)
+        for i, tokens in enumerate(results, start=start):
+            counts[i] = sum(1 for token in tokens if not token.tag.startswith("S"))
+            nouns.append(sorted({token.form for token in tokens if token.tag in NOUN_TAGS}))
+    return counts, nouns
+
+
+def cached_tokenize(texts, cache_path=None):
+    """tokenize()와 같지만 내용 해시(uint64)별 결과를 Parquet에 저장해 두고 처음 보는 텍스트만 분석"""
+    texts = pd.Series(texts, dtype="object").fillna("").astype(str)
+    if cache_path is None:
+        return tokenize(texts.tolist())
+    hashes = pd.util.hash_pandas_object(texts, index=False).to_numpy()
+    cache = (pd.read_parquet(cache_path) if os.path.exists(cache_path)
+             else pd.DataFrame({"hash": np.array([], dtype=np.uint64), "tokens": np.array([], dtype=np.int32), "nouns": []}))
+
+    missing = ~pd.Index(hashes).isin(cache["hash"])
+    if missing.any():
+        new = pd.DataFrame({"hash": hashes[missing], "text": texts[missing].to_numpy()}).drop_duplicates("hash")
+        counts, nouns = tokenize(new["text"].tolist())
+        cache = pd.concat([cache, pd.DataFrame({"hash": new["hash"].to_numpy(), "tokens": counts, "nouns": nouns})],
+                          ignore_index=True)
+        cache.to_parquet(cache_path + ".tmp", index=False)
+        os.replace(cache_path + ".tmp", cache_path)
+        print(f"🔹 [METRICS] 형태소 분석 {len(new)}개 (캐시 {len(cache)}개)")
+
+    positions = pd.Index(cache["hash"]).get_indexer(hashes)
+    return cache["tokens"].to_numpy()[positions].astype(np.int32), [list(cache["nouns"].iloc[i]) for i in positions]
+
+
+def explode_nouns(keys, nouns):
+    """(키 DataFrame, 명사 목록들) → 키 + noun 열의 긴 테이블 (중복 제거)"""
+    long = keys.reset_index(drop=True).assign(noun=nouns).explode("noun").dropna(subset=["noun"])
+    return long.drop_duplicates()
+
+
+#################### 지표 ####################
+
+def add_message_metrics(messages, cache_path=None):
+    """메시지 단위 열 추가: chars, tokens, latency_s (같은 세션의 직전 메시지와의 시간 차, 알 수 없으면 NaN)"""
+    messages = messages.sort_values(SESSION_KEYS + ["turn"], kind="stable").reset_index(drop=True)
+    messages["chars"] = messages["content"].str.len().fillna(0).astype(np.int32)
+    messages["tokens"], nouns = cached_tokenize(messages["content"], cache_path)
+    previous = messages.groupby(SESSION_KEYS, observed=True, sort=False)["timestamp"].shift()
+    latency = (messages["timestamp"] - previous).dt.total_seconds()
+    # ⚠️ 메시지 생성 시각이 기록되기 전의 로그는 한 번에 저장된 메시지가 (거의) 같은 시각 → 0초가 아니라 NaN
+    messages["latency_s"] = latency.mask(latency < MIN_LATENCY_S)
+    return messages, nouns
+
+
+def topic_adherence(messages, nouns, selections, cache_path=None):
+    """세션별 토픽 일치도
+
+    - topic_match: 세션에 기록된 토픽이 참가자가 같은 순서(position = session)로 선택한 토픽과 같은지
+    - topic_consistency: 세션 메시지 중 세션 대표 토픽(가장 많이 기록된 토픽)과 같은 비율
+    - keyword_coverage: 선택 토픽의 제목+설명 명사 중 세션 대화에 한 번이라도 나온 비율 (자유 주제는 NaN)
+    """
+    keys = messages[SESSION_KEYS]
+    topic_counts = messages.groupby(SESSION_KEYS + ["topic"], observed=True).size().rename("n").reset_index()
+    top = topic_counts.sort_values("n", ascending=False, kind="stable").drop_duplicates(SESSION_KEYS)
+    sizes = topic_counts.groupby(SESSION_KEYS, observed=True)["n"].sum().rename("messages")
+    sessions = top.set_index(SESSION_KEYS).join(sizes)
+    sessions["topic_consistency"] = sessions["n"] / sessions["messages"]
+    sessions = sessions.drop(columns=["n", "messages"]).reset_index()
+
+    assigned = selections.rename(columns={"position": "session", "title": "selected_topic"})
+    assigned = assigned.astype({"participant": str, "persona": str, "session": np.int16, "selected_topic": str})
+    for column in ("participant", "persona", "topic"):
+        sessions[column] = sessions[column].astype(str)
+    sessions = sessions.merge(assigned[SESSION_KEYS + ["selected_topic", "description"]], on=SESSION_KEYS, how="left")
+    sessions["topic_match"] = (sessions["topic"] == sessions["selected_topic"]).astype("boolean").mask(sessions["selected_topic"].isna())
+
+    # ✅ 키워드: 선택 토픽 제목+설명의 명사 → 세션 대화 명사와 merge하여 겹치는 개수
+    targets = sessions.dropna(subset=["selected_topic"])
+    _, target_nouns = cached_tokenize(targets["selected_topic"] + " " + targets["description"].fillna("").astype(str), cache_path)
+    keywords = explode_nouns(targets[SESSION_KEYS], target_nouns)
+    said = explode_nouns(keys.astype({"participant": str, "persona": str}), nouns)
+    matched = keywords.merge(said, on=SESSION_KEYS + ["noun"], how="inner")
+    coverage = (matched.groupby(SESSION_KEYS).size() / keywords.groupby(SESSION_KEYS).size()).fillna(0).rename("keyword_coverage")
+    sessions = sessions.merge(coverage.reset_index(), on=SESSION_KEYS, how="left")
+    return sessions.drop(columns=["description"])
+
+
+def session_report(messages, selections=None, cache_path=None):
+    """참가자 × 페르소나 × 세션별 지표 DataFrame (messages: load_table("messages"), cache_path: 형태소 분석 캐시)"""
+    messages, nouns = add_message_metrics(messages, cache_path)
+    is_user = messages["role"] == "user"
+    is_ai = messages["role"] == "ai"
+
+    # ✅ 역할별 값만 남긴 열을 만들어 group-by 한 번으로 집계 (해당 역할이 아니면 NaN → 평균에서 제외)
+    columns = messages[SESSION_KEYS + ["timestamp"]].copy()
+    for role, mask in (("user", is_user), ("ai", is_ai)):
+        columns[f"{role}_messages"] = mask.astype(np.int32)
+        columns[f"{role}_chars"] = messages["chars"].where(mask)
+        columns[f"{role}_tokens"] = messages["tokens"].where(mask)
+    # AI 응답 시간 = 사용자 메시지 → AI 메시지, 사용자 응답 시간 = AI 메시지 → 다음 사용자 메시지
+    previous_role = messages.groupby(SESSION_KEYS, observed=True, sort=False)["role"].shift()
+    columns["ai_latency_s"] = messages["latency_s"].where(is_ai & (previous_role == "user"))
+    columns["user_latency_s"] = messages["latency_s"].where(is_user & (previous_role == "ai"))
+
+    report = columns.groupby(SESSION_KEYS, observed=True).agg(
+        user_messages=("user_messages", "sum"),
+        ai_messages=("ai_messages", "sum"),
+        user_chars_mean=("user_chars", "mean"),
+        ai_chars_mean=("ai_chars", "mean"),
+        user_chars_total=("user_chars", "sum"),
+        ai_chars_total=("ai_chars", "sum"),
+        user_tokens_mean=("user_tokens", "mean"),
+        ai_tokens_mean=("ai_tokens", "mean"),
+        ai_latency_median_s=("ai_latency_s", "median"),
+        user_latency_median_s=("user_latency_s", "median"),
+        started_at=("timestamp", "min"),
+        ended_at=("timestamp", "max"),
+    )
+    report["turns"] = report[["user_messages", "ai_messages"]].min(axis=1)
+    duration = (report["ended_at"] - report["started_at"]).dt.total_seconds()
+    report["duration_s"] = duration.mask(duration < MIN_LATENCY_S)  # 세션의 모든 시각이 같으면 알 수 없음
+    report = report.reset_index().astype({"participant": str, "persona": str})
+
+    if selections is None:
+        selections = pd.DataFrame(columns=["participant", "persona", "position", "title", "description"])
+    adherence = topic_adherence(messages, nouns, selections, cache_path)
+    return report.merge(adherence, on=SESSION_KEYS, how="left")
+
+
+COMPARE_METRICS = [
+    "turns", "user_chars_mean", "ai_chars_mean", "user_tokens_mean", "ai_tokens_mean",
+    "ai_latency_median_s", "user_latency_median_s", "duration_s", "topic_consistency", "keyword_coverage",
+]
+
+
+def compare_personas(report, metrics=COMPARE_METRICS, exclude_free_topic=True):
+    """Tag vs Epi 비교: 페르소나별 평균 + 참가자별 (epi - tag) 평균 차이의 평균/표준편차 (대응 비교)"""
+    if exclude_free_topic:
+        report = report[report["topic"] != FREE_TOPIC]
+    per_participant = report.groupby(["participant", "persona"])[metrics].mean().unstack("persona")
+    means = report.groupby("persona")[metrics].mean().T
+    diff = per_participant.xs("epi", axis=1, level="persona") - per_participant.xs("tag", axis=1, level="persona")
+    means["diff_mean"] = diff.mean()
+    means["diff_std"] = diff.std()
+    means["participants"] = diff.notna().sum()
+    return means
+
+
+#################### 실행 ####################
+
+def build_report(out_dir=ANALYTICS_DIR, bench=False):
+    """messages/topic_selections 테이블 → session_metrics.parquet 저장, (세션 지표, Tag vs Epi 비교) 반환"""
+    timings = {}
+    started = time.perf_counter()
+    messages = load_table("messages", out_dir)
+    selections = (load_table("topic_selections", out_dir) if os.path.exists(table_path("topic_selections", out_dir))
+                  else None)
+    timings["load"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    report = session_report(messages, selections, table_path(TOKEN_CACHE, out_dir))
+    timings["report"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    comparison = compare_personas(report)
+    report.to_parquet(table_path("session_metrics", out_dir), index=False)
+    timings["compare+save"] = time.perf_counter() - started
+
+    print(f"✅ [METRICS] 메시지 {len(messages)}개 → 세션 {len(report)}개: {table_path('session_metrics', out_dir)}")
+    if bench:
+        print("📊 [METRICS] " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items())
+              + f" (총 {sum(timings.values()):.3f}s)")
+    return report, comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="messages 테이블 → 세션별 대화 지표 + Tag vs Epi 비교")
+    parser.add_argument("--out", default=ANALYTICS_DIR)
+    parser.add_argument("--bench", action="store_true", help="단계별 소요 시간 출력 (분석기 로드 시간 제외)")
+    args = parser.parse_args()
+    if args.bench:
+        get_kiwi()
+    _, comparison = build_report(args.out, args.bench)
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(comparison.round(3))
@@ -0,0 +1,219 @@
+# Firestore export JSON → columnar Parquet tables for analysis
+# - frontend/src/exportAllFirestore.js가 만든 중첩 JSON(참가자 → 페르소나 → 세션 → 메시지)을 참가자 단위로 스트리밍 파싱
+# - messages / button_events / survey_responses / topic_selections 네 테이블로 평탄화
+# - participant, persona, topic 등 반복되는 문자열 열은 dictionary 인코딩 → load_table()로 필요한 열·참가자만 바로 읽기
+# - pyarrow 필요 (ijson이 있으면 참가자 한 명씩만 메모리에 올리고, 없으면 orjson/json으로 파일 전체 파싱)
+
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import ijson
+except ImportError:  # 스트리밍 파서가 없으면 파일 전체를 한 번에 파싱
+    ijson = None
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+## ✅ 설정 (환경 변수로 조정 가능)
+EXPORT_DIR = os.getenv("ANALYTICS_EXPORT_DIR", os.path.join("frontend", "src", "firestore"))
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "analytics_data")
+BATCH_ROWS = int(os.getenv("ANALYTICS_BATCH_ROWS", "50000"))  # 이만큼 모이면 row group 하나로 기록
+
+DICT = pa.dictionary(pa.int32(), pa.string())
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+
+SCHEMAS = {
+    "messages": pa.schema([
+        ("participant", DICT), ("persona", DICT), ("session", pa.int16()), ("turn", pa.int32()),
+        ("role", DICT), ("topic", DICT), ("session_id", pa.string()), ("timestamp", TIMESTAMP), ("content", pa.string()),
+    ]),
+    "button_events": pa.schema([
+        ("participant", DICT), ("event_id", pa.string()), ("page", DICT), ("button", DICT), ("timestamp", TIMESTAMP),
+    ]),
+    "survey_responses": pa.schema([
+        ("participant", DICT), ("source", DICT), ("form", DICT), ("persona", DICT), ("session", pa.int16()),
+        ("item", DICT), ("question", DICT), ("value", pa.float64()), ("timestamp", TIMESTAMP),
+    ]),
+    "topic_selections": pa.schema([
+        ("participant", DICT), ("persona", DICT), ("position", pa.int16()), ("title", DICT), ("description", pa.string()),
+    ]),
+}
+
+
+#################### 스트리밍 파싱 ####################
+
+def iter_participants(path):
+    """최상위 키(참가자) 단위로 (participant, 문서) 반환"""
+    with open(path, "rb") as file:
+        if ijson is not None:
+            yield from ijson.kvitems(file, "", use_float=True)
+            return
+        data = json_loads(file.read())
+    yield from data.items()
+
+
+def parse_form(form):
+    """설문 form 이름 → (persona, session)  예: "chat1(tag)_3" → ("tag", 3), "PerEval(epi)" → ("epi", None), "EpiEval" → ("epi", None)"""
+    persona = "tag" if "(tag)" in form else "epi" if "(epi)" in form or form.startswith("Epi") else None
+    session = None
+    if "_" in form:
+        suffix = form.rsplit("_", 1)[1]
+        session = int(suffix) if suffix.isdigit() else None
+    return persona, session
+
+
+def question_key(item):
+    """설문 문항 키에서 "." 앞부분만 사용  예: "0_Q4. 내 역할과 관련하여, ..." → "0_Q4" """
+    return item.split(".", 1)[0].strip()
+
+
+#################### 평탄화 (참가자 문서 → 행) ####################
+
+def iter_messages(participant, doc):
+    for persona, sessions in doc.items():
+        for session, session_doc in sessions.items():
+            for position, message in enumerate(session_doc.get("messages", [])):
+                # ✅ 메시지의 index(세션 안의 위치)가 있으면 사용 (동시에 추가되어 배열 순서가 섞인 경우에도 올바른 순서)
+                yield (participant, persona, int(session) if str(session).isdigit() else None, message.get("index", position),
+                       message.get("role"), message.get("topic"), message.get("session_id"),
+                       message.get("timestamp"), message.get("content"))
+
+
+def iter_button_events(participant, doc):
+    for event_id, event in doc.get("events", {}).items():
+        yield participant, event_id, event.get("page"), event.get("button"), event.get("timestamp")
+
+
+def iter_survey_responses(participant, doc):
+    for source, forms in doc.items():  # ChatEval (Eval_chat.json) 또는 PerEval (Eval_logs.json)
+        for form, form_doc in forms.items():
+            persona, session = parse_form(form)
+            for item, value in form_doc.get("responses", {}).items():
+                yield (participant, source, form, persona, session, item, question_key(item),
+                       float(value) if isinstance(value, (int, float)) else None, form_doc.get("timestamp"))
+
+
+def iter_topic_selections(participant, doc):
+    for persona in ("tag", "epi"):
+        titles = doc.get(f"{persona}_topics", [])
+        if isinstance(titles, str):
+            titles = json.loads(titles)
+        descriptions = doc.get(f"{persona}_topic_descriptions", [])
+        if isinstance(descriptions, str):
+            descriptions = json.loads(descriptions)
+        for position, title in enumerate(titles, start=1):
+            description = descriptions[position - 1] if position <= len(descriptions) else None
+            yield participant, persona, position, title, description
+
+
+# ✅ 테이블 이름 → [(내보내기 파일, 평탄화 함수)]
+TABLES = {
+    "messages": [("chat_logs.json", iter_messages)],
+    "button_events": [("button_logs.json", iter_button_events)],
+    "survey_responses": [("Eval_chat.json", iter_survey_responses), ("Eval_logs.json", iter_survey_responses)],
+    "topic_selections": [("user_topics.json", iter_topic_selections)],
+}
+
+
+#################### Parquet 기록 ####################
+
+def to_arrow(rows, schema):
+    """행 목록 → Arrow 테이블 (문자열 열은 dictionary 인코딩, 시각은 UTC로 변환)"""
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.type == TIMESTAMP:
+            # 서버(datetime.now().isoformat())는 시간대 없이, 브라우저는 "Z"로 저장 → 모두 UTC로 간주
+            parsed = pd.to_datetime(pd.Series(values, dtype="object"), utc=True, format="ISO8601", errors="coerce")
+            arrays.append(pa.array(parsed, type=TIMESTAMP))
+        elif field.type == DICT:
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class TableWriter:
+    """행을 모아서 BATCH_ROWS마다 row group으로 기록 (임시 파일에 쓰고 close 시 교체)"""
+
+    def __init__(self, path, schema, batch_rows=BATCH_ROWS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.schema = schema
+        self.batch_rows = batch_rows
+        self.writer = pq.ParquetWriter(self.tmp_path, schema, compression="zstd", use_dictionary=True)
+        self.rows = []
+        self.count = 0
+
+    def extend(self, rows):
+        for row in rows:
+            self.rows.append(row)
+            if len(self.rows) >= self.batch_rows:
+                self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(to_arrow(self.rows, self.schema))
+            self.count += len(self.rows)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+        return self.count
+
+
+def table_path(name, out_dir=ANALYTICS_DIR):
+    return os.path.join(out_dir, f"{name}.parquet")
+
+
+def build_table(name, export_dir=EXPORT_DIR, out_dir=ANALYTICS_DIR):
+    """내보내기 파일들을 참가자 단위로 읽어 테이블 하나를 저장 (행 수 반환)"""
+    writer = TableWriter(table_path(name, out_dir), SCHEMAS[name])
+    for file_name, flatten in TABLES[name]:
+        path = os.path.join(export_dir, file_name)
+        if not os.path.exists(path):
+            print(f"⚠️ [ANALYTICS] 내보내기 파일 없음 (건너뜀): {path}")
+            continue
+        for participant, doc in iter_participants(path):
+            writer.extend(flatten(participant, doc))
+    return writer.close()
+
+
+def build_tables(export_dir=EXPORT_DIR, out_dir=ANALYTICS_DIR, names=None):
+    """모든(또는 지정한) 테이블 생성 → {테이블: 행 수}"""
+    counts = {}
+    for name in names or TABLES:
+        started = time.perf_counter()
+        counts[name] = build_table(name, export_dir, out_dir)
+        print(f"✅ [ANALYTICS] {name}: {counts[name]}행 ({time.perf_counter() - started:.2f}s) → {table_path(name, out_dir)}")
+    return counts
+
+
+#################### 읽기 ####################
+
+def load_table(name, out_dir=ANALYTICS_DIR, columns=None, participants=None):
+    """테이블을 DataFrame으로 읽기 (dictionary 열은 category dtype, participants를 주면 해당 참가자만)"""
+    filters = [("participant", "in", list(participants))] if participants else None
+    return pd.read_parquet(table_path(name, out_dir), columns=columns, filters=filters)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Firestore 내보내기 JSON → Parquet 분석 테이블")
+    parser.add_argument("export_dir", nargs="?", default=EXPORT_DIR)
+    parser.add_argument("--out", default=ANALYTICS_DIR)
+    parser.add_argument("--tables", nargs="*", choices=list(TABLES), default=None)
+    args = parser.parse_args()
+    build_tables(args.export_dir, args.out, args.tables)
@@ -0,0 +1,208 @@
+# Incremental Firestore export → columnar store (analytics_data/*.parquet)
+# - exportAllFirestore.js처럼 매번 모든 문서/서브컬렉션을 다시 읽지 않고,
+#   (컬렉션, 참가자, 서브컬렉션)마다 마지막으로 읽은 (시각 필드, 문서 id) 커서 이후의 문서만 조회
+#   (시각 필드는 write-behind 큐에 넣을 때 기록되고 커밋은 나중이므로, 커서보다 LOOKBACK_S 앞부터 다시 조회)
+# - 서브컬렉션 조회는 스레드로 동시에 실행, 바뀐 문서의 행만 기존 Parquet 테이블에서 교체
+# - client에 analytics.firestore_fake.FakeFirestore 또는 에뮬레이터(FIRESTORE_EMULATOR_HOST) 클라이언트를 넣어 확인 가능
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from analytics.export_loader import (
+    ANALYTICS_DIR, SCHEMAS, iter_button_events, iter_messages, iter_survey_responses, iter_topic_selections,
+    table_path, to_arrow,
+)
+
+## ✅ 설정 (환경 변수로 조정 가능)
+EXPORT_CONCURRENCY = int(os.getenv("ANALYTICS_EXPORT_CONCURRENCY", "8"))  # 동시에 실행하는 서브컬렉션 조회 수
+CURSOR_FILE = "_export_cursors.json"
+# 커서보다 이만큼 앞부터 다시 조회 (write-behind 큐의 flush 간격 0.2초 + 커밋 재시도 대기보다 넉넉하게, 겹치는 문서는 merge_table이 교체)
+LOOKBACK_S = float(os.getenv("ANALYTICS_EXPORT_LOOKBACK_S", "10"))
+
+# ✅ 컬렉션별 설정
+# - subcollections: 참가자 문서 아래 서브컬렉션 (None이면 참가자 문서 자체가 데이터)
+# - cursor_field: 문서가 새로 쓰이거나 바뀔 때 갱신되는 ISO 시각 문자열 필드
+# - keys: 바뀐 문서 하나에 해당하는 테이블 행을 찾는 열 (이 행들을 새 값으로 교체)
+COLLECTIONS = {
+    "chat_logs": {
+        "table": "messages", "subcollections": ["tag", "epi"], "cursor_field": "updated_at",
+        "flatten": iter_messages, "keys": ["participant", "persona", "session"],
+    },
+    "button_logs": {
+        "table": "button_events", "subcollections": ["events"], "cursor_field": "timestamp",
+        "flatten": iter_button_events, "keys": ["participant", "event_id"],
+    },
+    "Eval_logs(chat)": {
+        "table": "survey_responses", "subcollections": ["ChatEval"], "cursor_field": "timestamp",
+        "flatten": iter_survey_responses, "keys": ["participant", "source", "form"],
+    },
+    "Eval_logs": {
+        "table": "survey_responses", "subcollections": ["PerEval"], "cursor_field": "timestamp",
+        "flatten": iter_survey_responses, "keys": ["participant", "source", "form"],
+    },
+    "user_topics": {
+        "table": "topic_selections", "subcollections": None, "cursor_field": "updated_at",
+        "flatten": iter_topic_selections, "keys": ["participant"],
+    },
+}
+
+
+def lookback_value(value, seconds=LOOKBACK_S):
+    """ISO 시각 문자열 → seconds초 앞의 초 단위 문자열 (형식·시간대 표기와 관계없이 그 초 이후의 값보다 작거나 같음)"""
+    try:
+        moved = datetime.fromisoformat(value) - timedelta(seconds=seconds)
+    except (TypeError, ValueError):
+        return value  # 시각 필드가 없던 예전 문서의 커서("") 등은 그대로 사용
+    return moved.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class CursorStore:
+    """{컬렉션: {참가자: {서브컬렉션: [시각, 문서 id]}}}를 JSON 파일로 저장 (병합이 끝난 뒤에만 저장)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.cursors = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.cursors = json.load(file)
+
+    def get(self, collection, participant, sub):
+        cursor = self.cursors.get(collection, {}).get(participant, {}).get(sub)
+        return tuple(cursor) if cursor else None
+
+    def advance(self, collection, participant, sub, value, doc_id):
+        current = self.get(collection, participant, sub)
+        if current is None or (value, doc_id) > current:
+            self.cursors.setdefault(collection, {}).setdefault(participant, {})[sub] = [value, doc_id]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(self.cursors, file, ensure_ascii=False, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class FirestoreExporter:
+    """커서 이후에 바뀐 문서만 읽어 Parquet 테이블에 병합"""
+
+    def __init__(self, client=None, out_dir=ANALYTICS_DIR, concurrency=EXPORT_CONCURRENCY):
+        if client is None:
+            from firebase_utils import db as client
+        self.client = client
+        self.out_dir = out_dir
+        self.concurrency = concurrency
+        self.cursors = CursorStore(os.path.join(out_dir, CURSOR_FILE))
+        self.stats = {}
+
+    ## ✅ 조회
+    def query_changes(self, collection, query, participant, sub):
+        """커서 시각 - LOOKBACK_S 이후의 문서 → [(participant, sub, doc_id, data)]
+
+        시각 필드는 큐에 넣을 때 찍히므로 커서보다 이른 시각의 문서가 나중에 커밋될 수 있음
+        → 이미 읽은 (시각, id)도 건너뛰지 않고 다시 가져와 merge_table에서 같은 키의 행을 교체
+        """
+        field = COLLECTIONS[collection]["cursor_field"]
+        cursor = self.cursors.get(collection, participant, sub)
+        if cursor is not None:
+            query = query.where(field, ">=", lookback_value(cursor[0]))
+        return [(participant, sub, snapshot.id, snapshot.to_dict() or {}) for snapshot in query.stream()]
+
+    def fetch_collection(self, collection, executor):
+        """컬렉션 하나의 바뀐 문서 목록 (참가자 × 서브컬렉션 조회를 동시에 실행)"""
+        config = COLLECTIONS[collection]
+        root = self.client.collection(collection)
+        if config["subcollections"] is None:
+            # 참가자 문서 자체가 데이터 → 컬렉션 전체에 커서 하나
+            changes = self.query_changes(collection, root, "", "")
+            return [(doc_id, sub, doc_id, data) for _, sub, doc_id, data in changes], 1
+
+        participants = [ref.id for ref in root.list_documents()]
+        jobs = [
+            executor.submit(self.query_changes, collection, root.document(participant).collection(sub), participant, sub)
+            for participant in participants for sub in config["subcollections"]
+        ]
+        return [change for job in jobs for change in job.result()], len(jobs)
+
+    ## ✅ 병합
+    def build_rows(self, collection, changes):
+        config = COLLECTIONS[collection]
+        rows = []
+        for participant, sub, doc_id, data in changes:
+            doc = data if config["subcollections"] is None else {sub: {doc_id: data}}
+            rows.extend(config["flatten"](participant, doc))
+        return rows
+
+    def merge_table(self, name, collections, rows):
+        """바뀐 문서에 해당하는 기존 행을 지우고 새 행을 추가 (임시 파일에 쓰고 교체)"""
+        schema = SCHEMAS[name]
+        keys = COLLECTIONS[collections[0]]["keys"]
+        new_table = to_arrow(rows, schema)
+        path = table_path(name, self.out_dir)
+        if os.path.exists(path):
+            existing = pq.read_table(path, schema=schema)
+            changed = set(zip(*(new_table[key].to_pylist() for key in keys)))
+            keep = [key not in changed for key in zip(*(existing[key].to_pylist() for key in keys))]
+            merged = pa.concat_tables([existing.filter(pa.array(keep, type=pa.bool_())), new_table])
+        else:
+            merged = new_table
+        os.makedirs(self.out_dir, exist_ok=True)
+        pq.write_table(merged, path + ".tmp", compression="zstd", use_dictionary=True)
+        os.replace(path + ".tmp", path)
+        return merged.num_rows
+
+    ## ✅ 실행
+    def run(self, collections=None, full=False):
+        """바뀐 문서를 가져와 테이블에 병합하고 커서 저장 → 컬렉션별 지표"""
+        if full:
+            self.cursors.cursors = {}
+        collections = list(collections or COLLECTIONS)
+        changes_by_collection = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for collection in collections:
+                started = time.perf_counter()
+                changes, queries = self.fetch_collection(collection, executor)
+                changes_by_collection[collection] = changes
+                self.stats[collection] = {"queries": queries, "documents": len(changes),
+                                          "seconds": round(time.perf_counter() - started, 3)}
+                print(f"🔹 [EXPORT] {collection}: 조회 {queries}회, 바뀐 문서 {len(changes)}개")
+
+        # ✅ 같은 테이블로 가는 컬렉션(Eval_logs, Eval_logs(chat))은 한 번에 병합
+        tables = {}
+        for collection in collections:
+            tables.setdefault(COLLECTIONS[collection]["table"], []).append(collection)
+        for name, table_collections in tables.items():
+            changes = [change for collection in table_collections for change in changes_by_collection[collection]]
+            if not changes and os.path.exists(table_path(name, self.out_dir)):
+                continue
+            rows = [row for collection in table_collections
+                    for row in self.build_rows(collection, changes_by_collection[collection])]
+            total = self.merge_table(name, table_collections, rows)
+            print(f"✅ [EXPORT] {name}: {len(rows)}행 갱신 → 전체 {total}행")
+
+        # ✅ 병합이 끝난 뒤에만 커서 이동 (중간에 실패하면 다음 실행에서 같은 문서를 다시 읽음)
+        for collection, changes in changes_by_collection.items():
+            field = COLLECTIONS[collection]["cursor_field"]
+            participant_level = COLLECTIONS[collection]["subcollections"] is None
+            for participant, sub, doc_id, data in changes:
+                # 시각 필드가 없는 예전 문서는 ""로 기록 → 다음부터는 ">= ''" 조회로 필드가 있는(새로 쓰인) 문서만 읽음
+                value = data.get(field) or ""
+                self.cursors.advance(collection, "" if participant_level else participant, sub, value, doc_id)
+        self.cursors.save()
+        return self.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Firestore 증분 내보내기 → analytics Parquet 테이블")
+    parser.add_argument("--collections", nargs="*", choices=list(COLLECTIONS), default=None)
+    parser.add_argument("--out", default=ANALYTICS_DIR)
+    parser.add_argument("--full", action="store_true", help="커서를 무시하고 전체 다시 읽기")
+    parser.add_argument("--concurrency", type=int, default=EXPORT_CONCURRENCY)
+    args = parser.parse_args()
+    FirestoreExporter(out_dir=args.out, concurrency=args.concurrency).run(args.collections, args.full)
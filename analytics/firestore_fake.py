@@ -0,0 +1,117 @@
+# In-memory Firestore fake for analytics.firestore_export
+# - firebase_utils.db 대신 넣어서 Firebase 없이 증분 내보내기를 확인 (collection / document / 서브컬렉션 / where / order_by / stream)
+# - 문서를 읽은 횟수(reads)를 세어 전체 내보내기와 증분 내보내기의 읽기 수를 비교할 수 있음
+
+import copy
+import operator
+
+OPERATORS = {"==": operator.eq, ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), order=None):
+        self.collection = collection
+        self.filters = list(filters)
+        self.order = order
+
+    def where(self, field, op, value):
+        return FakeQuery(self.collection, self.filters + [(field, OPERATORS[op], value)], self.order)
+
+    def order_by(self, field):
+        """오름차순만 지원 (Firestore처럼 필드가 없는 문서는 제외)"""
+        return FakeQuery(self.collection, self.filters + [(field, lambda a, b: True, None)], field)
+
+    def stream(self):
+        refs = [ref for _, ref in sorted(self.collection.docs.items()) if ref.data is not None]
+        if self.order is not None:
+            refs = [ref for ref in refs if self.order in ref.data]
+            refs.sort(key=lambda ref: ref.data[self.order])
+        for ref in refs:
+            data = ref.data
+            if all(field in data and compare(data[field], value) for field, compare, value in self.filters):
+                self.collection.client.reads += 1
+                yield FakeSnapshot(ref, data)
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, collection_id):
+        super().__init__(self)
+        self.client = client
+        self.id = collection_id
+        self.docs = {}
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            self.client.auto_ids += 1
+            doc_id = f"auto{self.client.auto_ids:06d}"
+        if doc_id not in self.docs:
+            self.docs[doc_id] = FakeDocumentRef(self.client, doc_id)
+        return self.docs[doc_id]
+
+    def list_documents(self):
+        """데이터가 없어도 서브컬렉션이 있는 문서까지 반환 (Firestore의 missing 문서와 동일)"""
+        return [ref for _, ref in sorted(self.docs.items()) if ref.data is not None or ref.collections]
+
+
+class FakeDocumentRef:
+    def __init__(self, client, doc_id):
+        self.client = client
+        self.id = doc_id
+        self.data = None
+        self.collections = {}
+
+    def collection(self, collection_id):
+        if collection_id not in self.collections:
+            self.collections[collection_id] = FakeCollection(self.client, collection_id)
+        return self.collections[collection_id]
+
+    def set(self, data, merge=False):
+        if merge and self.data is not None:
+            self.data.update(copy.deepcopy(data))
+        else:
+            self.data = copy.deepcopy(data)
+
+    def get(self):
+        self.client.reads += 1
+        return FakeSnapshot(self, self.data)
+
+
+class FakeFirestore:
+    """firebase_utils.db 대신 사용하는 메모리 Firestore (ArrayUnion 등 특수 값은 지원하지 않음)"""
+
+    def __init__(self):
+        self.collections = {}
+        self.reads = 0
+        self.auto_ids = 0
+
+    def collection(self, collection_id):
+        if collection_id not in self.collections:
+            self.collections[collection_id] = FakeCollection(self, collection_id)
+        return self.collections[collection_id]
+
+    def load(self, export, collection_id, subcollections=()):
+        """내보내기 dict를 컬렉션에 넣기 (subcollections에 있는 키는 서브컬렉션 문서로)"""
+        collection = self.collection(collection_id)
+        for participant, doc in export.items():
+            ref = collection.document(participant)
+            fields = {key: value for key, value in doc.items() if key not in subcollections}
+            if fields:
+                ref.set(fields)
+            for sub in subcollections:
+                for doc_id, data in doc.get(sub, {}).items():
+                    ref.collection(sub).document(doc_id).set(data)
+        return self
@@ -0,0 +1,14 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+## ✅ 동기 작업(파일 읽기, 동기 SDK 호출 등)을 위한 제한된 스레드 풀
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "8"))
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """동기 함수를 이벤트 루프 밖(제한된 스레드 풀)에서 실행"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,179 @@
+from datetime import datetime
+from firebase_admin import firestore
+from langchain_core.messages import HumanMessage, AIMessage
+from firebase_utils import db, async_db
+
+## ✅ 세션별 저장 완료 지점 (high-water mark)
+# (user_number, persona, session_number) -> Firestore에 이미 저장된 메시지 개수
+persisted_counts = {}
+
+
+def get_session_number(session_id):
+    """세션 ID (예: chat1/3)에서 대화 세션 번호 추출"""
+    return int(session_id.split("/")[-1])
+
+
+def get_log_ref(user_number, persona, session_id, client=db):
+    """chat_logs/{user}/{tag|epi}/{session} 문서 참조 반환"""
+    session_number = get_session_number(session_id)
+    return client.collection("chat_logs").document(user_number).collection(persona).document(str(session_number))
+
+
+def ordered_entries(data):
+    """chat_logs 문서의 메시지를 index 순서로 정렬 (동시에 추가된 경우 배열 순서가 섞일 수 있음, index가 없는 예전 항목은 배열 위치 사용)"""
+    entries = data.get("messages", [])
+    order = sorted(range(len(entries)), key=lambda position: entries[position].get("index", position))
+    return [entries[position] for position in order]
+
+
+def written_count(data):
+    """실제로 저장된 메시지 수: index가 있으면 가장 큰 index + 1 (persisted_count가 없는 예전 문서는 messages 길이)"""
+    entries = data.get("messages", [])
+    indexes = [entry["index"] for entry in entries if "index" in entry]
+    if indexes:
+        return max(indexes) + 1
+    return data.get("persisted_count", len(entries))
+
+
+def get_persisted_count(user_number, persona, session_id):
+    """이미 저장된 메시지 개수 반환 (재시작 후 최초 1회만 Firestore 조회)"""
+    key = (user_number, persona, get_session_number(session_id))
+    if key not in persisted_counts:
+        doc = get_log_ref(user_number, persona, session_id).get()
+        data = doc.to_dict() if doc.exists else {}
+        persisted_counts[key] = written_count(data)
+    return persisted_counts[key]
+
+
+def sync_persisted_count(user_number, persona, session_number, count):
+    """다른 워커가 더 많이 저장한 경우(세션 백엔드의 persisted_count) 저장 완료 지점을 앞으로 이동"""
+    key = (user_number, persona, session_number)
+    if count is not None and count > persisted_counts.get(key, -1):
+        persisted_counts[key] = count
+
+
+def peek_persisted_count(user_number, persona, session_number):
+    """Firestore를 조회하지 않고 알고 있는 저장 완료 지점만 반환 (모르면 None)"""
+    return persisted_counts.get((user_number, persona, session_number))
+
+
+def forget_persisted_count(user_number, persona, session_number):
+    """세션이 캐시에서 내보내질 때 저장 완료 지점 삭제 (다시 열면 백엔드/Firestore에서 복원)"""
+    persisted_counts.pop((user_number, persona, session_number), None)
+
+
+async def aget_persisted_count(user_number, persona, session_id):
+    """get_persisted_count의 async 버전 (async Firestore 클라이언트 사용)"""
+    key = (user_number, persona, get_session_number(session_id))
+    if key not in persisted_counts:
+        doc = await get_log_ref(user_number, persona, session_id, client=async_db).get()
+        data = doc.to_dict() if doc.exists else {}
+        persisted_counts[key] = written_count(data)
+    return persisted_counts[key]
+
+
+def to_messages(log_entries):
+    """chat_logs 메시지 목록을 LangChain 메시지로 변환 (생성 시각은 additional_kwargs["timestamp"]에 유지)"""
+    messages = []
+    for entry in log_entries:
+        message_class = HumanMessage if entry.get("role") == "user" else AIMessage
+        extra = {"timestamp": entry["timestamp"]} if entry.get("timestamp") else {}
+        messages.append(message_class(content=entry["content"], additional_kwargs=extra))
+    return messages
+
+
+def to_records(messages):
+    """LangChain 메시지를 JSON 직렬화 가능한 role/content/timestamp 목록으로 변환 (세션 백엔드 저장용)"""
+    return [
+        {"role": "user" if isinstance(msg, HumanMessage) else "ai", "content": msg.content, "timestamp": msg.additional_kwargs.get("timestamp")}
+        for msg in messages
+    ]
+
+
+def stamp_turn(new_messages, user_time):
+    """이번 턴에 추가된 메시지에 생성 시각 기록 (사용자 메시지: 요청 받은 시각, AI 메시지: 응답 완료 시각)"""
+    now = datetime.now().isoformat()
+    for msg in new_messages:
+        msg.additional_kwargs.setdefault("timestamp", user_time if isinstance(msg, HumanMessage) else now)
+
+
+def load_chat_history(user_number, persona, session_id):
+    """저장된 chat_logs 문서에서 대화 이력과 토픽 복원 (없으면 빈 이력)"""
+    doc = get_log_ref(user_number, persona, session_id).get()
+    data = doc.to_dict() if doc.exists else {}
+    log_entries = ordered_entries(data)
+    persisted_counts[(user_number, persona, get_session_number(session_id))] = written_count(data)
+    topic = log_entries[-1].get("topic") if log_entries else None
+    return to_messages(log_entries), topic
+
+
+async def aload_chat_history(user_number, persona, session_id):
+    """load_chat_history의 async 버전"""
+    doc = await get_log_ref(user_number, persona, session_id, client=async_db).get()
+    data = doc.to_dict() if doc.exists else {}
+    log_entries = ordered_entries(data)
+    persisted_counts[(user_number, persona, get_session_number(session_id))] = written_count(data)
+    topic = log_entries[-1].get("topic") if log_entries else None
+    return to_messages(log_entries), topic
+
+
+def build_log_entry(msg, session_id, persona, topic, index):
+    """LangChain 메시지를 chat_logs 메시지 형식으로 변환
+
+    index(세션 안의 메시지 위치)를 넣어 항목마다 값이 달라지도록 함 → ArrayUnion이 같은 내용의 다른 메시지("네" 등)를 건너뛰지 않고,
+    같은 메시지를 다시 추가할 때만(같은 index·시각) 중복으로 걸러짐
+    """
+    msg.additional_kwargs.setdefault("timestamp", datetime.now().isoformat())  # 다시 추가해도 같은 항목이 되도록 시각 고정
+    return {
+        "index": index,
+        "session_id": session_id,
+        "persona": persona,
+        "topic": topic,
+        "role": "user" if isinstance(msg, HumanMessage) else "ai",
+        "content": msg.content,
+        "timestamp": msg.additional_kwargs["timestamp"],
+    }
+
+
+def append_chat_log(user_number, persona, session_id, messages, topic):
+    """아직 저장되지 않은 메시지(새 human/ai 턴)만 Firestore 문서에 추가"""
+    key = (user_number, persona, get_session_number(session_id))
+    start = get_persisted_count(user_number, persona, session_id)
+    new_messages = messages[start:]
+    if not new_messages:
+        return 0
+
+    entries = [build_log_entry(msg, session_id, persona, topic, start + i) for i, msg in enumerate(new_messages)]
+
+    # ✅ 전체 문서를 덮어쓰지 않고 새 메시지만 ArrayUnion으로 추가
+    get_log_ref(user_number, persona, session_id).set(
+        {
+            "messages": firestore.ArrayUnion(entries),
+            "persisted_count": start + len(entries),
+            "updated_at": datetime.now().isoformat(),
+        },
+        merge=True,
+    )
+    persisted_counts[key] = start + len(entries)
+    return len(entries)
+
+
+async def aappend_chat_log(user_number, persona, session_id, messages, topic):
+    """append_chat_log의 async 버전 (async Firestore 클라이언트 사용)"""
+    key = (user_number, persona, get_session_number(session_id))
+    start = await aget_persisted_count(user_number, persona, session_id)
+    new_messages = messages[start:]
+    if not new_messages:
+        return 0
+
+    entries = [build_log_entry(msg, session_id, persona, topic, start + i) for i, msg in enumerate(new_messages)]
+    await get_log_ref(user_number, persona, session_id, client=async_db).set(
+        {
+            "messages": firestore.ArrayUnion(entries),
+            "persisted_count": start + len(entries),
+            "updated_at": datetime.now().isoformat(),
+        },
+        merge=True,
+    )
+    persisted_counts[key] = start + len(entries)
+    return len(entries)
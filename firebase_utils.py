@@ -1,5 +1,5 @@
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
 import os
 
 
@@ -17,3 +17,4 @@ else:
     print("❌ FIREBASE_CONFIG 환경 변수가 설정되지 않았거나, JSON 파일이 존재하지 않습니다.")
 
 db = firestore.client()
+async_db = firestore_async.client()  # ✅ async 엔드포인트용 Firestore 클라이언트
@@ -3,6 +3,7 @@ import { useParams, useLocation, useNavigate } from "react-router-dom";
 import axios from "axios";
 import "./Chat.css";
 import Modal from "./Modal"; // 모달 스타일 추가
+import { readEventStream } from "../sse";
 
 
 const Chat2 = () => {
@@ -104,27 +105,21 @@ const Chat2 = () => {
             }),
         });
 
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
         let aiMessage = { role: "ai", content: "" };
 
-        // ✅ AI 메시지를 실시간으로 추가
+        // ✅ AI 메시지를 실시간으로 업데이트
         setMessages((prev) => [...prev, aiMessage]);
 
-        while (true) {
-            const { value, done } = await reader.read();
-            if (done) break;
-            aiMessage.content += decoder.decode(value, { stream: true });
-
-            // ✅ 메시지를 실시간으로 업데이트
+        // ✅ SSE token 이벤트가 도착할 때마다 반영 (서버가 토큰 단위로 전송하므로 별도 지연 없음)
+        const summary = await readEventStream(response, (text) => {
+            aiMessage.content += text;
             setMessages((prev) => {
                 const updatedMessages = [...prev];
                 updatedMessages[updatedMessages.length - 1] = { ...aiMessage };
                 return updatedMessages;
             });
-
-            await new Promise((resolve) => setTimeout(resolve, 25)); // ✅ 속도 조절
-        }
+        });
+        console.log("✅ [DEBUG] 스트리밍 완료:", summary);
 
         console.log("✅ [DEBUG] 최종 AI 메시지:", aiMessage);
     } catch (error) {
@@ -26,16 +26,22 @@ const Topics = () => {
   const [selectedInformational, setSelectedInformational] = useState([]);
   const [tooltip, setTooltip] = useState({ visible: false, text: "", x: 0, y: 0 });
   const [counterbalancedTopics, setCounterbalancedTopics] = useState(null);
+  const [allTopics, setAllTopics] = useState(topicsData);
 
+  // ✅ 서버의 토픽 카탈로그에서 카테고리별 목록을 한 번에 가져옴 (실패하면 번들된 topics.json 사용)
   useEffect(() => {
-    const emotional = topicsData.filter(topic => topic.index >= 1 && topic.index <= 25);
-    const appraisal = topicsData.filter(topic => topic.index >= 26 && topic.index <= 50);
-    const informational = topicsData.filter(topic => topic.index >= 51 && topic.index <= 76);
+    const applyTopics = (topics) => {
+      setAllTopics(topics);
+      setEmotionalTopics(topics.filter(topic => topic.category === "Emotional Support"));
+      setAppraisalTopics(topics.filter(topic => topic.category === "Appraisal Support"));
+      setInformationalTopics(topics.filter(topic => topic.category === "Informational Support"));
+    };
 
-    setEmotionalTopics(emotional);
-    setAppraisalTopics(appraisal);
-    setInformationalTopics(informational);
-  }, []);
+    applyTopics(topicsData);
+    axios.get(`${BACKEND_URL}/topics`)
+      .then(response => applyTopics(Object.values(response.data.categories).flat()))
+      .catch(error => console.error("🚨 [ERROR] 토픽 목록 조회 실패 (번들된 topics.json 사용):", error));
+  }, [BACKEND_URL]);
 
   const handleCheckboxChange = (category, id) => {
     if (category === "Emotional Support") {
@@ -102,9 +108,9 @@ const Topics = () => {
       console.error("🚨 [ERROR] 버튼 클릭 로그 저장 실패:", error);
     }
 
-    const selectedEmotionalTopics = topicsData.filter(topic => selectedEmotional.includes(topic.index));
-    const selectedAppraisalTopics = topicsData.filter(topic => selectedAppraisal.includes(topic.index));
-    const selectedInformationalTopics = topicsData.filter(topic => selectedInformational.includes(topic.index));
+    const selectedEmotionalTopics = allTopics.filter(topic => selectedEmotional.includes(topic.index));
+    const selectedAppraisalTopics = allTopics.filter(topic => selectedAppraisal.includes(topic.index));
+    const selectedInformationalTopics = allTopics.filter(topic => selectedInformational.includes(topic.index));
 
     const shuffledEmotional = shuffleArray([...selectedEmotionalTopics]);
     const shuffledAppraisal = shuffleArray([...selectedAppraisalTopics]);
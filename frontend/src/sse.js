@@ -0,0 +1,43 @@
+/**
+ * 🔹 SSE 스트림 파서 (/chat_tag_stream, /chat_epi_stream 응답용)
+ * - "token" 이벤트마다 onToken(text) 호출
+ * - "done" 이벤트의 지표(tokens, ttft_ms, elapsed_ms)를 반환
+ * - "error" 이벤트는 예외로 전달
+ */
+export async function readEventStream(response, onToken) {
+  if (!response.ok) {
+    throw new Error(`스트리밍 요청 실패 (HTTP ${response.status})`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let summary = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // ✅ 프레임은 빈 줄("\n\n")로 구분됨 (마지막 조각은 다음 청크와 합쳐서 처리)
+    const frames = buffer.split("\n\n");
+    buffer = frames.pop();
+
+    for (const frame of frames) {
+      let event = "message";
+      const dataLines = [];
+      for (const line of frame.split("\n")) {
+        if (line.startsWith(":")) continue; // heartbeat
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) dataLines.push(line.slice(5).trimStart());
+      }
+      if (dataLines.length === 0) continue;
+
+      const data = JSON.parse(dataLines.join("\n"));
+      if (event === "token") onToken(data.text);
+      else if (event === "done") summary = data;
+      else if (event === "error") throw new Error(data.message);
+    }
+  }
+  return summary;
+}
@@ -0,0 +1,218 @@
+import asyncio
+import functools
+import os
+import threading
+import tiktoken
+from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from persona_cache import get_llm
+from async_utils import blocking_executor
+
+## ✅ 설정 (환경 변수로 조정 가능)
+# 페르소나 타입별로 프롬프트에 그대로 넣을 최근 대화 토큰 수 (시스템 프롬프트와 현재 입력은 제외)
+HISTORY_TOKEN_BUDGET = {
+    "tag": int(os.getenv("HISTORY_TOKENS_TAG", "1500")),
+    "epi": int(os.getenv("HISTORY_TOKENS_EPI", "2000")),
+}
+# 요약 후에는 예산의 이 비율만큼만 최근 대화로 남김 (매 턴마다 요약하지 않도록)
+SUMMARY_KEEP_RATIO = float(os.getenv("HISTORY_SUMMARY_KEEP_RATIO", "0.5"))
+# 요약이 아직 끝나지 않았을 때(또는 실패했을 때) 요약 안 된 대화를 예산의 이 배수까지 그대로 보냄 (넘으면 바로 요약)
+SUMMARY_LAG_RATIO = float(os.getenv("HISTORY_SUMMARY_LAG_RATIO", "3"))
+SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-3.5-turbo")
+TOKEN_ENCODING_MODEL = "gpt-3.5-turbo"
+MESSAGE_OVERHEAD_TOKENS = 4  # 메시지마다 붙는 role/구분자 토큰 (OpenAI chat 포맷 기준)
+
+SUMMARY_PROMPT = """
+You are maintaining a running summary of a conversation between a user and an AI persona.
+Update the existing summary with the new lines. Keep facts the user shared, their feelings,
+what the AI already asked or suggested, and the current direction of the conversation.
+Write at most 8 short sentences in Korean.
+
+=== Existing summary ===
+{summary}
+
+=== New lines ===
+{lines}
+"""
+
+## ✅ 페르소나 타입별 지표
+stats = {}
+lock = threading.Lock()
+background_tasks = set()  # 실행 중인 요약 태스크 (GC 방지)
+
+
+@functools.lru_cache(maxsize=1)
+def get_encoding():
+    """tiktoken 인코더 (모델 이름을 모르면 cl100k_base 사용)"""
+    try:
+        return tiktoken.encoding_for_model(TOKEN_ENCODING_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@functools.lru_cache(maxsize=8192)
+def count_text_tokens(text):
+    """문자열 토큰 수 (같은 메시지를 매 턴 다시 인코딩하지 않도록 캐시)"""
+    return len(get_encoding().encode(text))
+
+
+def count_message_tokens(message):
+    return count_text_tokens(str(message.content)) + MESSAGE_OVERHEAD_TOKENS
+
+
+def count_tokens(messages):
+    return sum(count_message_tokens(message) for message in messages)
+
+
+def window_start(messages, start, budget):
+    """messages[start:] 중 뒤에서부터 budget 토큰 안에 들어가는 구간의 시작 인덱스 (사용자 메시지에서 시작)"""
+    used = 0
+    index = len(messages)
+    while index > start:
+        cost = count_message_tokens(messages[index - 1])
+        if used + cost > budget:
+            break
+        used += cost
+        index -= 1
+    # ✅ 대화 턴 중간(AI 응답)에서 시작하지 않도록 조정
+    while index < len(messages) and not isinstance(messages[index], HumanMessage):
+        index += 1
+    return index
+
+
+def count_stat(persona, name, value=1):
+    with lock:
+        persona_stats = stats.setdefault(persona, {
+            "requests": 0, "history_tokens_full": 0, "history_tokens_sent": 0,
+            "prompt_tokens_saved": 0, "summaries": 0, "summary_errors": 0, "lagging_windows": 0, "inline_summaries": 0,
+        })
+        persona_stats[name] += value
+
+
+def record(persona, full_tokens, sent_tokens):
+    count_stat(persona, "requests")
+    count_stat(persona, "history_tokens_full", full_tokens)
+    count_stat(persona, "history_tokens_sent", sent_tokens)
+    count_stat(persona, "prompt_tokens_saved", max(0, full_tokens - sent_tokens))
+
+
+def apply_window(inputs, entry, persona):
+    """프롬프트에 넣을 history를 요약 + 최근 대화로 교체
+
+    요약된 지점(summarized_count) 이후의 대화는 빠뜨리지 않음: 예산을 넘었는데 백그라운드 요약이 아직이면
+    요약 안 된 대화를 예산 × SUMMARY_LAG_RATIO까지 그대로 보내고, 그것도 넘으면 이 자리에서 요약
+    """
+    messages = inputs["history"]
+    budget = HISTORY_TOKEN_BUDGET[persona]
+    summarized = min(entry.get("summarized_count", 0), len(messages))
+    start = window_start(messages, summarized, budget)
+    if start > summarized:
+        count_stat(persona, "lagging_windows")
+        start = window_start(messages, summarized, int(budget * SUMMARY_LAG_RATIO))
+        if start > summarized and not entry.get("summarizing"):
+            # ⚠️ 요약이 너무 뒤처짐 (이전 요약 실패 등) → 응답 전에 요약 (LLM 호출 1회 추가)
+            entry["summarizing"] = True
+            summarize(entry, persona)
+            count_stat(persona, "inline_summaries")
+            summarized = min(entry.get("summarized_count", 0), len(messages))
+            start = window_start(messages, summarized, int(budget * SUMMARY_LAG_RATIO))
+        if start > summarized:
+            print(f"⚠️ [HISTORY] 요약되지 않은 대화 {start - summarized}개가 프롬프트에서 제외됨 ({persona})")
+    recent = messages[start:]
+
+    window = []
+    if entry.get("summary"):
+        window.append(SystemMessage(content=f"Summary of the earlier conversation:\n{entry['summary']}"))
+    window.extend(recent)
+
+    record(persona, count_tokens(messages), count_tokens(window))
+    return {**inputs, "history": window}
+
+
+def history_window(entry, persona):
+    """세션 항목에 묶인 history 축소 단계 (prompt | llm 앞에 연결)"""
+    return RunnableLambda(lambda inputs: apply_window(inputs, entry, persona))
+
+
+## ✅ 오래된 대화 요약 (응답 전송 후 백그라운드에서 실행)
+def pending_summary(entry, persona):
+    """요약해야 할 구간 (start, end) 반환 (최근 대화가 예산을 넘지 않으면 None)"""
+    messages = entry["history"].messages
+    budget = HISTORY_TOKEN_BUDGET[persona]
+    start = min(entry.get("summarized_count", 0), len(messages))
+    if window_start(messages, start, budget) <= start:
+        return None
+    return start, window_start(messages, start, int(budget * SUMMARY_KEEP_RATIO))
+
+
+def build_summary_prompt(entry, start, end):
+    messages = entry["history"].messages[start:end]
+    lines = "\n".join(
+        f"{'User' if isinstance(message, HumanMessage) else 'AI'}: {message.content}" for message in messages
+    )
+    return SUMMARY_PROMPT.format(summary=entry.get("summary") or "(none)", lines=lines)
+
+
+def apply_summary(entry, persona, end, summary):
+    entry["summary"] = summary
+    entry["summarized_count"] = end
+    count_stat(persona, "summaries")
+
+
+def summarize(entry, persona):
+    """요약 갱신 (동기)"""
+    try:
+        span = pending_summary(entry, persona)
+        if span is None:
+            return
+        response = get_llm(SUMMARY_MODEL, 0).invoke(build_summary_prompt(entry, *span))
+        apply_summary(entry, persona, span[1], response.content)
+    except Exception as e:
+        count_stat(persona, "summary_errors")
+        print(f"🚨 [HISTORY] 대화 요약 실패 ({persona}): {e}")
+    finally:
+        entry["summarizing"] = False
+
+
+async def asummarize(entry, persona):
+    """요약 갱신 (async)"""
+    try:
+        span = pending_summary(entry, persona)
+        if span is None:
+            return
+        response = await get_llm(SUMMARY_MODEL, 0).ainvoke(build_summary_prompt(entry, *span))
+        apply_summary(entry, persona, span[1], response.content)
+    except Exception as e:
+        count_stat(persona, "summary_errors")
+        print(f"🚨 [HISTORY] 대화 요약 실패 ({persona}): {e}")
+    finally:
+        entry["summarizing"] = False
+
+
+def schedule_summary(entry, persona):
+    """필요하면 요약을 백그라운드로 실행 (이벤트 루프가 있으면 태스크, 없으면 스레드 풀)"""
+    if entry.get("summarizing") or pending_summary(entry, persona) is None:
+        return
+    entry["summarizing"] = True
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        blocking_executor.submit(summarize, entry, persona)
+        return
+    task = loop.create_task(asummarize(entry, persona))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+def get_stats():
+    """페르소나 타입별 history 토큰 절감 지표"""
+    with lock:
+        summary = {}
+        for persona, persona_stats in stats.items():
+            full = persona_stats["history_tokens_full"]
+            summary[persona] = {
+                **persona_stats,
+                "token_budget": HISTORY_TOKEN_BUDGET[persona],
+                "saved_ratio": round(persona_stats["prompt_tokens_saved"] / full, 3) if full else 0.0,
+            }
+        return summary
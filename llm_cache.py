@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    from langchain_core.caches import BaseCache
+    from langchain_core.load import dumps, loads
+except ImportError:  # Topic_Sampling 스크립트처럼 LangChain 없이 사용하는 경우
+    BaseCache = object
+
+## ✅ 설정 (환경 변수로 조정 가능)
+# rw: 캐시를 읽고 미스 시 저장, replay: 캐시만 사용 (미스 시 오류 — 재실행 결과를 고정), bypass: 캐시 사용 안 함
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "rw")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.db"))
+LLM_CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024)
+EVICT_TARGET_RATIO = 0.9  # 용량을 넘으면 이 비율까지 오래 사용하지 않은 항목부터 삭제
+
+MODES = ("rw", "replay", "bypass")
+
+
+class CacheMiss(KeyError):
+    """replay 모드에서 캐시에 없는 요청"""
+
+
+def make_key(model, temperature, prompt, params=None):
+    """(model, temperature, prompt, params)의 내용 기반 해시 키"""
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "prompt": prompt, "params": params or {}},
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite 기반 LLM 응답 캐시 (용량 제한, 오래 사용하지 않은 항목부터 삭제, 단계별 히트율)"""
+
+    def __init__(self, path=LLM_CACHE_PATH, mode=LLM_CACHE_MODE, max_bytes=LLM_CACHE_MAX_BYTES):
+        if mode not in MODES:
+            raise ValueError(f"❌ 지원하지 않는 LLM_CACHE_MODE: {mode} ({', '.join(MODES)})")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = {}
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache (last_access)")
+        self.total_bytes = self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def _connect(self):
+        """스레드별 연결 재사용 (WAL 모드로 여러 프로세스의 동시 읽기/쓰기 허용)"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def _count(self, stage, name):
+        with self.lock:
+            stage_stats = self.stats.setdefault(stage, {"hits": 0, "misses": 0, "writes": 0})
+            stage_stats[name] += 1
+
+    ## ✅ 조회 / 저장
+    def get(self, key, stage="default"):
+        """캐시된 값 반환 (없으면 None, replay 모드에서는 CacheMiss)"""
+        if self.mode == "bypass":
+            return None
+        row = self._connect().execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count(stage, "misses")
+            if self.mode == "replay":
+                raise CacheMiss(f"❌ [LLM CACHE] replay 모드인데 캐시에 없는 요청입니다 (stage: {stage}, key: {key[:12]})")
+            return None
+        self._count(stage, "hits")
+        with self._connect() as conn:
+            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value, stage="default"):
+        """값 저장 (rw 모드에서만, 용량을 넘으면 오래된 항목 삭제)"""
+        if self.mode != "rw":
+            return
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        size = len(data.encode("utf-8"))
+        now = time.time()
+        with self._connect() as conn:
+            old = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, stage, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, stage, data, size, now, now),
+            )
+        with self.lock:
+            self.total_bytes += size - (old[0] if old else 0)
+        self._count(stage, "writes")
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """용량의 EVICT_TARGET_RATIO까지 오래 사용하지 않은 항목부터 삭제"""
+        target = int(self.max_bytes * EVICT_TARGET_RATIO)
+        with self._connect() as conn:
+            rows = conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall()
+            removed = []
+            for key, size in rows:
+                if self.total_bytes <= target:
+                    break
+                removed.append((key,))
+                with self.lock:
+                    self.total_bytes -= size
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", removed)
+        return len(removed)
+
+    def clear(self, stage=None):
+        """캐시 삭제 (stage를 지정하면 해당 단계만)"""
+        with self._connect() as conn:
+            if stage is None:
+                conn.execute("DELETE FROM llm_cache")
+            else:
+                conn.execute("DELETE FROM llm_cache WHERE stage = ?", (stage,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        with self.lock:
+            self.total_bytes = total
+
+    ## ✅ 호출 래퍼
+    def cached_call(self, stage, model, temperature, prompt, params, compute):
+        """캐시에 있으면 반환, 없으면 compute()를 실행하여 저장 (결과는 JSON 직렬화 가능해야 함)"""
+        key = make_key(model, temperature, prompt, params)
+        cached = self.get(key, stage)
+        if cached is not None:
+            return cached
+        value = compute()
+        self.put(key, value, stage)
+        return value
+
+    async def acached_call(self, stage, model, temperature, prompt, params, compute):
+        """cached_call의 async 버전 (compute는 코루틴 함수)"""
+        key = make_key(model, temperature, prompt, params)
+        cached = self.get(key, stage)
+        if cached is not None:
+            return cached
+        value = await compute()
+        self.put(key, value, stage)
+        return value
+
+    ## ✅ 지표
+    def get_stats(self):
+        """단계별 히트/미스/저장 수와 히트율"""
+        with self.lock:
+            summary = {}
+            for stage, stage_stats in self.stats.items():
+                lookups = stage_stats["hits"] + stage_stats["misses"]
+                summary[stage] = {**stage_stats, "hit_ratio": round(stage_stats["hits"] / lookups, 3) if lookups else 0.0}
+            return {"mode": self.mode, "size_bytes": self.total_bytes, "max_bytes": self.max_bytes, "stages": summary}
+
+    def report(self):
+        """단계별 히트율 출력"""
+        stats = self.get_stats()
+        print(f"📊 [LLM CACHE] 모드: {stats['mode']}, 크기: {stats['size_bytes'] / 1024 / 1024:.1f}MB")
+        for stage, stage_stats in stats["stages"].items():
+            print(f"   - {stage}: 히트 {stage_stats['hits']}, 미스 {stage_stats['misses']}, "
+                  f"저장 {stage_stats['writes']}, 히트율 {stage_stats['hit_ratio']:.1%}")
+
+
+class LangChainCache(BaseCache):
+    """LangChain 모델의 cache 인자로 넣는 어댑터 (ChatOpenAI(..., cache=langchain_cache("stage")))
+
+    LangChain의 llm_string에 model, temperature, 기타 호출 파라미터(tools 등)가 포함되므로
+    (llm_string, prompt)를 키로 사용한다.
+    """
+
+    def __init__(self, cache, stage):
+        self.cache = cache
+        self.stage = stage
+
+    def lookup(self, prompt, llm_string):
+        cached = self.cache.get(make_key(llm_string, None, prompt), self.stage)
+        return [loads(generation) for generation in cached] if cached is not None else None
+
+    def update(self, prompt, llm_string, return_val):
+        self.cache.put(make_key(llm_string, None, prompt), [dumps(generation) for generation in return_val], self.stage)
+
+    def clear(self, **kwargs):
+        self.cache.clear(self.stage)
+
+
+## ✅ 오프라인 생성 단계들이 공유하는 캐시
+llm_cache = LLMCache()
+
+
+def langchain_cache(stage):
+    """단계 이름별 LangChain 캐시 어댑터"""
+    return LangChainCache(llm_cache, stage)
@@ -0,0 +1,108 @@
+"""
+/health 응답 지연 시간 부하 테스트
+
+실행 중인 서버에 N개의 /chat_tag (또는 /chat_epi) 요청을 동시에 보내는 동안
+/health를 일정 간격으로 호출하여, 대화 요청이 이벤트 루프를 막지 않는지 확인한다.
+
+사용 예:
+    uvicorn main:app --port 8000
+    python loadtest_health.py --base-url http://127.0.0.1:8000 --user P0 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+import httpx
+
+
+def percentile(values, q):
+    """정렬된 값에서 q 분위수 (nearest-rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(name, latencies_ms):
+    print(
+        f"📊 {name}: n={len(latencies_ms)} "
+        f"p50={percentile(latencies_ms, 50):.1f}ms "
+        f"p99={percentile(latencies_ms, 99):.1f}ms "
+        f"max={max(latencies_ms, default=0):.1f}ms"
+    )
+
+
+async def probe_health(client, stop_event, interval):
+    """stop_event가 설정될 때까지 /health 지연 시간 측정"""
+    latencies = []
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        response = await client.get("/health")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def send_chat(client, endpoint, user_number, index):
+    """세션이 겹치지 않도록 요청마다 별도의 세션 번호 사용 (세션 키는 "사용자:페르소나:번호"라 "/" 뒤의 번호가 달라야 함)"""
+    started = time.perf_counter()
+    response = await client.post(endpoint, json={
+        "user_number": user_number,
+        "session_id": f"loadtest/{index + 1}",
+        "persona_type": "Tag" if endpoint == "/chat_tag" else "Epi",
+        "input_text": "안녕! 오늘 하루 어땠어?",
+    })
+    elapsed = (time.perf_counter() - started) * 1000
+    ok = response.status_code == 200 and "error" not in response.json()
+    return elapsed, ok
+
+
+async def main(args):
+    # ✅ /health는 별도 클라이언트(연결 1개 유지)로 측정 → 대화 요청의 연결 풀 대기가 /health 지연에 섞이지 않음
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client, \
+            httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as probe_client:
+        # ✅ 1. 기준선: 대화 요청 없이 /health만 측정
+        stop_event = asyncio.Event()
+        probe = asyncio.create_task(probe_health(probe_client, stop_event, args.interval))
+        await asyncio.sleep(args.baseline_seconds)
+        stop_event.set()
+        baseline = await probe
+
+        # ✅ 2. 부하: 대화 요청 N개를 동시에 보내는 동안 /health 측정
+        stop_event = asyncio.Event()
+        probe = asyncio.create_task(probe_health(probe_client, stop_event, args.interval))
+        endpoint = "/chat_tag" if args.persona == "tag" else "/chat_epi"
+        started = time.perf_counter()
+        results = await asyncio.gather(*[
+            send_chat(client, endpoint, args.user, i) for i in range(args.concurrency)
+        ])
+        wall = time.perf_counter() - started
+        stop_event.set()
+        under_load = await probe
+
+    chat_latencies = [elapsed for elapsed, _ in results]
+    failures = sum(1 for _, ok in results if not ok)
+
+    print(f"\n✅ {args.concurrency}개 동시 대화 완료 ({wall:.1f}s, 실패 {failures}개)")
+    summarize("/health (기준선)", baseline)
+    summarize("/health (부하 중)", under_load)
+    summarize(endpoint, chat_latencies)
+
+    ratio = percentile(under_load, 99) / max(percentile(baseline, 99), 1e-6)
+    print(f"📈 /health p99 증가 배율: x{ratio:.2f}")
+    if args.max_p99_ratio and ratio > args.max_p99_ratio:
+        raise SystemExit(f"🚨 /health p99가 기준선 대비 x{ratio:.2f} 증가 (허용치 x{args.max_p99_ratio})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/chat 부하 중 /health 지연 시간 측정")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--user", default="P0", help="user_topics와 User_info가 준비된 참가자 번호")
+    parser.add_argument("--persona", choices=["tag", "epi"], default="tag")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.05, help="/health 호출 간격 (초)")
+    parser.add_argument("--baseline-seconds", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--max-p99-ratio", type=float, default=3.0, help="허용할 p99 증가 배율 (0이면 검사 안 함)")
+    asyncio.run(main(parser.parse_args()))
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from firebase_utils import db
@@ -9,10 +9,19 @@ import os
 import json
 from typing import Dict
 
-from ChatAgent_Tag import chat as chat_tag
-from ChatAgent_Tag import chat as chat_tag_stream
-from ChatAgent_Epi import chat as chat_epi
-from ChatAgent_Epi import chat as chat_epi_stream
+from ChatAgent_Tag import achat as chat_tag
+from ChatAgent_Tag import chat_stream as chat_tag_stream
+from ChatAgent_Epi import achat as chat_epi
+from ChatAgent_Epi import chat_stream as chat_epi_stream
+from ChatAgent_Tag import store as tag_store
+from ChatAgent_Epi import store as epi_store
+from write_queue import write_queue
+import persona_cache
+import topic_cache
+import survey_stats
+from topic_catalog import catalog as topic_catalog
+import history_window
+from stream_utils import sse_stream, get_stream_stats
 
 import firebase_admin
 from firebase_admin import credentials, firestore
@@ -25,6 +34,18 @@ db = firestore.client()
 
 app = FastAPI()
 
+# ✅ Firestore write-behind 큐 시작/종료 (종료 시 남은 쓰기 모두 커밋)
+@app.on_event("startup")
+async def start_write_queue():
+    await write_queue.start()
+
+@app.on_event("shutdown")
+async def stop_write_queue():
+    # ✅ 캐시에서 내보내는 중인 세션 저장이 끝난 뒤 종료
+    await tag_store.drain()
+    await epi_store.drain()
+    await write_queue.stop()
+
 # ✅ CORS 설정 추가
 app.add_middleware(
     CORSMiddleware,
@@ -72,32 +93,50 @@ async def submit_participant(input_data: ParticipantInput):
 
 
 ################## 3. Topic.js에서 받아오는 정보 ##################
-TOPICS_FILE = "topics.json"
-with open(TOPICS_FILE, "r", encoding="utf-8") as f:
-    TOPICS_DATA = json.load(f)
-    
+# ✅ topics.json은 topic_catalog가 한 번 읽어 제목/index/카테고리 인덱스로 조회 (파일이 바뀌면 다시 로드)
+
 # ✅ 요청 데이터 모델 정의
 class TopicSelection(BaseModel):
     tag_topics: list
     epi_topics: list
 
+class TopicLookup(BaseModel):
+    titles: list = []
+    indexes: list = []
+
+# ✅ 전체 토픽 목록 (카테고리별로 묶어서 한 번에 반환, category를 주면 해당 카테고리만)
+@app.get("/topics")
+async def list_topics(category: str = None):
+    if category is not None:
+        topics = topic_catalog.list(category)
+        if not topics:
+            raise HTTPException(status_code=404, detail=f"카테고리를 찾을 수 없습니다: {category}")
+        return {"categories": {topics[0]["category"]: topics}, "count": len(topics)}
+    categories = topic_catalog.by_category()
+    return {"categories": categories, "count": sum(len(topics) for topics in categories.values())}
+
+# ✅ 여러 토픽을 제목(title_en/title_ko) 또는 index로 한 번에 조회
+@app.post("/topics/lookup")
+async def lookup_topics(request: TopicLookup):
+    topics, missing = topic_catalog.lookup_many(request.titles, request.indexes)
+    return {"topics": topics, "missing": missing}
+
 # ✅ Firestore에 토픽 저장하는 함수
-def save_selected_topics(user_number: str, selected_topics: dict):
+async def save_selected_topics(user_number: str, selected_topics: dict):
     """사용자가 선택한 토픽을 Firestore에 저장"""
     
-    # ✅ topics.json에서 description_ko 찾기 함수
-    def get_topic_description(title_ko):
-        for topic in TOPICS_DATA:
-            if topic["title_ko"] == title_ko:
-                return topic["description_ko"]
-        return "설명 없음"  # 기본값
+    # ✅ 토픽 설명 추가 (Topic.js는 title_en, 이전 데이터는 title_ko → 제목과 같은 언어의 설명, 없으면 "설명 없음")
+    selected_topics["tag_topic_descriptions"] = [topic_catalog.describe(topic) for topic in selected_topics["tag_topics"]]
+    selected_topics["epi_topic_descriptions"] = [topic_catalog.describe(topic) for topic in selected_topics["epi_topics"]]
+    selected_topics["updated_at"] = datetime.now().isoformat()  # analytics.firestore_export 증분 커서
 
-    # ✅ 토픽 설명 추가
-    selected_topics["tag_topic_descriptions"] = [get_topic_description(topic) for topic in selected_topics["tag_topics"]]
-    selected_topics["epi_topic_descriptions"] = [get_topic_description(topic) for topic in selected_topics["epi_topics"]]
+    # ✅ Firestore에 저장 (바로 채팅에서 읽으므로 커밋 완료까지 대기)
+    committed = await write_queue.enqueue(db.collection("user_topics").document(user_number), selected_topics)
+    await committed
 
-    # ✅ Firestore에 저장
-    db.collection("user_topics").document(user_number).set(selected_topics)
+    # ✅ 토픽 캐시 갱신 (write-through) 및 이 사용자의 캐시된 페르소나 프롬프트 삭제
+    topic_cache.set_user_topics(user_number, selected_topics)
+    persona_cache.invalidate_user(user_number)
 
 # ✅ FastAPI 엔드포인트: Firestore에 토픽 저장
 @app.post("/save_selected_topics/{participant_id}")
@@ -107,7 +146,7 @@ async def save_selected_topics_api(participant_id: str, selected_topics: TopicSe
         print(json.dumps(selected_topics.dict(), indent=4, ensure_ascii=False))
 
         # ✅ Firestore에 저장
-        save_selected_topics(participant_id, selected_topics.dict())
+        await save_selected_topics(participant_id, selected_topics.dict())
 
         print(f"✅ [SUCCESS] {participant_id}의 선택된 토픽이 Firestore에 저장되었습니다.")
         return {"message": f"{participant_id}의 선택된 토픽이 Firestore에 저장되었습니다."}
@@ -121,19 +160,20 @@ async def save_selected_topics_api(participant_id: str, selected_topics: TopicSe
 from fastapi import HTTPException
 
 @app.get("/get_user_topics/{participant_id}")  
-def get_user_topics(participant_id: str):
-    """Firestore에서 참가자의 토픽 데이터 가져오기"""
+async def get_user_topics(participant_id: str):
+    """Firestore에서 참가자의 토픽 데이터 가져오기 (에이전트와 공유하는 토픽 캐시 사용)"""
     try:
-        # ✅ Firestore에서 해당 참가자의 문서 조회
-        doc_ref = db.collection("user_topics").document(participant_id)
-        doc = doc_ref.get()
+        # ✅ 토픽 캐시에서 조회 (캐시 미스 시 Firestore 문서 조회)
+        topics_data = await topic_cache.aget_user_topics(participant_id)
 
         # ✅ 문서가 존재하면 JSON 반환
-        if doc.exists:
-            return doc.to_dict()
+        if topics_data is not None:
+            return topics_data
         else:
             raise HTTPException(status_code=404, detail="해당 참가자의 토픽 데이터가 없습니다.")
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"🚨 [ERROR] Firestore에서 토픽 데이터 조회 중 오류 발생: {e}")
         raise HTTPException(status_code=500, detail="서버 내부 오류 발생")
@@ -148,35 +188,52 @@ class ChatRequest(BaseModel):
     persona_type: str
     
 
-# ✅ FastAPI에서 직접 OpenAI API의 응답을 스트리밍 처리
+# ✅ SSE 응답 헤더 (프록시 버퍼링 및 캐싱 방지)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# ✅ FastAPI에서 직접 OpenAI API의 응답을 스트리밍 처리 (token/done/error 이벤트 + heartbeat)
 @app.post("/chat_tag_stream")
-async def chat_with_tag_stream(request: ChatRequest):
-        return StreamingResponse(
-        chat_tag_stream(
+async def chat_with_tag_stream(request: ChatRequest, http_request: Request):
+    try:
+        chunks = await chat_tag_stream(
             user_number=request.user_number,
             input_text=request.input_text,
             session_id=request.session_id
-        ),
-        media_type="text/event-stream"
+        )
+    except Exception as e:
+        print(f"🚨 [ERROR] 스트리밍 세션 준비 중 오류 발생: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        sse_stream(chunks, http_request, name="tag"),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
     )
         
 @app.post("/chat_epi_stream")
-async def chat_with_epi_stream(request: ChatRequest):
-    return StreamingResponse(
-        chat_epi_stream(
+async def chat_with_epi_stream(request: ChatRequest, http_request: Request):
+    try:
+        chunks = await chat_epi_stream(
             user_number=request.user_number,
             input_text=request.input_text,
             session_id=request.session_id
-        ),
-        media_type="text/event-stream"  # ✅ 이벤트 스트리밍 형식 사용
+        )
+    except Exception as e:
+        print(f"🚨 [ERROR] 스트리밍 세션 준비 중 오류 발생: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        sse_stream(chunks, http_request, name="epi"),
+        media_type="text/event-stream",  # ✅ 이벤트 스트리밍 형식 사용
+        headers=SSE_HEADERS,
     )
 
 @app.post("/chat_tag")
 async def chat_with_tag(request: ChatRequest):
     try:
-        print(f"📌 [DEBUG] 서버에서 받은 topic: {request.topic}")  # ✅ FastAPI에서 topic을 정상적으로 받는지 확인
+        print(f"📌 [DEBUG] 서버에서 받은 세션: {request.user_number} - {request.session_id}")
         
-        ai_response = chat_tag(
+        ai_response = await chat_tag(
             user_number=request.user_number,
             input_text=request.input_text,
             session_id=request.session_id,
@@ -190,9 +247,9 @@ async def chat_with_tag(request: ChatRequest):
 @app.post("/chat_epi")
 async def chat_with_epi(request: ChatRequest):
     try:
-        print(f"📌 [DEBUG] 서버에서 받은 topic: {request.topic}")  # ✅ FastAPI에서 topic을 정상적으로 받는지 확인
+        print(f"📌 [DEBUG] 서버에서 받은 세션: {request.user_number} - {request.session_id}")
         
-        ai_response = chat_epi(
+        ai_response = await chat_epi(
             user_number=request.user_number,
             input_text=request.input_text,
             session_id=request.session_id,
@@ -213,20 +270,12 @@ def get_user_topics(user_number):
 
     return topics_data.get("persona1", [])  # "persona1" 키의 리스트 반환
 
-# ✅ src/data/topics.json에서 topic에 맞는 description 가져오기
+# ✅ topics.json에서 topic(title_ko 또는 title_en)에 맞는 description 가져오기 (토픽 카탈로그 인덱스 사용)
 def get_topic_description(topic):
-    topics_path = "topics.json"
-    if not os.path.exists(topics_path):
-        raise HTTPException(status_code=404, detail="Topics data not found")
-    
-    with open(topics_path, "r", encoding="utf-8") as f:
-        topics_data = json.load(f)
-
-    for t in topics_data:
-        if t["title_ko"] == topic:
-            return t.get("description_en", "No description available")
-    
-    return "No description available"
+    found = topic_catalog.get(topic)
+    if found is None:
+        return "No description available"
+    return found.get("description_en", "No description available")
 
 # ✅ 프론트엔드에서 요청 시 topic과 topic_description 반환
 @app.get("/get_chat_topic/{user_number}/{chat_id}")
@@ -292,13 +341,15 @@ async def submit_survey(request: SurveyRequest):
         # ✅ Firestore 경로 설정 (logs/user_number/surveys/session_id)
         survey_ref = db.collection("Eval_logs(chat)").document(request.user_number).collection("ChatEval").document(request.session_id)
 
-        # ✅ Firestore에 데이터 저장
-        survey_ref.set({
+        # ✅ Firestore에 데이터 저장 (write-behind 큐, 커밋 실패 시 로그 + lost 집계)
+        committed = write_queue.watch(await write_queue.enqueue(survey_ref, {
             "user_number": request.user_number,
             "session_id": request.session_id,
             "responses": request.responses,
             "timestamp": datetime.now().isoformat(),  # ✅ 제출 시간 저장
-        })
+        }), f"ChatEval {request.user_number}/{request.session_id}")
+        # ✅ 원본이 커밋된 뒤에만 집계
+        await survey_stats.record("ChatEval", request.user_number, request.session_id, request.responses, after=committed)
 
         print(f"✅ [SUCCESS] 설문 데이터가 Firestore에 저장되었습니다: {request.user_number} - 세션 {request.session_id}")
         return {"message": "설문이 성공적으로 저장되었습니다."}
@@ -325,6 +376,7 @@ async def get_experiencable(participant_id: str):
 class EpiEvalRequest(BaseModel):
     user_number: str
     responses: Dict[str, int]
+    session_id: str = "EpiEval"  # ✅ 프론트엔드는 보내지 않으므로 고정 문서 id 사용 (설문 문서 + 집계 제출 id)
 
 
 
@@ -343,8 +395,9 @@ async def submit_epi_eval(request: EpiEvalRequest):
             "timestamp": datetime.now().isoformat(),
         }
 
-        # ✅ Firestore에 데이터 저장
-        survey_ref.set(survey_data)
+        # ✅ Firestore에 데이터 저장 (write-behind 큐, 커밋 실패 시 로그 + lost 집계)
+        committed = write_queue.watch(await write_queue.enqueue(survey_ref, survey_data), f"evaluations {request.user_number}/{request.session_id}")
+        await survey_stats.record("evaluations", request.user_number, request.session_id, request.responses, survey_data["timestamp"], after=committed)
 
         print(f"✅ Firestore에 설문 데이터 저장 완료: {request.user_number} - {request.session_id}")
         return {"message": "설문 데이터가 Firestore에 저장되었습니다."}
@@ -396,8 +449,8 @@ async def log_event(event: LogEvent):
             "timestamp": event.timestamp,
         }
 
-        # ✅ Firestore에 데이터 저장
-        log_ref.set(log_data)
+        # ✅ Firestore에 데이터 저장 (write-behind 큐, 커밋 실패 시 로그 + lost 집계)
+        write_queue.watch(await write_queue.enqueue(log_ref, log_data), f"button_logs {event.participantId}/{event.page}/{event.button}")
 
         print(f"✅ Firestore에 버튼 클릭 로그 저장 완료: {event.participantId} - {event.page} - {event.button}")
         return {"message": "버튼 클릭 로그가 Firestore에 저장되었습니다."}
@@ -427,8 +480,12 @@ async def log_survey(survey: SurveyLog):
             "timestamp": survey.timestamp
         }
 
-        # ✅ Firestore의 `survey_logs` 컬렉션에 저장
-        db.collection("Eval_logs").document(survey.participantId).collection("PerEval").document(survey.page).set(survey_data)
+        # ✅ Firestore의 `survey_logs` 컬렉션에 저장 (write-behind 큐, 커밋 실패 시 로그 + lost 집계)
+        committed = write_queue.watch(
+            await write_queue.enqueue(db.collection("Eval_logs").document(survey.participantId).collection("PerEval").document(survey.page), survey_data),
+            f"PerEval {survey.participantId}/{survey.page}",
+        )
+        await survey_stats.record("PerEval", survey.participantId, survey.page, survey.responses, survey.timestamp, after=committed)
 
         print(f"✅ Firestore에 설문 데이터 저장 완료: ")
         return {"message": "설문 응답 저장 완료"}
@@ -438,11 +495,32 @@ async def log_survey(survey: SurveyLog):
         return {"error": str(e)}
 
 
+# ✅ 설문 종류 × 조건(tag/epi)별 문항 요약 (원본 설문 문서를 읽지 않고 누적 집계에서 바로 반환)
+@app.get("/survey_stats")
+async def get_survey_stats(form: str = None, condition: str = None):
+    return {"summaries": await survey_stats.aget_summary(form, condition)}
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "message": "Multi-Persona Backend is running!"}
 
 
+# ✅ 서버 내부 지표 (쓰기 큐 깊이, flush 지연 시간 등)
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "write_queue": write_queue.get_stats(),
+        "session_cache": {"tag": tag_store.get_stats(), "epi": epi_store.get_stats()},
+        "persona_cache": persona_cache.get_stats(),
+        "topic_cache": topic_cache.get_stats(),
+        "topic_catalog": topic_catalog.get_stats(),
+        "survey_stats": survey_stats.get_stats(),
+        "streaming": get_stream_stats(),
+        "history_window": history_window.get_stats(),
+    }
+
+
 @app.get("/")
 def root():
     return {"message": "Welcome to Multi-Personas Backend!"}
\ No newline at end of file
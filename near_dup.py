@@ -0,0 +1,264 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+## ✅ 설정 (환경 변수로 조정 가능)
+NEAR_DUP_COSINE_THRESHOLD = float(os.getenv("NEAR_DUP_COSINE_THRESHOLD", "0.95"))  # 임베딩 코사인 유사도 기준
+NEAR_DUP_JACCARD_THRESHOLD = float(os.getenv("NEAR_DUP_JACCARD_THRESHOLD", "0.7"))  # 텍스트 shingle Jaccard 기준
+NEAR_DUP_BLOCK_SIZE = int(os.getenv("NEAR_DUP_BLOCK_SIZE", "1024"))  # 한 번에 곱하는 행 수 (메모리 = 블록 × n)
+# 임베딩이 이 개수 이상이면 전체 쌍 대신 SimHash LSH 후보 쌍만 코사인 계산 (근사: 기준 근처 쌍은 일부 놓칠 수 있음)
+NEAR_DUP_LSH_MIN_ROWS = int(os.getenv("NEAR_DUP_LSH_MIN_ROWS", "20000"))
+SIMHASH_BANDS = 32
+SIMHASH_BITS = 20  # 32 band × 20 bit → 코사인 0.95 쌍은 약 98%, 0.97 쌍은 99.9% 이상 후보가 됨 (무관한 쌍은 약 0.003%)
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16  # 16 band × 8 row → Jaccard 약 0.7 이상이면 후보가 될 확률이 높음
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+#################### 임베딩 (코사인 유사도) ####################
+
+def normalize_rows(matrix):
+    """행 단위 L2 정규화 (float32, 영벡터는 그대로)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cosine_pairs(matrix, threshold=NEAR_DUP_COSINE_THRESHOLD, block_size=NEAR_DUP_BLOCK_SIZE, lsh_min_rows=NEAR_DUP_LSH_MIN_ROWS):
+    """코사인 유사도가 threshold 이상인 (i, j) 쌍 (i < j)
+
+    n < lsh_min_rows: 모든 쌍을 정확히 계산 (exact_cosine_pairs, O(n²·d))
+    그 이상: SimHash LSH로 고른 후보 쌍만 정확히 계산 (lsh_cosine_pairs, 후보 수에 비례)
+    """
+    if lsh_min_rows and len(matrix) >= lsh_min_rows:
+        return lsh_cosine_pairs(matrix, threshold, block_size)
+    return exact_cosine_pairs(matrix, threshold, block_size)
+
+
+def exact_cosine_pairs(matrix, threshold=NEAR_DUP_COSINE_THRESHOLD, block_size=NEAR_DUP_BLOCK_SIZE):
+    """모든 쌍의 코사인 유사도를 블록 단위 행렬 곱으로 계산
+
+    계산량은 그대로 O(n²·d)이고, n × n 유사도 행렬을 한 번에 만들지 않아 메모리만 block_size × n으로 줄어든다.
+    """
+    normalized = normalize_rows(matrix)
+    n = normalized.shape[0]
+    rows, cols, sims = [], [], []
+    for start in range(0, n, block_size):
+        block = normalized[start:start + block_size]
+        # ✅ 상삼각만 계산 (자기 자신과 앞쪽 행은 제외)
+        similarity = block @ normalized[start:].T
+        np.fill_diagonal(similarity, -1.0)
+        similarity[np.tril_indices(len(block), -1)] = -1.0
+        i, j = np.nonzero(similarity >= threshold)
+        rows.append(i + start)
+        cols.append(j + start)
+        sims.append(similarity[i, j])
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return np.concatenate(rows).astype(np.int64), np.concatenate(cols).astype(np.int64), np.concatenate(sims)
+
+
+def simhash_keys(normalized, bands=SIMHASH_BANDS, bits=SIMHASH_BITS, block_size=NEAR_DUP_BLOCK_SIZE, seed=1):
+    """임의 초평면 부호(SimHash) → 행마다 band별 bits 비트 키 (n × bands, 가까운 벡터일수록 같은 키가 많음)"""
+    rng = np.random.RandomState(seed)
+    planes = rng.standard_normal((normalized.shape[1], bands * bits)).astype(np.float32)
+    weights = np.left_shift(np.uint64(1), np.arange(bits, dtype=np.uint64))
+    keys = np.empty((normalized.shape[0], bands), dtype=np.uint64)
+    for start in range(0, normalized.shape[0], block_size):
+        signs = (normalized[start:start + block_size] @ planes) >= 0
+        keys[start:start + block_size] = (signs.reshape(-1, bands, bits) * weights).sum(axis=2, dtype=np.uint64)
+    return keys
+
+
+def lsh_candidates(keys):
+    """band 키가 하나라도 같은 (i, j) 쌍 (i < j, 중복 제거)"""
+    n = keys.shape[0]
+    codes = []
+    for band in range(keys.shape[1]):
+        order = np.argsort(keys[:, band], kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(keys[order, band]) != 0])
+        ends = np.repeat(np.r_[starts[1:], n], np.diff(np.r_[starts, n]))  # 정렬 위치마다 속한 버킷의 끝
+        # ✅ 같은 버킷 안에서 offset만큼 떨어진 위치끼리 한 번에 짝지음 (버킷 수만큼 Python 루프를 돌지 않음)
+        positions = np.arange(n)
+        offset = 1
+        while True:
+            positions = positions[positions + offset < ends[positions]]
+            if not len(positions):
+                break
+            i, j = order[positions], order[positions + offset]
+            codes.append(np.minimum(i, j).astype(np.int64) * n + np.maximum(i, j))
+            offset += 1
+    if not codes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    codes = np.unique(np.concatenate(codes))
+    return codes // n, codes % n
+
+
+def lsh_cosine_pairs(matrix, threshold=NEAR_DUP_COSINE_THRESHOLD, block_size=NEAR_DUP_BLOCK_SIZE,
+                     bands=SIMHASH_BANDS, bits=SIMHASH_BITS):
+    """SimHash LSH 후보 쌍만 정확한 코사인으로 확인 (근사: 후보가 되지 못한 기준 근처 쌍은 빠질 수 있음)"""
+    normalized = normalize_rows(matrix)
+    rows, cols = lsh_candidates(simhash_keys(normalized, bands, bits, block_size))
+    sims = np.empty(len(rows), dtype=np.float32)
+    for start in range(0, len(rows), block_size * 64):
+        chunk = slice(start, start + block_size * 64)
+        sims[chunk] = np.einsum("ij,ij->i", normalized[rows[chunk]], normalized[cols[chunk]])
+    found = sims >= threshold
+    print(f"🔹 [NEAR DUP] LSH 후보 {len(rows)}쌍 → 유사 쌍 {int(found.sum())}개 (전체 {len(matrix) * (len(matrix) - 1) // 2}쌍)")
+    return rows[found], cols[found], sims[found]
+
+
+def greedy_keep(n, rows, cols):
+    """입력 순서대로 남기되, 이미 남긴 항목과 중복 쌍인 뒤쪽 항목은 제거 (O(n + 쌍 수))"""
+    order = np.argsort(rows, kind="stable")
+    rows, cols = rows[order], cols[order]
+    bounds = np.searchsorted(rows, np.arange(n + 1))
+    removed = np.zeros(n, dtype=bool)
+    for i in range(n):
+        if not removed[i] and bounds[i] < bounds[i + 1]:
+            removed[cols[bounds[i]:bounds[i + 1]]] = True
+    return np.flatnonzero(~removed)
+
+
+def dedup_embeddings(matrix, threshold=NEAR_DUP_COSINE_THRESHOLD, block_size=NEAR_DUP_BLOCK_SIZE):
+    """거의 같은 임베딩을 제거하고 남길 행 번호 반환 (먼저 나온 항목 유지)"""
+    rows, cols, _ = cosine_pairs(matrix, threshold, block_size)
+    keep = greedy_keep(len(matrix), rows, cols)
+    print(f"🔹 [NEAR DUP] 임베딩 {len(matrix)}개 → {len(keep)}개 (유사 쌍 {len(rows)}개, 기준 {threshold})")
+    return keep
+
+
+#################### 텍스트 (MinHash + LSH) ####################
+
+def normalize_text(text):
+    text = re.sub(r"[^\w\s]", " ", str(text).lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shingles(text):
+    """단어 1-gram + 2-gram 집합"""
+    words = normalize_text(text).split()
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def jaccard(a, b):
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+class MinHasher:
+    """shingle 집합 → MinHash 서명 (순열 수만큼의 해시 함수를 NumPy로 한 번에 계산)"""
+
+    def __init__(self, num_perm=MINHASH_PERMUTATIONS, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    @staticmethod
+    def hash_shingles(items):
+        """프로세스와 무관하게 같은 값이 나오도록 blake2b 기반 해시 사용"""
+        return np.fromiter(
+            (int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "little") % MERSENNE_PRIME
+             for item in items),
+            dtype=np.uint64, count=len(items),
+        )
+
+    def signature(self, items):
+        if not items:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint64)
+        hashes = self.hash_shingles(list(items))
+        # (a * h + b) mod p → 각 순열의 최솟값 (a, h < 2^31 이므로 uint64에서 넘치지 않음)
+        return ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME).min(axis=0)
+
+
+class TextDedupIndex:
+    """텍스트를 하나씩 넣으면서 거의 같은 텍스트를 찾는 증분 인덱스
+
+    LSH band 버킷으로 후보만 골라 실제 shingle Jaccard로 확인하므로
+    항목마다 앞의 모든 항목과 비교하지 않는다 (항목당 후보 수 k → 전체 O(n·k)).
+    """
+
+    def __init__(self, threshold=NEAR_DUP_JACCARD_THRESHOLD, num_perm=MINHASH_PERMUTATIONS, bands=LSH_BANDS):
+        if num_perm % bands:
+            raise ValueError(f"❌ num_perm({num_perm})은 bands({bands})로 나누어떨어져야 합니다.")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.items = []  # 저장된 항목의 shingle 집합
+        self.stats = {"added": 0, "duplicates": 0, "candidates": 0}
+
+    def __len__(self):
+        return len(self.items)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes() for band in range(self.bands)]
+
+    def find(self, text):
+        """text와 거의 같은 기존 항목 번호 (없으면 None)와 (shingle, band 키) 반환"""
+        items = shingles(text)
+        band_keys = self._band_keys(self.hasher.signature(items))
+        candidates = set()
+        for bucket, band_key in zip(self.buckets, band_keys):
+            candidates.update(bucket.get(band_key, ()))
+        self.stats["candidates"] += len(candidates)
+        for candidate in sorted(candidates):
+            if jaccard(items, self.items[candidate]) >= self.threshold:
+                return candidate, (items, band_keys)
+        return None, (items, band_keys)
+
+    def add(self, text):
+        """거의 같은 항목이 없으면 저장하고 True, 있으면 False"""
+        match, (items, band_keys) = self.find(text)
+        if match is not None:
+            self.stats["duplicates"] += 1
+            return False
+        position = len(self.items)
+        self.items.append(items)
+        for bucket, band_key in zip(self.buckets, band_keys):
+            bucket.setdefault(band_key, []).append(position)
+        self.stats["added"] += 1
+        return True
+
+
+def dedup_texts(texts, threshold=NEAR_DUP_JACCARD_THRESHOLD):
+    """거의 같은 텍스트를 제거하고 남길 위치 목록 반환 (먼저 나온 항목 유지)"""
+    index = TextDedupIndex(threshold)
+    return [position for position, text in enumerate(texts) if index.add(text)]
+
+
+##### ===== topics.json 점검 ===== #####
+def check_topics(path, field="description_en", threshold=NEAR_DUP_JACCARD_THRESHOLD):
+    """topics.json에서 거의 같은 주제 쌍 출력"""
+    with open(path, "r", encoding="utf-8") as file:
+        topics = json.load(file)
+    index = TextDedupIndex(threshold)
+    kept, duplicates = [], []  # kept[i]는 인덱스의 i번째 항목
+    for topic in topics:
+        match, _ = index.find(topic[field])
+        if match is None:
+            index.add(topic[field])
+            kept.append(topic)
+        else:
+            duplicates.append((topic, match))
+    print(f"📊 {path}: 주제 {len(topics)}개, 거의 같은 주제 {len(duplicates)}개 (기준 {threshold}, {field})")
+    for topic, match in duplicates:
+        print(f"   - {topic['index']}. {topic['title_en']}  ≈  {kept[match]['title_en']}")
+    return duplicates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="topics.json 후보의 거의 같은 주제 점검")
+    parser.add_argument("path", nargs="?", default="topics.json")
+    parser.add_argument("--field", default="description_en")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUP_JACCARD_THRESHOLD)
+    args = parser.parse_args()
+    check_topics(args.path, args.field, args.threshold)
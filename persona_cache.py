@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from langchain_openai import ChatOpenAI
+from topic_cache import TOPIC_CACHE_TTL, loaded_at
+
+## ✅ 설정 (환경 변수로 조정 가능)
+# 프롬프트 캐시 유지 시간 (초) — 프롬프트에 토픽이 들어가므로 토픽 캐시보다 오래 유지하지 않음
+# (invalidate_user는 이 워커의 캐시만 지우므로, 다른 워커에서 토픽을 바꾼 경우 최대 TOPIC_CACHE_TTL 후 반영)
+PROMPT_CACHE_TTL = min(float(os.getenv("PERSONA_CACHE_TTL", "1800")), TOPIC_CACHE_TTL)
+
+## ✅ 캐시 저장소
+# (persona_type, user_number, 파일 버전) -> 정리된 페르소나 텍스트
+persona_texts = {}
+# (persona_type, user_number, 파일 버전, 토픽 인덱스) -> {"prompt", "topic", "topic_description", ...}
+prompt_cache = {}
+# (model, temperature) -> 공유 ChatOpenAI 클라이언트 (HTTP 연결 풀 재사용)
+llm_clients = {}
+
+lock = threading.RLock()
+stats = {"persona_hits": 0, "persona_misses": 0, "prompt_hits": 0, "prompt_misses": 0, "invalidations": 0}
+
+
+def file_version(filepath):
+    """페르소나 파일 버전 (수정 시각 + 크기) — 파일이 바뀌면 캐시 키가 달라짐"""
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"❌ {filepath} 파일을 찾을 수 없습니다.")
+    stat = os.stat(filepath)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def get_persona_text(persona_type, user_number, filepath, build):
+    """정리된 페르소나 텍스트 반환 (파일이 바뀌지 않았으면 build를 다시 실행하지 않음)"""
+    version = file_version(filepath)
+    key = (persona_type, user_number, version)
+    with lock:
+        if key in persona_texts:
+            stats["persona_hits"] += 1
+            return persona_texts[key]
+        stats["persona_misses"] += 1
+
+    value = build(user_number)
+    with lock:
+        # ✅ 같은 사용자의 이전 파일 버전 항목은 제거
+        for old_key in [k for k in persona_texts if k[:2] == (persona_type, user_number) and k != key]:
+            del persona_texts[old_key]
+        persona_texts[key] = value
+    return value
+
+
+def get_cached_prompt(persona_type, user_number, filepath, topic_index):
+    """캐시된 프롬프트 항목 반환 (없거나 만료되었거나 파일이 바뀌었으면 None)"""
+    if not os.path.exists(filepath):
+        return None
+    key = (persona_type, user_number, file_version(filepath), topic_index)
+    with lock:
+        cached = prompt_cache.get(key)
+        if cached is None or time.monotonic() - cached["created_at"] > PROMPT_CACHE_TTL:
+            prompt_cache.pop(key, None)
+            stats["prompt_misses"] += 1
+            return None
+        stats["prompt_hits"] += 1
+        return cached
+
+
+def put_cached_prompt(persona_type, user_number, filepath, topic_index, **entry):
+    """렌더링된 프롬프트와 토픽 정보를 캐시에 저장
+
+    만료 시각은 토픽 데이터를 불러온 시각 기준 → 토픽 캐시에서 꺼낸 오래된 토픽으로 만든 프롬프트가 TTL만큼 더 살아남지 않음
+    """
+    key = (persona_type, user_number, file_version(filepath), topic_index)
+    created_at = loaded_at(user_number) or time.monotonic()
+    with lock:
+        for old_key in [k for k in prompt_cache if k[:2] == (persona_type, user_number) and k[2] != key[2]]:
+            del prompt_cache[old_key]
+        prompt_cache[key] = {**entry, "created_at": created_at}
+
+
+def invalidate_user(user_number):
+    """사용자의 프롬프트 캐시 삭제 (토픽을 다시 선택했을 때 호출)"""
+    with lock:
+        for key in [k for k in prompt_cache if k[1] == user_number]:
+            del prompt_cache[key]
+        stats["invalidations"] += 1
+
+
+def get_llm(model, temperature, **kwargs):
+    """(model, temperature)별로 하나의 ChatOpenAI 클라이언트를 공유"""
+    key = (model, temperature, tuple(sorted(kwargs.items())))
+    with lock:
+        if key not in llm_clients:
+            llm_clients[key] = ChatOpenAI(model=model, temperature=temperature, **kwargs)
+        return llm_clients[key]
+
+
+def get_stats():
+    """캐시 지표 반환"""
+    with lock:
+        return {**stats, "persona_entries": len(persona_texts), "prompt_entries": len(prompt_cache), "llm_clients": len(llm_clients)}
@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import time
+
+import Create_Query
+import Create_Context
+import Epi_Augmentation
+from llm_cache import llm_cache
+from near_dup import TextDedupIndex
+
+## ✅ 설정 (환경 변수 또는 CLI 인자로 조정 가능)
+CHECKPOINT_DIR = os.getenv("PIPELINE_CHECKPOINT_DIR", "Pipeline_Checkpoints")
+OPENAI_CONCURRENCY = int(os.getenv("PIPELINE_OPENAI_CONCURRENCY", "8"))  # OpenAI 동시 요청 수
+TAVILY_CONCURRENCY = int(os.getenv("PIPELINE_TAVILY_CONCURRENCY", "4"))  # Tavily 동시 요청 수 (검색 단계에 적용)
+
+
+def resolve_participants(patterns):
+    """참가자 번호 또는 glob 패턴(예: P1*, P[0-9])을 User_info 파일 기준으로 참가자 목록으로 변환"""
+    participants = []
+    for pattern in patterns:
+        if any(ch in pattern for ch in "*?["):
+            names = [os.path.splitext(os.path.basename(path))[0] for path in glob.glob(f"User_info/{pattern}.json")]
+            matched = sorted(name for name in names if not name.endswith("_Per"))
+        else:
+            matched = [pattern]
+        for name in matched:
+            if name not in participants:
+                participants.append(name)
+    return participants
+
+
+class Checkpoint:
+    """(참가자, 단계, role, episode) 단위 결과를 JSON 파일로 저장하여 중단 후 이어서 실행"""
+
+    def __init__(self, root, participant):
+        self.dir = os.path.join(root, participant)
+
+    def path(self, stage, *parts):
+        name = "__".join([stage, *[re.sub(r"[^\w.-]+", "_", str(part)) for part in parts]])
+        return os.path.join(self.dir, f"{name}.json")
+
+    def load(self, stage, *parts):
+        path = self.path(stage, *parts)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def save(self, data, stage, *parts):
+        """임시 파일에 쓴 뒤 교체 (쓰는 도중 중단되어도 깨진 체크포인트가 남지 않음)"""
+        os.makedirs(self.dir, exist_ok=True)
+        path = self.path(stage, *parts)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=4, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+
+class Progress:
+    """완료된 단위 수, 처리량, 남은 시간 출력"""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.executed = 0  # 체크포인트에서 건너뛰지 않고 실제로 실행한 단위 수
+        self.started = time.perf_counter()
+
+    def update(self, label, skipped=False):
+        self.done += 1
+        if not skipped:
+            self.executed += 1
+        elapsed = time.perf_counter() - self.started
+        rate = self.executed / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "-"
+        status = "⏭️ 체크포인트" if skipped else "✅"
+        print(f"[{self.done}/{self.total}] {status} {label} | {rate * 60:.1f} units/min | ETA {eta}")
+
+
+class PersonaPipeline:
+    """Create_Query → Create_Context → Epi_Augmentation → 페르소나 생성을 참가자별 DAG로 실행
+
+    - 참가자마다 모든 episode의 쿼리 생성을 한 번의 배치 호출로 실행한 뒤,
+      (참가자, role, episode)마다 웹 검색이 실행되고 한 role의 두 episode가 끝나면 바로 그 role의 경험 증대가 실행된다.
+    - OpenAI 요청은 세마포어로, Tavily 요청은 검색 단계(search_utils.SearchStage)에서 각각 동시 실행 수를 제한한다.
+    """
+
+    def __init__(self, checkpoint_dir=CHECKPOINT_DIR, openai_concurrency=OPENAI_CONCURRENCY,
+                 tavily_concurrency=TAVILY_CONCURRENCY, force=False):
+        self.checkpoint_dir = checkpoint_dir
+        self.openai_limit = asyncio.Semaphore(openai_concurrency)
+        Create_Context.search_stage.set_concurrency(tavily_concurrency)  # 검색 단계가 재시도·캐시와 함께 제한
+        self.force = force
+        self.progress = None
+        self.failures = []
+
+    ## ✅ 단계별 실행 단위
+    async def run_queries(self, participant, ckpt, user_info):
+        """마스킹 + 쿼리 확장 — 체크포인트가 없는 에피소드만 모아 한 번의 배치 호출로 처리 (실패 항목만 개별 호출)"""
+        entries, pending = {}, []
+        for role_key, role_name, ep_key, episode in Create_Query.iter_episodes(user_info):
+            cached = None if self.force else ckpt.load("query", role_key, ep_key)
+            if cached is not None:
+                entries[(role_key, ep_key)] = cached
+                self.progress.update(f"{participant} {role_name} {ep_key} 쿼리", skipped=True)
+            else:
+                pending.append((role_key, role_name, ep_key, episode))
+        if not pending:
+            return entries
+
+        results = await Create_Query.agenerate_expanded_queries_batch(
+            [(Create_Query.episode_id(role_key, ep_key), role_name, episode) for role_key, role_name, ep_key, episode in pending],
+            self.openai_limit,
+        )
+        for role_key, role_name, ep_key, episode in pending:
+            result = results[Create_Query.episode_id(role_key, ep_key)]
+            if isinstance(result, Exception):
+                entries[(role_key, ep_key)] = result
+                continue
+            entry = Create_Query.build_query_entry(role_name, episode, *result)
+            ckpt.save(entry, "query", role_key, ep_key)
+            entries[(role_key, ep_key)] = entry
+            self.progress.update(f"{participant} {role_name} {ep_key} 쿼리")
+        return entries
+
+    async def run_context(self, participant, ckpt, role_key, ep_key, query_entry):
+        """확장 쿼리 웹 검색 (participant, role, episode) — 쿼리별 검색은 동시에 실행"""
+        cached = None if self.force else ckpt.load("context", role_key, ep_key)
+        if cached is not None:
+            self.progress.update(f"{participant} {query_entry['role']} {ep_key} 검색", skipped=True)
+            return cached
+        queries = query_entry["expanded_queries"]
+        results = await Create_Context.search_stage.search_many(queries, return_exceptions=True)
+        failed = [(query, result) for query, result in zip(queries, results) if isinstance(result, Exception)]
+        searched = {"searches": [
+            {"query": query, "results": [] if isinstance(result, Exception) else result} for query, result in zip(queries, results)
+        ]}
+        if failed:
+            # ⚠️ 실패한 쿼리는 빈 결과로 계속 진행하되, 체크포인트는 남기지 않아 다음 실행에서 다시 검색
+            for query, error in failed:
+                print(f"🚨 [SEARCH] {participant} {query_entry['role']} {ep_key} 검색 실패 (빈 결과로 진행): {query} - {error}")
+        else:
+            ckpt.save(searched, "context", role_key, ep_key)
+        self.progress.update(f"{participant} {query_entry['role']} {ep_key} 검색")
+        return searched
+
+    async def run_augmentation(self, participant, ckpt, role_key, role_name, episodes):
+        """Role별 경험 증대 (participant, role)"""
+        cached = None if self.force else ckpt.load("augment", role_key)
+        if cached is not None:
+            self.progress.update(f"{participant} {role_name} 증대", skipped=True)
+            return cached["experiencable"]
+
+        # ✅ 이 role의 검색 결과 (Create_Context와 같은 방식으로 URL·본문 중복 제거)
+        retrieved_urls = set()
+        content_index = TextDedupIndex()
+        contexts = []
+        for query_entry, searched in episodes:
+            for search in searched["searches"]:
+                contexts.extend(Create_Context.collect_results(
+                    role_name, query_entry["masked_episode"], search["query"], search["results"], retrieved_urls,
+                    content_index,
+                ))
+        retrieved_experiences = Epi_Augmentation.compile_retrieved_experiences(role_name, contexts)
+
+        masked_episodes = [query_entry["masked_episode"] for query_entry, _ in episodes]
+        experiencable = None
+        if retrieved_experiences and len(masked_episodes) >= 2:  # 검색된 경험과 에피소드가 있을 때 실행
+            async with self.openai_limit:
+                experiencable = await Epi_Augmentation.agenerate_augmented_experiences(
+                    role_name, masked_episodes[0], masked_episodes[1], retrieved_experiences
+                )
+        ckpt.save({"role": role_name, "experiencable": experiencable}, "augment", role_key)
+        self.progress.update(f"{participant} {role_name} 증대")
+        return experiencable
+
+    async def run_episode(self, participant, ckpt, role_key, ep_key, query_entry):
+        if isinstance(query_entry, Exception):
+            raise query_entry
+        searched = await self.run_context(participant, ckpt, role_key, ep_key, query_entry)
+        return query_entry, searched
+
+    async def run_role(self, participant, ckpt, role_key, role_data, query_entries):
+        role_name = role_data["Role"]
+        ep_keys = [ep_key for ep_key in ["Ep1", "Ep2"] if ep_key in role_data]
+        episodes = await asyncio.gather(*(
+            self.run_episode(participant, ckpt, role_key, ep_key, query_entries[(role_key, ep_key)]) for ep_key in ep_keys
+        ))
+        experiencable = await self.run_augmentation(participant, ckpt, role_key, role_name, episodes)
+        return episodes, experiencable
+
+    ## ✅ 참가자 단위 실행
+    def load_user_info(self, participant):
+        with open(f"User_info/{participant}.json", "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def count_units(self, user_info):
+        """참가자 한 명의 단위 수 (episode마다 쿼리·검색, role마다 증대, 마지막 저장)"""
+        episodes = sum(1 for _ in Create_Query.iter_episodes(user_info))
+        return episodes * 2 + len(user_info["Episode"]) + 1
+
+    def finalize(self, participant, user_info, role_results):
+        """체크포인트 결과를 기존 스크립트와 같은 형식의 User_Query / User_Context / User_info / _Per 파일로 저장"""
+        query_data = {"queries": []}
+        context_data = {"context": []}
+        retrieved_urls = set()  # ✅ 참가자 전체에서 URL·본문 중복 제거 (Create_Context와 동일)
+        content_index = TextDedupIndex()
+
+        for (role_key, role_data), (episodes, experiencable) in zip(user_info["Episode"].items(), role_results):
+            for query_entry, searched in episodes:
+                query_data["queries"].append(query_entry)
+                for search in searched["searches"]:
+                    context_data["context"].extend(Create_Context.collect_results(
+                        role_data["Role"], query_entry["masked_episode"], search["query"], search["results"], retrieved_urls,
+                        content_index,
+                    ))
+            if experiencable:
+                role_data["Experiencable"] = experiencable
+
+        Create_Query.save_query_data(participant, query_data)
+        Create_Context.save_context_data(participant, context_data)
+        with open(f"User_info/{participant}.json", "w", encoding="utf-8") as file:
+            json.dump(user_info, file, indent=4, ensure_ascii=False)
+        Epi_Augmentation.create_participant_persona(participant)
+
+    async def run_participant(self, participant, user_info):
+        ckpt = Checkpoint(self.checkpoint_dir, participant)
+        query_entries = await self.run_queries(participant, ckpt, user_info)
+        results = await asyncio.gather(
+            *(self.run_role(participant, ckpt, role_key, role_data, query_entries)
+              for role_key, role_data in user_info["Episode"].items()),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            # ✅ 실패한 단위만 다시 실행하도록 저장은 건너뜀 (성공한 단위는 체크포인트에 남아 있음)
+            for error in errors:
+                print(f"❌ 오류 발생 ({participant}): {error}")
+            self.failures.append((participant, errors))
+            return
+        self.finalize(participant, user_info, results)
+        self.progress.update(f"{participant} 페르소나 저장")
+
+    async def run(self, participants):
+        user_infos = {participant: self.load_user_info(participant) for participant in participants}
+        self.progress = Progress(sum(self.count_units(user_info) for user_info in user_infos.values()))
+        print(f"🚀 페르소나 파이프라인 시작: 참가자 {len(participants)}명, 단위 {self.progress.total}개")
+
+        await asyncio.gather(*(self.run_participant(participant, user_infos[participant]) for participant in participants))
+
+        elapsed = time.perf_counter() - self.progress.started
+        print(f"📊 쿼리 배치 지표: {Create_Query.batch_stats}")
+        print(f"📊 검색 지표: {Create_Context.search_stage.stats}")
+        llm_cache.report()
+        print(f"🎯 완료: {len(participants) - len(self.failures)}/{len(participants)}명, "
+              f"실행 {self.progress.executed}개 단위, {elapsed:.1f}s")
+        if self.failures:
+            print(f"⚠️ 실패한 참가자: {', '.join(participant for participant, _ in self.failures)} (다시 실행하면 이어서 진행)")
+        return not self.failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="여러 참가자의 페르소나 생성 파이프라인 (쿼리 생성 → 웹 검색 → 경험 증대)")
+    parser.add_argument("participants", nargs="+", help="참가자 번호 또는 glob 패턴 (예: P0 P1 'P1*')")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--openai-concurrency", type=int, default=OPENAI_CONCURRENCY)
+    parser.add_argument("--tavily-concurrency", type=int, default=TAVILY_CONCURRENCY)
+    parser.add_argument("--force", action="store_true", help="체크포인트를 무시하고 모든 단위를 다시 실행")
+    args = parser.parse_args()
+
+    participants = resolve_participants(args.participants)
+    if not participants:
+        parser.error("❌ 일치하는 참가자가 없습니다.")
+
+    pipeline = PersonaPipeline(args.checkpoint_dir, args.openai_concurrency, args.tavily_concurrency, args.force)
+    ok = asyncio.run(pipeline.run(participants))
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
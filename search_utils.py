@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+
+## ✅ 설정 (환경 변수로 조정 가능)
+SEARCH_PROVIDER = os.getenv("SEARCH_PROVIDER", "tavily")  # tavily 또는 stub (오프라인 테스트/벤치마크용)
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "search_cache.db")
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(7 * 24 * 3600)))  # 검색 결과 유지 시간 (초)
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "4"))
+SEARCH_MAX_RETRIES = int(os.getenv("SEARCH_MAX_RETRIES", "4"))
+SEARCH_BACKOFF_BASE = float(os.getenv("SEARCH_BACKOFF_BASE", "1.0"))  # 재시도 대기 시간 기준 (초, 지수 증가)
+SEARCH_BACKOFF_MAX = 30.0
+
+
+def normalize_query(query):
+    """캐시 키용 쿼리 정규화 (유니코드 정규화, 소문자, 공백 정리, 끝 문장부호 제거)"""
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.rstrip(" .?!。")
+
+
+class SearchProviderError(RuntimeError):
+    """검색 제공자가 예외 대신 오류 문자열을 반환한 경우 (retryable: 재시도 가능 여부)"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def is_retryable(error):
+    """재시도할 오류인지 확인 (rate limit, 타임아웃, 연결 오류)"""
+    if isinstance(error, SearchProviderError):
+        return error.retryable
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None) or getattr(error, "status_code", None)
+    if status in (429, 500, 502, 503, 504):
+        return True
+    message = str(error).lower()
+    return any(text in message for text in ("rate limit", "too many requests", "429", "timed out", "timeout"))
+
+
+## ✅ 검색 제공자
+class TavilyProvider:
+    """Tavily 검색 (LangChain TavilySearchResults 도구 사용)"""
+
+    name = "tavily"
+
+    def __init__(self, tool):
+        self.tool = tool
+
+    async def search(self, query):
+        results = await self.tool.ainvoke({"query": query})
+        # 🚨 TavilySearchResults는 API 오류(429, 5xx, 잘못된 키)를 잡아서 repr(e) 문자열로 반환 → 예외로 바꿔 재시도/캐시 제외
+        if isinstance(results, str):
+            auth_error = any(text in results.lower() for text in ("401", "403", "unauthorized", "forbidden", "api key"))
+            raise SearchProviderError(f"Tavily 오류: {results}", retryable=not auth_error)
+        if not isinstance(results, list):
+            raise SearchProviderError(f"Tavily 결과 형식 오류: {type(results).__name__}")
+        return results
+
+
+class StubProvider:
+    """네트워크 없이 쿼리마다 결정적인 가짜 결과를 반환하는 제공자 (테스트/벤치마크용)"""
+
+    name = "stub"
+
+    def __init__(self, latency=0.0, failure_rate=0.0, results_per_query=1, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.results_per_query = results_per_query
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    async def search(self, query):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.random.random() < self.failure_rate:
+            raise RuntimeError("429 Too Many Requests (stub)")
+        digest = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+        return [
+            {"url": f"https://example.com/{digest[:12]}/{i}", "content": f"[stub] {query} #{i}"}
+            for i in range(self.results_per_query)
+        ]
+
+
+def create_provider(tool=None, kind=SEARCH_PROVIDER):
+    """환경 변수(SEARCH_PROVIDER)에 따라 검색 제공자 생성"""
+    if kind == "stub":
+        return StubProvider()
+    if kind == "tavily":
+        if tool is None:
+            raise ValueError("❌ Tavily 제공자에는 TavilySearchResults 도구가 필요합니다.")
+        return TavilyProvider(tool)
+    raise ValueError(f"❌ 지원하지 않는 SEARCH_PROVIDER: {kind} (tavily 또는 stub)")
+
+
+## ✅ 검색 결과 캐시
+class SearchCache:
+    """정규화된 쿼리 기준 SQLite 검색 결과 캐시 (TTL이 지난 결과는 다시 검색)"""
+
+    def __init__(self, path=SEARCH_CACHE_PATH, ttl=SEARCH_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    results TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self):
+        """스레드별 연결 재사용 (WAL 모드로 여러 프로세스의 동시 읽기/쓰기 허용)"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(provider, query):
+        return f"{provider}:{normalize_query(query)}"
+
+    def get(self, provider, query):
+        """캐시된 결과 반환 (없거나 만료되었으면 None)"""
+        row = self._connect().execute(
+            "SELECT results, created_at FROM search_cache WHERE key = ?", (self.make_key(provider, query),)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        results = json.loads(row[0])
+        return results if isinstance(results, list) else None  # 예전에 저장된 오류 문자열은 캐시 미스로 처리
+
+    def set(self, provider, query, results):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, provider, query, results, created_at) VALUES (?, ?, ?, ?, ?)",
+                (self.make_key(provider, query), provider, query, json.dumps(results, ensure_ascii=False), time.time()),
+            )
+
+    def purge_expired(self):
+        """만료된 결과 삭제"""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM search_cache WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+
+
+## ✅ 검색 단계 (동시 실행 제한 + 재시도 + 캐시)
+class SearchStage:
+    """여러 쿼리를 동시에 검색 (캐시 우선, rate limit 시 지수 백오프 후 재시도)"""
+
+    def __init__(self, provider, cache=None, concurrency=SEARCH_CONCURRENCY, max_retries=SEARCH_MAX_RETRIES,
+                 backoff_base=SEARCH_BACKOFF_BASE):
+        self.provider = provider
+        self.cache = cache
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.limits = {}  # 이벤트 루프별 세마포어 (스크립트에서 asyncio.run을 여러 번 호출해도 안전)
+        self.stats = {"requests": 0, "cache_hits": 0, "provider_calls": 0, "retries": 0, "errors": 0}
+
+    def set_concurrency(self, concurrency):
+        self.concurrency = concurrency
+        self.limits.clear()
+
+    def _limit(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self.limits:
+            self.limits.clear()
+            self.limits[loop] = asyncio.Semaphore(self.concurrency)
+        return self.limits[loop]
+
+    async def search(self, query):
+        """쿼리 하나 검색 (결과 리스트 반환)"""
+        self.stats["requests"] += 1
+        if self.cache is not None:
+            cached = self.cache.get(self.provider.name, query)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._limit():
+                    self.stats["provider_calls"] += 1
+                    results = await self.provider.search(query)
+                break
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    self.stats["errors"] += 1
+                    raise
+                self.stats["retries"] += 1
+                delay = min(SEARCH_BACKOFF_MAX, self.backoff_base * 2 ** attempt) * (0.5 + random.random() / 2)
+                print(f"⚠️ [SEARCH] 재시도 {attempt + 1}/{self.max_retries} ({delay:.1f}s 후): {query} - {e}")
+                await asyncio.sleep(delay)
+
+        if not isinstance(results, list):
+            self.stats["errors"] += 1
+            raise SearchProviderError(f"검색 결과 형식 오류 ({self.provider.name}): {type(results).__name__}", retryable=False)
+        if self.cache is not None:
+            self.cache.set(self.provider.name, query, results)
+        return results
+
+    async def search_many(self, queries, return_exceptions=False):
+        """여러 쿼리를 동시에 검색 (입력 순서대로 결과 반환, 같은 정규화 쿼리는 한 번만 검색)
+
+        return_exceptions=True면 실패한 쿼리 자리에 예외를 넣고 나머지 쿼리 결과는 그대로 반환
+        """
+        unique = {}
+        for query in queries:
+            unique.setdefault(normalize_query(query), query)
+        results = await asyncio.gather(*(self.search(query) for query in unique.values()), return_exceptions=return_exceptions)
+        by_key = dict(zip(unique.keys(), results))
+        return [by_key[normalize_query(query)] for query in queries]
+
+
+##### ===== 오프라인 벤치마크 ===== #####
+async def benchmark(num_queries, latency, concurrency):
+    queries = [f"역할 경험 검색 쿼리 {i}" for i in range(num_queries)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = SearchCache(os.path.join(tmpdir, "bench.db"))
+
+        serial = SearchStage(StubProvider(latency=latency), concurrency=1)
+        started = time.perf_counter()
+        for query in queries:
+            await serial.search(query)
+        serial_s = time.perf_counter() - started
+
+        stage = SearchStage(StubProvider(latency=latency), cache=cache, concurrency=concurrency)
+        started = time.perf_counter()
+        await stage.search_many(queries)
+        cold_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await stage.search_many(queries)
+        warm_s = time.perf_counter() - started
+
+    print(f"쿼리 {num_queries}개, 요청당 지연 {latency * 1000:.0f}ms, 동시 실행 {concurrency}")
+    print(f"- 순차 실행: {serial_s:.2f}s")
+    print(f"- 동시 실행 (캐시 없음): {cold_s:.2f}s")
+    print(f"- 동시 실행 (캐시 적중): {warm_s:.3f}s")
+    print(f"- 지표: {stage.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="검색 단계 오프라인 벤치마크 (stub 제공자 사용)")
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=SEARCH_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.queries, args.latency, args.concurrency))
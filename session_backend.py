@@ -0,0 +1,180 @@
+"""uvicorn 워커가 공유하는 세션 상태 저장소
+
+- memory: 프로세스 내부 (단일 워커/테스트용)
+- sqlite: 파일 기반 → 같은 호스트의 워커끼리만 공유 (여러 호스트에 나뉜 워커는 지원하지 않음)
+- 저장은 version 기반 compare-and-set: 다른 워커가 먼저 저장했으면 VersionConflict → 호출자가 최신 상태 위에 다시 저장
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+## ✅ 설정 (환경 변수로 조정 가능)
+# memory: 프로세스 내부 저장 (단일 워커/테스트용), sqlite: 파일 기반 저장 (같은 호스트의 여러 워커가 공유)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SAVE_RETRIES = 3  # version 충돌 시 최신 상태를 다시 읽고 저장하는 횟수
+
+
+class VersionConflict(Exception):
+    """저장하려는 세션의 version이 예상과 다른 경우 (다른 워커가 먼저 저장함)"""
+
+
+def session_key(user_number, persona, session_id):
+    """(user_number, persona, session_number) 기반 세션 키 (예: P0:tag:1)"""
+    session_number = int(str(session_id).split("/")[-1])
+    return f"{user_number}:{persona}:{session_number}"
+
+
+def parse_session_key(key):
+    """세션 키를 (user_number, persona, session_number)로 분리"""
+    user_number, persona, session_number = key.rsplit(":", 2)
+    return user_number, persona, int(session_number)
+
+
+class SessionBackend:
+    """세션 상태 저장소 인터페이스
+
+    상태는 JSON으로 직렬화 가능한 dict이며, version은 저장된 메시지 개수이다.
+    (예: {"messages": [{"role": "user", "content": "..."}], "topic": "...", "version": 2})
+    """
+
+    def load(self, key):
+        """세션 상태 반환 (없으면 None)"""
+        raise NotImplementedError
+
+    def save(self, key, state, expected_version=None):
+        """세션 상태 저장
+
+        expected_version이 주어지면 저장된 version이 같을 때만 저장 (compare-and-set, 없는 세션은 0으로 취급)
+        다르면 VersionConflict (None이면 무조건 덮어쓰기)
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """세션 상태 삭제"""
+        raise NotImplementedError
+
+    def keys(self, user_number=None):
+        """저장된 세션 키 목록 (user_number로 필터링 가능)"""
+        raise NotImplementedError
+
+
+class InMemorySessionBackend(SessionBackend):
+    """프로세스 내부 dict 기반 백엔드 (단일 워커 및 오프라인 테스트용)"""
+
+    def __init__(self):
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def load(self, key):
+        with self.lock:
+            state = self.states.get(key)
+            return json.loads(state) if state is not None else None
+
+    def save(self, key, state, expected_version=None):
+        # ✅ 다른 백엔드와 동일하게 직렬화된 복사본을 저장 (호출자가 원본을 수정해도 영향 없음)
+        with self.lock:
+            if expected_version is not None:
+                current = json.loads(self.states[key]).get("version", 0) if key in self.states else 0
+                if current != expected_version:
+                    raise VersionConflict(f"{key}: version {current} != {expected_version}")
+            self.states[key] = json.dumps(state, ensure_ascii=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.states.pop(key, None)
+
+    def keys(self, user_number=None):
+        with self.lock:
+            return [key for key in self.states if user_number is None or key.startswith(f"{user_number}:")]
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """SQLite 파일 기반 백엔드 (재시작 후에도 유지되며 여러 uvicorn 워커가 공유)"""
+
+    def __init__(self, path=SESSION_DB_PATH):
+        self.path = path
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    key TEXT PRIMARY KEY,
+                    user_number TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_number)")
+
+    def _connect(self):
+        """스레드별 연결 재사용 (WAL 모드로 여러 프로세스의 동시 읽기/쓰기 허용)"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def load(self, key):
+        row = self._connect().execute("SELECT state FROM sessions WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, key, state, expected_version=None):
+        user_number, _, _ = parse_session_key(key)
+        row = (json.dumps(state, ensure_ascii=False), state.get("version", 0), time.time())
+        with self._connect() as conn:
+            if expected_version is None:
+                conn.execute(
+                    """
+                    INSERT INTO sessions (key, user_number, state, version, updated_at) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET state = excluded.state, version = excluded.version, updated_at = excluded.updated_at
+                    """,
+                    (key, user_number, *row),
+                )
+                return
+            # ✅ compare-and-set: 읽은 뒤 다른 워커가 저장했으면 version이 달라 갱신되지 않음
+            updated = conn.execute(
+                "UPDATE sessions SET state = ?, version = ?, updated_at = ? WHERE key = ? AND version = ?",
+                (*row, key, expected_version),
+            ).rowcount
+            if not updated and expected_version == 0:
+                updated = conn.execute(
+                    "INSERT OR IGNORE INTO sessions (key, user_number, state, version, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, user_number, *row),
+                ).rowcount
+        if not updated:
+            raise VersionConflict(f"{key}: 저장된 version이 {expected_version}이 아님")
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def keys(self, user_number=None):
+        conn = self._connect()
+        if user_number is None:
+            rows = conn.execute("SELECT key FROM sessions").fetchall()
+        else:
+            rows = conn.execute("SELECT key FROM sessions WHERE user_number = ?", (user_number,)).fetchall()
+        return [row[0] for row in rows]
+
+
+def create_session_backend(kind=SESSION_BACKEND):
+    """환경 변수(SESSION_BACKEND)에 따라 세션 백엔드 생성"""
+    if kind == "memory":
+        return InMemorySessionBackend()
+    if kind == "sqlite":
+        return SQLiteSessionBackend(SESSION_DB_PATH)
+    raise ValueError(f"❌ 지원하지 않는 SESSION_BACKEND: {kind} (memory 또는 sqlite)")
+
+
+## ✅ 두 에이전트가 공유하는 세션 백엔드
+session_backend = create_session_backend()
@@ -0,0 +1,212 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from async_utils import blocking_executor
+
+## ✅ 설정 (환경 변수로 조정 가능)
+MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "500"))
+IDLE_TTL = float(os.getenv("SESSION_CACHE_TTL", "3600"))  # 마지막 접근 후 유지 시간 (초)
+MEMORY_BUDGET = int(float(os.getenv("SESSION_CACHE_MEMORY_MB", "64")) * 1024 * 1024)
+ENTRY_OVERHEAD = 8 * 1024  # 프롬프트 템플릿, LLM 실행체 등 고정 비용 추정치 (bytes)
+
+
+def estimate_entry_size(entry):
+    """세션 항목의 대략적인 메모리 사용량 (대화 이력 + 고정 비용)"""
+    history = entry.get("history")
+    messages = history.messages if history is not None else []
+    return ENTRY_OVERHEAD + sum(len(str(msg.content).encode("utf-8")) for msg in messages)
+
+
+class SessionCache:
+    """LRU + 유휴 TTL + 메모리 예산으로 항목을 내보내는 세션 저장소 (dict처럼 사용)"""
+
+    def __init__(self, name, max_entries=MAX_ENTRIES, idle_ttl=IDLE_TTL, memory_budget=MEMORY_BUDGET, on_evict=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self.on_evict = on_evict  # 내보내기 전에 상태를 저장하는 콜백 (key, entry)
+        self.entries = OrderedDict()  # 가장 오래 사용하지 않은 항목이 앞쪽
+        self.last_access = {}
+        self.sizes = {}
+        self.turn_locks = {}  # 세션 키 -> asyncio.Lock (같은 세션의 대화 턴을 한 번에 하나씩 처리)
+        self.evicted = []  # 잠금 안에서 내보낸 (key, entry) → 잠금을 푼 뒤 on_evict 실행
+        self.flushes = set()  # 진행 중인 백그라운드 저장 (이벤트 루프에서 내보낸 경우)
+        self.lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "flush_errors": 0}
+
+    ## ✅ dict 호환 인터페이스
+    def __contains__(self, key):
+        with self.lock:
+            self._expire()
+            found = key in self.entries
+        self._flush_evicted()
+        return found
+
+    def __getitem__(self, key):
+        with self.lock:
+            entry = self.entries[key]
+            self._touch(key)
+            return entry
+
+    def __setitem__(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self._touch(key)
+            self.sizes[key] = estimate_entry_size(entry)
+            self._enforce_limits(keep=key)
+        self._flush_evicted()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            self._expire()
+            entry = self[key] if key in self.entries else default
+        self._flush_evicted()
+        return entry
+
+    def pop(self, key, default=None):
+        with self.lock:
+            self.last_access.pop(key, None)
+            self.sizes.pop(key, None)
+            return self.entries.pop(key, default)
+
+    ## ✅ 조회 + 캐시 미스 시 복원
+    def get_or_load(self, key, loader):
+        """캐시에서 항목을 찾고, 없으면 loader()로 복원하여 저장"""
+        with self.lock:
+            self._expire()
+            hit = key in self.entries
+            if hit:
+                self.stats["hits"] += 1
+                entry = self[key]
+            else:
+                self.stats["misses"] += 1
+        self._flush_evicted()
+        if hit:
+            return entry
+        entry = loader()
+        with self.lock:
+            # ✅ 복원하는 동안 다른 요청이 먼저 저장했다면 그 항목 사용
+            if key not in self.entries:
+                self[key] = entry
+            return self[key]
+
+    async def aget_or_load(self, key, loader):
+        """get_or_load의 async 버전 (loader는 코루틴 함수)"""
+        with self.lock:
+            self._expire()
+            hit = key in self.entries
+            if hit:
+                self.stats["hits"] += 1
+                entry = self[key]
+            else:
+                self.stats["misses"] += 1
+        self._flush_evicted()
+        if hit:
+            return entry
+        entry = await loader()
+        with self.lock:
+            if key not in self.entries:
+                self[key] = entry
+            return self[key]
+
+    def turn_lock(self, key):
+        """같은 세션의 조회 → LLM 호출 → 저장이 겹치지 않도록 하는 세션별 asyncio.Lock"""
+        with self.lock:
+            if key not in self.turn_locks:
+                self.turn_locks[key] = asyncio.Lock()
+            return self.turn_locks[key]
+
+    def resize(self, key):
+        """항목 내용(대화 이력)이 바뀐 뒤 메모리 사용량 다시 계산 (대화 턴 저장 시 호출, 조회 때는 계산하지 않음)"""
+        with self.lock:
+            if key in self.entries:
+                self.sizes[key] = estimate_entry_size(self.entries[key])
+                self._enforce_limits(keep=key)
+        self._flush_evicted()
+
+    ## ✅ 내부 관리
+    def _touch(self, key):
+        self.entries.move_to_end(key)
+        self.last_access[key] = time.monotonic()
+
+    def _evict(self, key, reason):
+        """잠금 안에서 항목만 제거 (저장은 잠금을 푼 뒤 _flush_evicted에서 실행)"""
+        entry = self.pop(key)
+        if entry is None:
+            return
+        turn_lock = self.turn_locks.get(key)
+        if turn_lock is not None and not turn_lock.locked():
+            self.turn_locks.pop(key, None)
+        self.stats["evictions"] += 1
+        if reason == "expired":
+            self.stats["expired"] += 1
+        if self.on_evict is not None:
+            self.evicted.append((key, entry))
+
+    def _flush_evicted(self):
+        """내보낸 항목 저장: 이벤트 루프 안이면 스레드 풀에서 (Firestore 왕복이 루프를 막지 않도록), 아니면 바로 실행"""
+        with self.lock:
+            if not self.evicted:
+                return
+            evicted, self.evicted = self.evicted, []
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._run_on_evict(evicted)
+            return
+        future = loop.run_in_executor(blocking_executor, self._run_on_evict, evicted)
+        self.flushes.add(future)
+        future.add_done_callback(self.flushes.discard)
+
+    def _run_on_evict(self, evicted):
+        for key, entry in evicted:
+            try:
+                self.on_evict(key, entry)
+            except Exception as e:
+                with self.lock:
+                    self.stats["flush_errors"] += 1
+                print(f"🚨 [SESSION CACHE] {self.name} 세션 {key} 저장 실패: {e}")
+
+    async def drain(self):
+        """진행 중인 백그라운드 저장이 끝날 때까지 대기 (서버 종료 시)"""
+        self._flush_evicted()
+        if self.flushes:
+            await asyncio.gather(*list(self.flushes), return_exceptions=True)
+
+    def _expire(self):
+        """유휴 TTL이 지난 항목 제거 (앞쪽이 가장 오래된 항목이므로 만료되지 않은 항목에서 멈춤)"""
+        now = time.monotonic()
+        while self.entries:
+            key = next(iter(self.entries))
+            if now - self.last_access[key] < self.idle_ttl:
+                break
+            self._evict(key, "expired")
+
+    def _enforce_limits(self, keep=None):
+        """항목 수 및 메모리 예산을 넘으면 가장 오래 사용하지 않은 항목부터 제거"""
+        self._expire()
+        while len(self.entries) > 1 and (
+            len(self.entries) > self.max_entries or sum(self.sizes.values()) > self.memory_budget
+        ):
+            key = next(iter(self.entries))
+            if key == keep:
+                break
+            self._evict(key, "lru")
+
+    def get_stats(self):
+        """히트/미스/내보내기 지표 반환"""
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self.entries),
+                "memory_bytes": sum(self.sizes.values()),
+                "memory_budget_bytes": self.memory_budget,
+            }
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from collections import deque
+
+## ✅ 설정 (환경 변수로 조정 가능)
+HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))  # 토큰이 없을 때 heartbeat 간격 (초)
+DISCONNECT_CHECK_INTERVAL = 0.5  # 클라이언트 연결 끊김 확인 간격 (초)
+STREAM_METRICS_SIZE = 1000  # 페르소나별로 보관할 최근 요청 수
+# 청크 병합: 마지막 전송 후 이 시간(ms)이 지났거나 버퍼가 이 크기(bytes)를 넘으면 프레임 전송
+COALESCE_INTERVAL_MS = float(os.getenv("STREAM_COALESCE_MS", "30"))
+COALESCE_BYTES = int(os.getenv("STREAM_COALESCE_BYTES", "64"))
+# 전송 속도 제한 (글자/초, 0이면 제한 없음 — 명시적으로 설정한 경우에만 적용)
+RATE_LIMIT = float(os.getenv("STREAM_RATE_LIMIT", "0"))
+# 청크 디버그 로그 샘플링 비율 (0~1)
+LOG_SAMPLE_RATE = float(os.getenv("STREAM_LOG_SAMPLE_RATE", "0.01"))
+
+## ✅ 페르소나별 최근 스트리밍 요청 지표 (time-to-first-token, tokens/sec)
+stream_metrics = {}
+
+_END = object()  # 업스트림 종료 신호
+
+
+def create_stream_logger():
+    """이벤트 루프를 막지 않도록 QueueHandler → 백그라운드 스레드(QueueListener)로 출력하는 로거"""
+    logger = logging.getLogger("stream")
+    if not logger.handlers:
+        log_queue = queue.SimpleQueue()
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s [STREAM] %(message)s"))
+        listener = logging.handlers.QueueListener(log_queue, handler)
+        listener.daemon = True
+        listener.start()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        logger.setLevel(os.getenv("STREAM_LOG_LEVEL", "INFO"))
+        logger.propagate = False
+    return logger
+
+
+stream_logger = create_stream_logger()
+
+
+def log_frame(name, text, sample_rate=LOG_SAMPLE_RATE):
+    """전송한 프레임을 샘플링하여 디버그 로그로 기록 (DEBUG 레벨이 아니면 아무것도 하지 않음)"""
+    if stream_logger.isEnabledFor(logging.DEBUG) and random.random() < sample_rate:
+        stream_logger.debug("%s frame (%d chars): %r", name, len(text), text)
+
+
+def format_sse(data, event=None, event_id=None):
+    """SSE 프레임 생성 (data는 JSON으로 직렬화하여 줄바꿈이 프레임을 깨지 않도록 함)"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def record_stream(name, ttft_ms, tokens, elapsed_s, status):
+    """스트리밍 요청 1건의 지표 기록"""
+    stream_metrics.setdefault(name, deque(maxlen=STREAM_METRICS_SIZE)).append({
+        "ttft_ms": ttft_ms,
+        "tokens": tokens,
+        "tokens_per_sec": tokens / elapsed_s if elapsed_s > 0 else 0.0,
+        "elapsed_ms": elapsed_s * 1000,
+        "status": status,
+    })
+
+
+def percentile(values, q):
+    """정렬된 값에서 q 분위수 (nearest-rank)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return round(ordered[rank], 2)
+
+
+def get_stream_stats():
+    """페르소나별 TTFT / tokens/sec 요약"""
+    summary = {}
+    for name, records in stream_metrics.items():
+        ttfts = [r["ttft_ms"] for r in records if r["ttft_ms"] is not None]
+        rates = [r["tokens_per_sec"] for r in records if r["tokens"]]
+        summary[name] = {
+            "requests": len(records),
+            "completed": sum(1 for r in records if r["status"] == "done"),
+            "cancelled": sum(1 for r in records if r["status"] == "cancelled"),
+            "errors": sum(1 for r in records if r["status"] == "error"),
+            "ttft_ms_p50": percentile(ttfts, 50),
+            "ttft_ms_p95": percentile(ttfts, 95),
+            "tokens_per_sec_p50": percentile(rates, 50),
+        }
+    return summary
+
+
+async def sse_stream(
+    chunks,
+    request=None,
+    name="chat",
+    heartbeat=HEARTBEAT_INTERVAL,
+    coalesce_ms=COALESCE_INTERVAL_MS,
+    coalesce_bytes=COALESCE_BYTES,
+    rate_limit=RATE_LIMIT,
+):
+    """텍스트 청크 async 제너레이터를 SSE 이벤트 스트림(token/done/error + heartbeat)으로 변환
+
+    업스트림은 별도 태스크에서 읽으므로, 클라이언트 연결이 끊기면 태스크를 취소하여
+    OpenAI 요청까지 함께 중단한다. 첫 청크는 바로 보내고, 이후 청크는 coalesce_ms 또는
+    coalesce_bytes 기준으로 모아서 하나의 token 프레임으로 전송한다.
+    rate_limit(글자/초)을 지정한 경우에만 전송 속도를 제한한다.
+    """
+    queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+            await queue.put(_END)
+        except asyncio.CancelledError:
+            await chunks.aclose()
+            raise
+        except Exception as e:
+            await queue.put(e)
+
+    started = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    event_id = 0
+    status = "cancelled"
+    last_sent = time.monotonic()
+    pending = []  # 아직 전송하지 않은 청크
+    pending_bytes = 0
+    next_send_at = 0.0  # 속도 제한 시 다음 프레임 전송 가능 시각
+    producer = asyncio.create_task(pump())
+
+    async def flush():
+        """모아둔 청크를 token 프레임 하나로 전송"""
+        nonlocal pending, pending_bytes, event_id, last_sent, next_send_at
+        text = "".join(pending)
+        pending, pending_bytes = [], 0
+        if rate_limit and rate_limit > 0:
+            delay = next_send_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_send_at = max(next_send_at, time.monotonic()) + len(text) / rate_limit
+        event_id += 1
+        last_sent = time.monotonic()
+        log_frame(name, text)
+        return format_sse({"text": text}, event="token", event_id=event_id)
+
+    try:
+        while True:
+            # ✅ 보낼 청크가 남아 있으면 병합 시간이 끝날 때까지만 기다림
+            timeout = DISCONNECT_CHECK_INTERVAL
+            if pending:
+                timeout = max(0.0, min(timeout, last_sent + coalesce_ms / 1000 - time.monotonic()))
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                if pending:
+                    yield await flush()
+                    continue
+                # ✅ 클라이언트가 떠났으면 업스트림 중단
+                if request is not None and await request.is_disconnected():
+                    stream_logger.info("클라이언트 연결 끊김 → 업스트림 요청 취소 (%s)", name)
+                    break
+                # ✅ 토큰이 한동안 없으면 heartbeat (SSE 주석 프레임)
+                if time.monotonic() - last_sent >= heartbeat:
+                    last_sent = time.monotonic()
+                    yield ": ping\n\n"
+                continue
+
+            if item is _END:
+                if pending:
+                    yield await flush()
+                status = "done"
+                elapsed = time.perf_counter() - started
+                yield format_sse({
+                    "tokens": tokens,
+                    "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+                    "elapsed_ms": round(elapsed * 1000, 1),
+                }, event="done", event_id=event_id + 1)
+                break
+
+            if isinstance(item, Exception):
+                if pending:
+                    yield await flush()
+                status = "error"
+                stream_logger.error("스트리밍 중 오류 발생 (%s): %s", name, item)
+                yield format_sse({"message": str(item)}, event="error", event_id=event_id + 1)
+                break
+
+            if not item:
+                continue
+            tokens += 1
+            pending.append(item)
+            pending_bytes += len(item.encode("utf-8"))
+            # ✅ 첫 토큰은 바로 전송 (TTFT), 이후에는 크기/시간 기준으로 병합
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                yield await flush()
+            elif pending_bytes >= coalesce_bytes or time.monotonic() - last_sent >= coalesce_ms / 1000:
+                yield await flush()
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
+        ttft_ms = (first_token_at - started) * 1000 if first_token_at else None
+        record_stream(name, ttft_ms, tokens, time.perf_counter() - started, status)
@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
+from firebase_utils import db, async_db
+
+## ✅ 설정 (환경 변수로 조정 가능)
+STATS_COLLECTION = os.getenv("SURVEY_STATS_COLLECTION", "survey_stats")
+# 제출마다 문서 하나 (중복 집계 방지 표시, 집계 문서에 두면 제출 수만큼 커져 1 MiB 제한에 걸림)
+SEEN_COLLECTION = os.getenv("SURVEY_STATS_SEEN_COLLECTION", "survey_stats_seen")
+# 다른 워커가 기록한 응답을 반영하기 위해 집계 문서를 다시 읽는 간격 (같은 워커의 응답은 바로 반영됨)
+SURVEY_STATS_TTL = float(os.getenv("SURVEY_STATS_TTL", "60"))
+
+# ✅ 설문 원본 위치: (컬렉션, 서브컬렉션) → 집계에 쓰는 source 이름
+SOURCES = {
+    "ChatEval": ("Eval_logs(chat)", "ChatEval"),  # /submit_survey (문서 id: session_id)
+    "PerEval": ("Eval_logs", "PerEval"),  # /log_survey (문서 id: page → PerEval(tag), PerEval(epi), EpiEval)
+    "evaluations": ("user_surveys", "evaluations"),  # /submit_epi_eval
+}
+
+## ✅ 집계 문서 id -> {"form", "condition", "submissions", "questions": {문항: {count, sum, sumsq, hist}}}
+summaries = {}
+lock = threading.Lock()
+loaded_at = None
+applied = 0  # 이 워커가 메모리 집계에 반영한 제출 수 (조회 도중 반영된 제출이 스냅샷으로 덮이지 않도록 비교)
+stats = {"recorded": 0, "duplicates": 0, "refreshes": 0, "skipped_values": 0, "failed": 0, "source_failed": 0}
+
+
+def question_key(item):
+    """설문 문항 키에서 "." 앞부분만 사용 (Firestore 필드 경로에 "."이 들어가지 않도록)  예: "0_Q4. 내 역할과 ..." → "0_Q4" """
+    return item.split(".", 1)[0].strip()
+
+
+def parse_form(source, form):
+    """(source, 문서 id) → (설문 종류, 조건)  예: ("ChatEval", "chat1(tag)_3") → ("ChatEval", "tag"), ("PerEval", "EpiEval") → ("EpiEval", "epi")"""
+    kind = form.split("(", 1)[0] if source == "PerEval" else source
+    condition = "tag" if "(tag)" in form else "epi" if "(epi)" in form or form.startswith("Epi") else "all"
+    return kind, condition
+
+
+def seen_ref(submission_id, client=db):
+    """제출 id → 중복 집계 방지 문서 참조 (문서 id에 "/"가 들어가지 않도록 치환)"""
+    return client.collection(SEEN_COLLECTION).document(submission_id.replace("/", "_"))
+
+
+def numeric(value):
+    """리커트 값만 집계 (bool / 문자열 응답은 제외)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+        return None
+    return float(value)
+
+
+def build_increments(responses):
+    """응답 → (문항별 Firestore Increment, 메모리 반영용 값)"""
+    increments, values = {}, {}
+    for item, value in responses.items():
+        value = numeric(value)
+        if value is None:
+            stats["skipped_values"] += 1
+            continue
+        key = question_key(item)
+        values[key] = value
+        increments[key] = {
+            "count": firestore.Increment(1),
+            "sum": firestore.Increment(value),
+            "sumsq": firestore.Increment(value * value),
+            "hist": {str(round(value)): firestore.Increment(1)},
+        }
+    return increments, values
+
+
+def apply_values(doc_id, kind, condition, values):
+    """같은 워커의 메모리 집계에 응답 반영 (Firestore Increment와 같은 계산)"""
+    global applied
+    summary = summaries.setdefault(doc_id, {"form": kind, "condition": condition, "submissions": 0, "questions": {}})
+    summary["submissions"] += 1
+    for key, value in values.items():
+        question = summary["questions"].setdefault(key, {"count": 0, "sum": 0.0, "sumsq": 0.0, "hist": {}})
+        question["count"] += 1
+        question["sum"] += value
+        question["sumsq"] += value * value
+        bucket = str(round(value))
+        question["hist"][bucket] = question["hist"].get(bucket, 0) + 1
+    applied += 1
+
+
+async def record(source, participant, form, responses, timestamp=None, after=None):
+    """설문 저장 직후 호출: 조건·문항별 count / sum / sumsq / 히스토그램을 Increment로 갱신
+
+    after: 원본 설문 쓰기의 Future (write-behind 큐) → 원본이 커밋된 뒤에만 집계 (원본 저장 실패 시 집계하지 않음)
+    중복 방지 표시(survey_stats_seen/{제출 id})를 create로 만들고 집계 Increment와 같은 batch로 커밋
+    → 같은 제출(참가자 + 문서 id)이 다시 저장되면 어느 워커에서든 AlreadyExists로 batch 전체가 거부됨
+    집계 실패는 설문 저장에 영향을 주지 않도록 예외를 밖으로 보내지 않음 (rebuild()로 복구)
+    """
+    kind, condition = parse_form(source, form)
+    doc_id = f"{kind}_{condition}"
+    submission_id = f"{participant}|{form}"
+    if after is not None:
+        try:
+            await asyncio.shield(after)  # ✅ 요청이 취소되어도 큐의 쓰기 Future는 취소하지 않음
+        except Exception as e:
+            stats["source_failed"] += 1
+            print(f"⚠️ [SURVEY STATS] 원본 설문 저장 실패 → 집계하지 않음: {doc_id} - {submission_id}: {e}")
+            return False
+
+    increments, values = build_increments(responses)
+    timestamp = timestamp or datetime.now().isoformat()
+    batch = async_db.batch()
+    batch.create(seen_ref(submission_id, async_db), {"summary": doc_id, "timestamp": timestamp})
+    batch.set(async_db.collection(STATS_COLLECTION).document(doc_id), {
+        "form": kind,
+        "condition": condition,
+        "submissions": firestore.Increment(1),
+        "questions": increments,
+    }, merge=True)
+    try:
+        await batch.commit()
+    except AlreadyExists:
+        stats["duplicates"] += 1
+        print(f"⚠️ [SURVEY STATS] 이미 집계된 제출 (건너뜀): {doc_id} - {submission_id}")
+        return False
+    except Exception as e:
+        stats["failed"] += 1
+        print(f"🚨 [SURVEY STATS] 집계 갱신 실패: {doc_id} - {submission_id}: {e}")
+        return False
+
+    with lock:
+        apply_values(doc_id, kind, condition, values)
+        stats["recorded"] += 1
+    return True
+
+
+#################### 조회 ####################
+
+def load_docs(docs, applied_before):
+    """집계 문서 스냅샷 → 메모리 집계 교체
+
+    읽는 동안 이 워커가 제출을 반영했다면 스냅샷에 빠졌을 수 있으므로 교체하지 않음 (다음 조회에서 다시 읽음)
+    """
+    global loaded_at
+    loaded = {doc.id: doc.to_dict() for doc in docs}
+    with lock:
+        if applied != applied_before:
+            return
+        summaries.clear()
+        summaries.update(loaded)
+        loaded_at = time.monotonic()
+        stats["refreshes"] += 1
+
+
+def refresh():
+    """Firestore 집계 문서(설문 종류 × 조건 수만큼)를 다시 읽음"""
+    applied_before = applied
+    load_docs(db.collection(STATS_COLLECTION).stream(), applied_before)
+
+
+async def arefresh_if_stale():
+    """refresh의 async 버전 (처음 사용 시 또는 TTL이 지났을 때만)"""
+    if loaded_at is not None and time.monotonic() - loaded_at < SURVEY_STATS_TTL:
+        return
+    applied_before = applied
+    load_docs([doc async for doc in async_db.collection(STATS_COLLECTION).stream()], applied_before)
+
+
+def describe(question):
+    """충분 통계량 → n / 평균 / 표본 표준편차 / 히스토그램"""
+    count = question.get("count", 0)
+    total = question.get("sum", 0.0)
+    mean = total / count if count else None
+    variance = (question.get("sumsq", 0.0) - total * total / count) / (count - 1) if count > 1 else None
+    return {
+        "n": count,
+        "mean": round(mean, 4) if mean is not None else None,
+        "std": round(math.sqrt(max(variance, 0.0)), 4) if variance is not None else None,
+        "hist": dict(sorted(question.get("hist", {}).items(), key=lambda kv: float(kv[0]))),
+    }
+
+
+def get_summary(form=None, condition=None):
+    """설문 종류 × 조건별 문항 요약 (Firestore 원본을 읽지 않고 메모리 집계에서 바로 계산)"""
+    with lock:
+        return {
+            doc_id: {
+                "form": summary.get("form"),
+                "condition": summary.get("condition"),
+                "submissions": summary.get("submissions", 0),
+                "questions": {key: describe(question) for key, question in sorted(summary.get("questions", {}).items())},
+            }
+            for doc_id, summary in sorted(summaries.items())
+            if (form is None or summary.get("form") == form) and (condition is None or summary.get("condition") == condition)
+        }
+
+
+async def aget_summary(form=None, condition=None):
+    await arefresh_if_stale()
+    return get_summary(form, condition)
+
+
+def get_stats():
+    with lock:
+        return {**stats, "summaries": len(summaries), "submissions": sum(s.get("submissions", 0) for s in summaries.values())}
+
+
+#################### 재계산 ####################
+
+def rebuild():
+    """원본 설문 문서를 한 번 모두 읽어 집계 문서를 새로 작성 (집계 도입 이전 응답 반영 / 불일치 복구용)"""
+    seen = {}  # 중복 방지 문서 id -> 내용
+    with lock:
+        summaries.clear()
+    for source, (collection, subcollection) in SOURCES.items():
+        for participant_ref in db.collection(collection).list_documents():
+            for doc in participant_ref.collection(subcollection).stream():
+                data = doc.to_dict() or {}
+                kind, condition = parse_form(source, doc.id)
+                _, values = build_increments(data.get("responses", {}))
+                doc_id = f"{kind}_{condition}"
+                with lock:
+                    apply_values(doc_id, kind, condition, values)
+                ref = seen_ref(f"{participant_ref.id}|{doc.id}")
+                seen[ref.id] = {"summary": doc_id, "timestamp": data.get("timestamp") or datetime.now().isoformat()}
+
+    # ✅ 집계 문서 + 중복 방지 문서를 다시 작성 (batch 하나에 최대 500개 쓰기)
+    stats_refs = {ref.id for ref in db.collection(STATS_COLLECTION).list_documents()}
+    seen_refs = {ref.id for ref in db.collection(SEEN_COLLECTION).list_documents()}
+    writes = [(db.collection(STATS_COLLECTION).document(doc_id), summary) for doc_id, summary in summaries.items()]
+    writes += [(db.collection(STATS_COLLECTION).document(doc_id), None) for doc_id in stats_refs - set(summaries)]
+    writes += [(db.collection(SEEN_COLLECTION).document(seen_id), data) for seen_id, data in seen.items()]
+    writes += [(db.collection(SEEN_COLLECTION).document(seen_id), None) for seen_id in seen_refs - set(seen)]
+    for start in range(0, len(writes), 500):
+        batch = db.batch()
+        for ref, data in writes[start:start + 500]:
+            if data is None:
+                batch.delete(ref)
+            else:
+                batch.set(ref, data)
+        batch.commit()
+    print(f"✅ [SURVEY STATS] 재계산 완료: 집계 문서 {len(summaries)}개, 제출 {get_stats()['submissions']}건")
+    return get_summary()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="설문 집계 (survey_stats 컬렉션)")
+    parser.add_argument("--rebuild", action="store_true", help="원본 설문 문서로 집계 문서를 다시 작성")
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild()
+    else:
+        refresh()
+    for doc_id, summary in get_summary().items():
+        print(f"📊 {doc_id}: 제출 {summary['submissions']}건, 문항 {len(summary['questions'])}개")
@@ -0,0 +1,13 @@
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Topic_Sampling"))  # topic_sampler는 scenario_engine을 같은 폴더에서 import
+
+from analytics.firestore_fake import FakeFirestore
+
+# ✅ firebase_utils는 import 시 실제 Firestore 클라이언트를 만들므로 테스트에서는 메모리 Firestore로 대체
+if "firebase_utils" not in sys.modules:
+    sys.modules["firebase_utils"] = types.SimpleNamespace(db=FakeFirestore(), async_db=FakeFirestore())
@@ -0,0 +1,29 @@
+from analytics.button_funnel import ReorderBuffer
+
+
+def drain(buffer, events):
+    out = []
+    for ms, event in events:
+        out.extend(buffer.push(ms, event))
+    out.extend(buffer.flush())
+    return out
+
+
+def test_reorders_within_capacity():
+    buffer = ReorderBuffer(capacity=2)
+    out = drain(buffer, [(3, "c"), (1, "a"), (2, "b"), (4, "d")])
+    assert [ms for ms, _ in out] == [1, 2, 3, 4]
+    assert buffer.late == 0
+
+
+def test_events_later_than_capacity_are_counted():
+    buffer = ReorderBuffer(capacity=1)
+    out = drain(buffer, [(5, "e"), (6, "f"), (7, "g"), (1, "a")])
+    assert sorted(ms for ms, _ in out) == [1, 5, 6, 7]
+    assert buffer.late == 1
+
+
+def test_equal_timestamps_keep_arrival_order():
+    buffer = ReorderBuffer(capacity=4)
+    out = drain(buffer, [(1, "first"), (1, "second"), (1, "third")])
+    assert [event for _, event in out] == ["first", "second", "third"]
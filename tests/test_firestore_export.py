@@ -0,0 +1,55 @@
+import pyarrow.parquet as pq
+
+from analytics.export_loader import table_path
+from analytics.firestore_export import FirestoreExporter
+from analytics.firestore_fake import FakeFirestore
+
+
+def message(index, role, content, timestamp):
+    return {"index": index, "role": role, "content": content, "timestamp": timestamp, "topic": "여행", "session_id": "chat1/1"}
+
+
+def session(updated_at, *messages):
+    return {"updated_at": updated_at, "messages": list(messages)}
+
+
+def messages_table(out_dir):
+    return pq.read_table(table_path("messages", out_dir)).to_pandas()
+
+
+def test_incremental_export(tmp_path):
+    client = FakeFirestore().load({
+        "P1": {
+            "tag": {
+                "1": session("2025-03-01T10:00:00", message(0, "user", "안녕", "2025-03-01T09:59:00"),
+                             message(1, "ai", "안녕!", "2025-03-01T10:00:00")),
+                "2": session("2025-03-01T11:00:00", message(0, "user", "오늘 뭐 해?", "2025-03-01T11:00:00")),
+            },
+        },
+    }, "chat_logs", subcollections=("tag", "epi"))
+
+    # ✅ 1. 처음 실행: 모든 문서를 읽어 테이블 생성
+    stats = FirestoreExporter(client, out_dir=str(tmp_path)).run(["chat_logs"])
+    assert stats["chat_logs"]["documents"] == 2
+    assert len(messages_table(tmp_path)) == 3
+
+    # ✅ 2. 바뀐 문서 없음: 커서(11:00) - LOOKBACK_S 이후 문서만 다시 읽고, 행은 중복되지 않음
+    client.reads = 0
+    stats = FirestoreExporter(client, out_dir=str(tmp_path)).run(["chat_logs"])
+    assert stats["chat_logs"]["documents"] == 1
+    assert client.reads == 1
+    assert len(messages_table(tmp_path)) == 3
+
+    # ✅ 3. 새 문서 + 기존 문서에 메시지 추가 → 해당 세션의 행만 교체
+    sessions = client.collection("chat_logs").document("P1").collection("tag")
+    sessions.document("2").set(session("2025-03-01T11:05:00", message(0, "user", "오늘 뭐 해?", "2025-03-01T11:00:00"),
+                                       message(1, "ai", "산책 갈까?", "2025-03-01T11:05:00")))
+    sessions.document("3").set(session("2025-03-01T12:00:00", message(0, "user", "잘 자", "2025-03-01T12:00:00")))
+    stats = FirestoreExporter(client, out_dir=str(tmp_path)).run(["chat_logs"])
+    assert stats["chat_logs"]["documents"] == 2
+
+    table = messages_table(tmp_path)
+    assert len(table) == 5
+    assert sorted(table.groupby("session").size().to_dict().items()) == [(1, 2), (2, 2), (3, 1)]
+    second = table[table["session"] == 2].sort_values("turn")
+    assert second["content"].tolist() == ["오늘 뭐 해?", "산책 갈까?"]
@@ -0,0 +1,31 @@
+import pytest
+
+from analytics import export_loader
+import survey_stats
+
+
+@pytest.mark.parametrize("source, form, expected", [
+    ("ChatEval", "chat1(tag)_3", ("ChatEval", "tag")),
+    ("ChatEval", "chat2(epi)_1", ("ChatEval", "epi")),
+    ("PerEval", "PerEval(tag)", ("PerEval", "tag")),
+    ("PerEval", "EpiEval", ("EpiEval", "epi")),
+    ("evaluations", "EpiEval", ("evaluations", "epi")),
+    ("ChatEval", "intro", ("ChatEval", "all")),
+])
+def test_survey_stats_parse_form(source, form, expected):
+    assert survey_stats.parse_form(source, form) == expected
+
+
+@pytest.mark.parametrize("form, expected", [
+    ("chat1(tag)_3", ("tag", 3)),
+    ("PerEval(epi)", ("epi", None)),
+    ("EpiEval", ("epi", None)),
+    ("chat1(tag)_x", ("tag", None)),
+    ("intro", (None, None)),
+])
+def test_export_loader_parse_form(form, expected):
+    assert export_loader.parse_form(form) == expected
+
+
+def test_question_key_drops_question_text():
+    assert survey_stats.question_key("0_Q4. 내 역할과 관련하여, ...") == "0_Q4"
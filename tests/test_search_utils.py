@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from search_utils import SearchCache, SearchProviderError, SearchStage, StubProvider
+
+
+class FlakyProvider(StubProvider):
+    """처음 failures번은 실패하는 StubProvider"""
+
+    def __init__(self, failures, error):
+        super().__init__()
+        self.failures = failures
+        self.error = error
+
+    async def search(self, query):
+        if self.failures:
+            self.failures -= 1
+            self.calls += 1
+            raise self.error
+        return await super().search(query)
+
+
+def test_search_many_dedups_normalized_queries():
+    provider = StubProvider(results_per_query=2)
+    stage = SearchStage(provider)
+    results = asyncio.run(stage.search_many(["서울 맛집", "  서울  맛집 ", "부산 여행"]))
+    assert len(results) == 3 and len(results[0]) == 2
+    assert results[0] == results[1] != results[2]
+    assert provider.calls == 2
+
+
+def test_cache_hits_skip_provider(tmp_path):
+    cache = SearchCache(str(tmp_path / "search.db"))
+    provider = StubProvider()
+    stage = SearchStage(provider, cache=cache)
+    first = asyncio.run(stage.search("서울 맛집"))
+    second = asyncio.run(stage.search("서울 맛집"))
+    assert first == second
+    assert provider.calls == 1 and stage.stats["cache_hits"] == 1
+
+
+def test_retryable_errors_are_retried():
+    provider = FlakyProvider(2, RuntimeError("429 Too Many Requests"))
+    stage = SearchStage(provider, max_retries=3, backoff_base=0)
+    assert asyncio.run(stage.search("q"))
+    assert provider.calls == 3 and stage.stats["retries"] == 2
+
+
+def test_non_retryable_errors_are_not_cached(tmp_path):
+    cache = SearchCache(str(tmp_path / "search.db"))
+    provider = FlakyProvider(1, SearchProviderError("invalid api key", retryable=False))
+    stage = SearchStage(provider, cache=cache, max_retries=3, backoff_base=0)
+    with pytest.raises(SearchProviderError):
+        asyncio.run(stage.search("q"))
+    assert provider.calls == 1 and cache.get(provider.name, "q") is None
+
+
+def test_search_many_return_exceptions_keeps_other_results():
+    provider = FlakyProvider(1, SearchProviderError("bad request", retryable=False))
+    stage = SearchStage(provider, concurrency=1)
+    results = asyncio.run(stage.search_many(["a", "b"], return_exceptions=True))
+    assert isinstance(results[0], SearchProviderError)
+    assert isinstance(results[1], list) and results[1]
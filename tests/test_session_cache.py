@@ -0,0 +1,78 @@
+import asyncio
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import HumanMessage
+
+from session_cache import ENTRY_OVERHEAD, SessionCache
+
+
+def entry(*texts):
+    history = InMemoryChatMessageHistory()
+    for text in texts:
+        history.add_message(HumanMessage(content=text))
+    return {"history": history}
+
+
+def test_lru_eviction_flushes_oldest():
+    flushed = []
+    cache = SessionCache("test", max_entries=2, on_evict=lambda key, value: flushed.append(key))
+    cache["a"], cache["b"] = entry(), entry()
+    cache["a"]  # ✅ a를 최근 사용으로 → 다음에 b가 내보내짐
+    cache["c"] = entry()
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert flushed == ["b"]
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_idle_ttl_expires_entries():
+    flushed = []
+    cache = SessionCache("test", idle_ttl=0, on_evict=lambda key, value: flushed.append(key))
+    cache["a"] = entry()
+    assert cache.get("a") is None
+    assert flushed == ["a"]
+    assert cache.get_stats()["expired"] == 1
+
+
+def test_get_or_load_counts_hits_and_misses():
+    cache = SessionCache("test")
+    loads = []
+    first = cache.get_or_load("a", lambda: loads.append("a") or entry())
+    second = cache.get_or_load("a", lambda: loads.append("again") or entry())
+    assert first is second and loads == ["a"]
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_resize_enforces_memory_budget():
+    flushed = []
+    cache = SessionCache("test", memory_budget=2 * ENTRY_OVERHEAD + 10, on_evict=lambda key, value: flushed.append(key))
+    cache["a"], cache["b"] = entry(), entry()
+    assert flushed == []
+    # ✅ 조회로는 크기를 다시 계산하지 않고, 대화 턴 저장 후 resize에서만 반영
+    cache["b"]["history"].add_message(HumanMessage(content="x" * 100))
+    assert flushed == []
+    cache.resize("b")
+    assert flushed == ["a"] and "b" in cache
+
+
+def test_eviction_inside_event_loop_flushes_off_loop():
+    flushed = []
+
+    async def run():
+        cache = SessionCache("test", max_entries=1, on_evict=lambda key, value: flushed.append(key))
+        cache["a"] = entry()
+        cache["b"] = entry()
+        await cache.drain()
+
+    asyncio.run(run())
+    assert flushed == ["a"]
+
+
+def test_flush_errors_are_counted():
+    def fail(key, value):
+        raise RuntimeError("firestore down")
+
+    cache = SessionCache("test", max_entries=1, on_evict=fail)
+    cache["a"] = entry()
+    cache["b"] = entry()
+    assert cache.get_stats()["flush_errors"] == 1
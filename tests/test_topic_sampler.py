@@ -0,0 +1,29 @@
+import pytest
+
+from topic_sampler import allocate
+
+
+def test_proportional_allocation_sums_to_total():
+    counts = allocate({0: 50, 1: 30, 2: 20}, 10)
+    assert counts == {0: 5, 1: 3, 2: 2}
+
+
+def test_proportional_allocation_gives_every_cluster_one():
+    counts = allocate({0: 1000, 1: 3, 2: 2}, 5)
+    assert sum(counts.values()) == 5
+    assert min(counts.values()) >= 1
+
+
+def test_fixed_allocation_respects_cluster_size():
+    counts = allocate({0: 10, 1: 1, 2: 10}, 9, allocation="fixed")
+    assert sum(counts.values()) == 9
+    assert counts[1] == 1
+
+
+def test_total_is_capped_at_population():
+    assert allocate({0: 2, 1: 1}, 10) == {0: 2, 1: 1}
+
+
+def test_unknown_allocation_is_rejected():
+    with pytest.raises(ValueError):
+        allocate({0: 1}, 1, allocation="random")
@@ -0,0 +1,89 @@
+import copy
+import json
+import os
+import threading
+import time
+from firebase_utils import db, async_db
+
+## ✅ 설정 (환경 변수로 조정 가능)
+# 다른 워커에서 토픽을 바꾼 경우를 대비한 최대 유지 시간 (같은 워커에서는 저장 시 바로 갱신됨)
+TOPIC_CACHE_TTL = float(os.getenv("TOPIC_CACHE_TTL", "600"))
+JSON_FIELDS = ["tag_topics", "tag_topic_descriptions", "epi_topics", "epi_topic_descriptions"]
+
+## ✅ user_number -> (토픽 데이터, 불러온 시각)
+cache = {}
+lock = threading.Lock()
+stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def parse_topics(topics_data):
+    """Firestore에서 가져온 데이터가 문자열이면 JSON 변환"""
+    for field in JSON_FIELDS:
+        if isinstance(topics_data.get(field), str):
+            topics_data[field] = json.loads(topics_data[field])
+    return topics_data
+
+
+def lookup(user_number):
+    """캐시에서 토픽 데이터 조회 (없거나 만료되었으면 None)"""
+    with lock:
+        cached = cache.get(user_number)
+        if cached is not None and time.monotonic() - cached[1] < TOPIC_CACHE_TTL:
+            stats["hits"] += 1
+            return cached[0]
+        cache.pop(user_number, None)
+        stats["misses"] += 1
+        return None
+
+
+def set_user_topics(user_number, topics_data):
+    """토픽 데이터를 캐시에 저장 (Firestore 저장 직후 write-through로 호출)"""
+    parsed = parse_topics(copy.deepcopy(topics_data))
+    with lock:
+        cache[user_number] = (parsed, time.monotonic())
+    return parsed
+
+
+def loaded_at(user_number):
+    """캐시된 토픽 데이터를 불러온 시각 (time.monotonic 기준, 캐시에 없으면 None)"""
+    with lock:
+        cached = cache.get(user_number)
+        return cached[1] if cached is not None else None
+
+
+def invalidate(user_number):
+    """사용자의 캐시된 토픽 삭제"""
+    with lock:
+        cache.pop(user_number, None)
+        stats["invalidations"] += 1
+
+
+def get_user_topics(user_number):
+    """Firestore user_topics 문서를 캐시를 거쳐 조회 (없으면 None)"""
+    topics_data = lookup(user_number)
+    if topics_data is not None:
+        return topics_data
+
+    doc = db.collection("user_topics").document(user_number).get()
+    if not doc.exists:
+        return None
+    return set_user_topics(user_number, doc.to_dict())
+
+
+async def aget_user_topics(user_number):
+    """get_user_topics의 async 버전 (async Firestore 클라이언트 사용)"""
+    topics_data = lookup(user_number)
+    if topics_data is not None:
+        return topics_data
+
+    doc = await async_db.collection("user_topics").document(user_number).get()
+    if not doc.exists:
+        return None
+    return set_user_topics(user_number, doc.to_dict())
+
+
+def get_stats():
+    """캐시 지표 반환"""
+    with lock:
+        lookups = stats["hits"] + stats["misses"]
+        return {**stats, "hit_ratio": round(stats["hits"] / lookups, 3) if lookups else 0.0, "entries": len(cache)}
@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+import time
+
+## ✅ 설정 (환경 변수로 조정 가능)
+TOPICS_FILE = os.getenv("TOPICS_FILE", "topics.json")
+TOPIC_CATALOG_CHECK_INTERVAL = float(os.getenv("TOPIC_CATALOG_CHECK_INTERVAL", "2"))  # 파일 변경 확인 간격 (초)
+
+
+class TopicCatalog:
+    """topics.json을 한 번 읽어 title_ko / title_en / index / category 인덱스로 조회 (파일이 바뀌면 다시 로드)"""
+
+    def __init__(self, path=TOPICS_FILE, check_interval=TOPIC_CATALOG_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.mtime = None
+        self.last_check = 0.0
+        self.stats = {"lookups": 0, "misses": 0, "reloads": 0, "reload_errors": 0}
+        self.reload()
+
+    ## ✅ 로드
+    @staticmethod
+    def build_snapshot(topics):
+        """인덱스 생성 (조회 중인 요청이 있어도 안전하도록 새 dict를 만든 뒤 한 번에 교체)"""
+        by_category = {}
+        for topic in topics:
+            by_category.setdefault(topic["category"], []).append(topic)
+        return {
+            "topics": topics,
+            "by_title_ko": {topic["title_ko"]: topic for topic in topics},
+            "by_title_en": {topic["title_en"]: topic for topic in topics},
+            "by_index": {int(topic["index"]): topic for topic in topics},
+            "by_category": by_category,
+        }
+
+    def reload(self):
+        """파일을 다시 읽음 (실패하면 기존 인덱스 유지, 처음 로드에 실패하면 예외)"""
+        mtime = os.path.getmtime(self.path)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                snapshot = self.build_snapshot(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if self.snapshot is None:
+                raise
+            self.stats["reload_errors"] += 1
+            self.mtime = mtime  # 같은 파일로 계속 실패하지 않도록 다음 변경 때 다시 시도
+            print(f"🚨 [TOPIC CATALOG] {self.path} 다시 로드 실패 (기존 데이터 유지): {e}")
+            return False
+        with self.lock:
+            if self.snapshot is not None:
+                self.stats["reloads"] += 1
+                print(f"✅ [TOPIC CATALOG] {self.path} 변경 감지 → 다시 로드 ({len(snapshot['topics'])}개)")
+            self.snapshot = snapshot
+            self.mtime = mtime
+        return True
+
+    def current(self):
+        """현재 인덱스 반환 (check_interval마다 파일 수정 시각 확인)"""
+        now = time.monotonic()
+        if now - self.last_check >= self.check_interval:
+            self.last_check = now
+            try:
+                if os.path.getmtime(self.path) != self.mtime:
+                    self.reload()
+            except OSError as e:
+                print(f"🚨 [TOPIC CATALOG] {self.path} 확인 실패 (기존 데이터 유지): {e}")
+        return self.snapshot
+
+    ## ✅ 조회
+    def get(self, title):
+        """title_en 또는 title_ko로 토픽 조회 (없으면 None)"""
+        snapshot = self.current()
+        self.stats["lookups"] += 1
+        topic = snapshot["by_title_en"].get(title) or snapshot["by_title_ko"].get(title)
+        if topic is None:
+            self.stats["misses"] += 1
+        return topic
+
+    def get_by_index(self, index):
+        try:
+            return self.current()["by_index"].get(int(index))
+        except (TypeError, ValueError):
+            return None
+
+    def describe(self, title, default="설명 없음"):
+        """제목과 같은 언어의 설명 반환 (title_en → description_en, title_ko → description_ko)"""
+        topic = self.get(title)
+        if topic is None:
+            return default
+        return topic["description_en"] if topic["title_en"] == title else topic["description_ko"]
+
+    def lookup_many(self, titles=(), indexes=()):
+        """여러 제목/index를 한 번에 조회 → (찾은 토픽 목록, 찾지 못한 값 목록)"""
+        found, missing = [], []
+        for key, topic in [(title, self.get(title)) for title in titles] + [(index, self.get_by_index(index)) for index in indexes]:
+            if topic is None:
+                missing.append(key)
+            else:
+                found.append(topic)
+        return found, missing
+
+    def list(self, category=None):
+        """전체 또는 카테고리별 토픽 목록 (카테고리는 대소문자 구분 없이 비교)"""
+        snapshot = self.current()
+        if category is None:
+            return snapshot["topics"]
+        for name, topics in snapshot["by_category"].items():
+            if name.lower() == category.lower():
+                return topics
+        return []
+
+    def by_category(self):
+        return self.current()["by_category"]
+
+    def get_stats(self):
+        snapshot = self.current()
+        return {**self.stats, "topics": len(snapshot["topics"]), "categories": len(snapshot["by_category"]),
+                "path": self.path, "mtime": self.mtime}
+
+
+## ✅ 서버 전체에서 공유하는 카탈로그
+catalog = TopicCatalog()
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import time
+from firebase_utils import db
+
+## ✅ 설정 (환경 변수로 조정 가능)
+MAX_BATCH_SIZE = 500  # Firestore 배치 커밋 최대 작업 수
+QUEUE_MAX_SIZE = int(os.getenv("WRITE_QUEUE_MAX_SIZE", "10000"))
+FLUSH_INTERVAL = float(os.getenv("WRITE_QUEUE_FLUSH_INTERVAL", "0.2"))  # 초
+PUT_TIMEOUT = float(os.getenv("WRITE_QUEUE_PUT_TIMEOUT", "5"))  # 큐가 가득 찼을 때 대기 시간 (초)
+COMMIT_RETRIES = 3
+
+_STOP = object()  # flusher 종료 신호
+
+
+class WriteQueueFull(Exception):
+    """큐가 가득 차서 제한 시간 내에 쓰기를 넣지 못한 경우"""
+
+
+class WriteBehindQueue:
+    """Firestore 쓰기를 메모리 큐에 모았다가 배치로 커밋하는 write-behind 큐"""
+
+    def __init__(self, max_size=QUEUE_MAX_SIZE, flush_interval=FLUSH_INTERVAL, batch_size=MAX_BATCH_SIZE, put_timeout=PUT_TIMEOUT):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.put_timeout = put_timeout
+        self.queue = None
+        self.task = None
+        self.stats = {
+            "enqueued": 0,
+            "flushed": 0,
+            "failed": 0,
+            "lost": 0,  # 결과를 기다리지 않는(watch) 쓰기 중 커밋에 실패한 개수
+            "rejected": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    async def start(self):
+        """백그라운드 flusher 시작 (FastAPI startup 시 호출)"""
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.task = asyncio.create_task(self._run())
+        print(f"✅ [WRITE QUEUE] 시작 (max_size={self.max_size}, interval={self.flush_interval}s)")
+
+    async def enqueue(self, ref, data, merge=False):
+        """쓰기 작업을 큐에 추가하고, 커밋 완료 시 결과가 설정되는 Future 반환"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        # ✅ flusher가 실행 중이 아니면 (스크립트 실행 등) 바로 저장
+        if not self.running:
+            await asyncio.to_thread(ref.set, data, merge=merge)
+            future.set_result(True)
+            return future
+
+        # ✅ 큐가 가득 차면 put_timeout 동안 대기 (backpressure)
+        try:
+            await asyncio.wait_for(self.queue.put((ref, data, merge, future)), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise WriteQueueFull(f"쓰기 큐가 가득 찼습니다 (depth={self.queue.qsize()})")
+
+        self.stats["enqueued"] += 1
+        return future
+
+    async def _collect(self):
+        """첫 작업을 기다린 뒤, batch_size 또는 flush_interval까지 작업을 모음 (종료 신호 시 closing=True)"""
+        ops = []
+        item = await self.queue.get()
+        if item is _STOP:
+            return ops, True
+        ops.append(item)
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(ops) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if item is _STOP:
+                return ops, True
+            ops.append(item)
+        return ops, False
+
+    async def _run(self):
+        closing = False
+        while not closing:
+            ops, closing = await self._collect()
+            if ops:
+                await self._commit(ops)
+
+    async def _commit(self, ops):
+        """모은 작업을 하나의 Firestore 배치로 커밋"""
+        started = time.perf_counter()
+        batch = db.batch()
+        for ref, data, merge, _ in ops:
+            batch.set(ref, data, merge=merge)
+
+        error = None
+        for attempt in range(COMMIT_RETRIES):
+            try:
+                await asyncio.to_thread(batch.commit)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                print(f"🚨 [WRITE QUEUE] 배치 커밋 실패 ({attempt + 1}/{COMMIT_RETRIES}): {e}")
+                if attempt + 1 < COMMIT_RETRIES:
+                    await asyncio.sleep(0.5 * (2 ** attempt))
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["batches"] += 1
+        self.stats["last_batch_size"] = len(ops)
+        self.stats["last_flush_ms"] = round(elapsed_ms, 2)
+        self.stats["max_flush_ms"] = round(max(self.stats["max_flush_ms"], elapsed_ms), 2)
+        self.stats["total_flush_ms"] += elapsed_ms
+
+        for _, _, _, future in ops:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(True)
+            else:
+                future.set_exception(error)
+
+        if error is None:
+            self.stats["flushed"] += len(ops)
+        else:
+            self.stats["failed"] += len(ops)
+
+    def watch(self, future, label):
+        """결과를 기다리지 않는 쓰기의 Future에 콜백 연결: 커밋 실패 시 로그를 남기고 lost로 집계"""
+        def on_done(done):
+            if done.cancelled():
+                return
+            error = done.exception()  # ✅ 예외를 꺼내 두어야 "never retrieved" 경고가 나지 않음
+            if error is not None:
+                self.stats["lost"] += 1
+                print(f"🚨 [WRITE QUEUE] 쓰기 유실: {label}: {error}")
+
+        future.add_done_callback(on_done)
+        return future
+
+    async def stop(self):
+        """남은 작업을 모두 커밋한 뒤 flusher 종료 (FastAPI shutdown 시 호출)"""
+        if not self.running:
+            return
+        pending = self.queue.qsize()
+        # ✅ 종료 신호는 FIFO 순서상 기존 작업 뒤에 처리되므로 큐가 모두 비워짐
+        await self.queue.put(_STOP)
+        await self.task
+        self.task = None
+        print(f"✅ [WRITE QUEUE] 종료 (남은 작업 {pending}개 커밋)")
+
+    def get_stats(self):
+        """큐 깊이 및 flush 지연 시간 통계 반환"""
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "total_flush_ms": round(self.stats["total_flush_ms"], 2),
+            "avg_flush_ms": round(self.stats["total_flush_ms"] / batches, 2) if batches else 0.0,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "running": self.running,
+        }
+
+
+## ✅ 서버 전체에서 공유하는 큐
+write_queue = WriteBehindQueue()